@@ -7,6 +7,7 @@ import sys, os, logging
 import codecs
 import numpy as np
 from itertools import chain
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from losoto.h5parm import h5parm, Soltab
 from losoto import _version, _logging
 
@@ -23,6 +24,8 @@ parser.add_argument('--outh5parm', '-o', default='output.h5', dest='outh5parm',
 parser.add_argument('--verbose', '-V', '-v', default=False, action='store_true', help='Go Vebose! (default=False)')
 parser.add_argument('--squeeze', '-q', default=False, action='store_true', help='Remove all axes with a length of 1 (default=False)')
 parser.add_argument('--clobber', '-c', default=False, action='store_true', help='Replace exising outh5parm file instead of appending to it (default=False)')
+parser.add_argument('--packflags', '-p', default=False, action='store_true', help='Store only flags, packed in bits, instead of weights (default=False)')
+parser.add_argument('--ncpu', '-n', default=4, type=int, dest='ncpu', help='Number of input h5parms read at the same time [default: 4]')
 args = parser.parse_args()
 
 if len(args.h5parmFiles) < 1:
@@ -33,6 +36,21 @@ if args.verbose: _logging.setLevel("debug")
 
 ################################
 
+def readSoltab(h5parmFile, solsetName, soltabName):
+    """
+    Read values and weights of a soltab through a handle of this thread,
+    with memory maps so that the data are read outside HDF5 (see h5parm)
+    """
+    h5 = h5parm(h5parmFile, readonly=True, memmap=True)
+    try:
+        soltab = h5.getSolset(solsetName).getSoltab(soltabName)
+        vals = np.array(soltab.getValues(retAxesVals=False))
+        weights = np.array(soltab.getValues(retAxesVals=False, weight=True))
+    finally:
+        h5.close()
+    return vals, weights
+
+
 # check input
 if len(args.h5parmFiles) == 1 and (',' in args.h5parmFiles[0] or
                                    ('[' in args.h5parmFiles[0] and
@@ -120,17 +138,28 @@ for insoltab in insoltabs:
 
     # fill arrays
     logging.info("Filling new table...")
-    for soltab in soltabs:
-        coords = []
-        for axis in axes:
-            coords.append( np.searchsorted( allAxesVals[axis], soltab.getAxisValues(axis) ) )
-        if args.squeeze:
-            allVals[np.ix_(*coords)] = np.squeeze(np.array(soltab.obj.val), axis = axes_squeeze)
-            allWeights[np.ix_(*coords)] = np.squeeze(np.array(soltab.obj.weight), axis = axes_squeeze)
-        else:
-            allVals[np.ix_(*coords)] = soltab.obj.val
-            allWeights[np.ix_(*coords)] = soltab.obj.weight
-            
+    # input files are read in parallel, at most ncpu at a time, and copied as soon as they are read
+    with ThreadPoolExecutor(max_workers=max(1, args.ncpu)) as executor:
+        toRead = list(zip(h5s, soltabs))
+        running = {}
+        while toRead or running:
+            while toRead and len(running) < max(1, args.ncpu):
+                h5, soltab = toRead.pop(0)
+                running[executor.submit(readSoltab, h5.H.filename, insolset, insoltab)] = soltab
+            done, notDone = wait(list(running.keys()), return_when=FIRST_COMPLETED)
+            for future in done:
+                soltab = running.pop(future)
+                vals, weights = future.result()
+                coords = []
+                for axis in axes:
+                    coords.append( np.searchsorted( allAxesVals[axis], soltab.getAxisValues(axis) ) )
+                if args.squeeze:
+                    allVals[np.ix_(*coords)] = np.squeeze(vals, axis = axes_squeeze)
+                    allWeights[np.ix_(*coords)] = np.squeeze(weights, axis = axes_squeeze)
+                else:
+                    allVals[np.ix_(*coords)] = vals
+                    allWeights[np.ix_(*coords)] = weights
+
 
 
     # TODO: leave correct weights - this is a workaround for h5parm with weight not in float16
@@ -154,7 +183,7 @@ for insoltab in insoltabs:
     # create soltab
     solsetOut.makeSoltab(typ, soltabOutName, axesNames=axes, \
                      axesVals=[ allAxesVals[axis] for axis in axes ], \
-                     vals=allVals, weights=allWeights)
+                     vals=allVals, weights=allWeights, weightDtype='bit' if args.packflags else 'f16')
 
 sourceTable = solsetOut.obj._f_get_child('source')
 antennaTable = solsetOut.obj._f_get_child('antenna')
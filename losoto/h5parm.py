@@ -3,7 +3,9 @@
 
 # Retrieving and writing data in H5parm format
 
-import os, sys, re, itertools
+import os, sys, re, itertools, hashlib, time, zlib, threading, json, shutil, uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import tables
 import logging
@@ -15,7 +17,7 @@ if int(tables.__version__.split('.')[0]) < 3:
     sys.exit(1)
 
 
-def openSoltab(h5parmFile, solsetName=None, soltabName=None, address=None, readonly=True):
+def openSoltab(h5parmFile, solsetName=None, soltabName=None, address=None, readonly=True, memmap=False):
     """
     Convenience function to get a soltab object from an h5parm file and an address like "solset000/phase000".
 
@@ -31,13 +33,15 @@ def openSoltab(h5parmFile, solsetName=None, soltabName=None, address=None, reado
         solset/soltab name (to use in place of the parameters solset and soltab).
     readonly : bool, optional
         if True the table is open in readonly mode, by default True.
+    memmap : bool, optional
+        if True (and readonly) values and weights are read through memory maps, by default False.
 
     Returns
     -------
     Soltab obj
         A solution table object.
     """
-    h5 = h5parm(h5parmFile, readonly)
+    h5 = h5parm(h5parmFile, readonly, memmap=memmap)
     if solsetName is None or soltabName is None:
         if address is None:
             logging.error('Address must be specified if solsetName and soltabName are not given.')
@@ -47,6 +51,651 @@ def openSoltab(h5parmFile, solsetName=None, soltabName=None, address=None, reado
     return solset.getSoltab(soltabName)
 
 
+def _openH5py(fileName):
+    """
+    Open a file with h5py to locate the data of arrays. File locking is disabled where supported as
+    the file may be already open for writing through pyTables (which has its own HDF5 library).
+    """
+    import h5py
+    try:
+        return h5py.File(fileName, 'r', locking=False)
+    except (TypeError, ValueError):
+        return h5py.File(fileName, 'r')
+
+
+def _getMemmap(node):
+    """
+    Get a read-only memory map of a contiguous and uncompressed array.
+
+    Parameters
+    ----------
+    node : pytables Array obj
+        The val or weight array.
+
+    Returns
+    -------
+    np.memmap
+        The memory mapped array, None if the array cannot be mapped (chunked or not yet allocated).
+    """
+    if node.chunkshape is not None:
+        return None
+
+    with _openH5py(node._v_file.filename) as f:
+        offset = f[node._v_pathname].id.get_offset()
+    if offset is None:
+        return None
+
+    dtype = node.atom.dtype
+    if node.byteorder in ['little', 'big']:
+        dtype = dtype.newbyteorder('<' if node.byteorder == 'little' else '>')
+    return np.memmap(node._v_file.filename, dtype=dtype, mode='r', offset=offset, shape=tuple(node.shape))
+
+
+_RAW_CHUNK_FILTERS = [1, 2] # HDF5 filters decoded by _RawChunks: deflate (zlib) and shuffle
+
+
+def _getRawChunks(node):
+    """
+    Get a reader of the raw chunks of a chunked array, uncompressed or compressed with zlib.
+
+    Parameters
+    ----------
+    node : pytables Array obj
+        The val or weight array.
+
+    Returns
+    -------
+    _RawChunks obj
+        The reader, None if the array is not chunked or uses other filters.
+    """
+    if node.chunkshape is None:
+        return None
+
+    with _openH5py(node._v_file.filename) as f:
+        dset = f[node._v_pathname]
+        plist = dset.id.get_create_plist()
+        pipeline = [plist.get_filter(i)[0] for i in range(plist.get_nfilters())]
+        if any([filterId not in _RAW_CHUNK_FILTERS for filterId in pipeline]):
+            return None
+        # position in the file of the allocated chunks
+        chunks = {}
+        def addChunk(info):
+            chunks[tuple(info.chunk_offset)] = (info.byte_offset, info.size, info.filter_mask)
+        try:
+            dset.id.chunk_iter(addChunk)
+        except (AttributeError, NotImplementedError):
+            for i in range(dset.id.get_num_chunks()):
+                addChunk(dset.id.get_chunk_info(i))
+        fill = dset.fillvalue
+    return _RawChunks(node, pipeline, chunks, fill)
+
+
+class _RawChunks( object ):
+    """
+    Read-only access to a chunked array which reads and decodes the chunks without going through HDF5:
+    chunks are read with os.pread() and decompressed by zlib, both release the GIL so that reads from
+    several threads run in parallel. Indexing is orthogonal: each list selects independently along its axis.
+
+    Parameters
+    ----------
+    node : pytables Array obj
+        The chunked array.
+    pipeline : list of int
+        The HDF5 filters applied when writing the chunks (see _RAW_CHUNK_FILTERS).
+    chunks : dict
+        Byte offset, size and filter mask of the allocated chunks, indexed by the chunk start.
+    fill : scalar
+        Value of the elements in non-allocated chunks.
+    """
+
+    def __init__(self, node, pipeline, chunks, fill):
+
+        self.fileName = node._v_file.filename
+        self.shape = tuple(node.shape)
+        self.ndim = len(self.shape)
+        self.chunkshape = tuple(node.chunkshape)
+        self.dtype = node.atom.dtype
+        if node.byteorder in ['little', 'big']:
+            self.dtype = self.dtype.newbyteorder('<' if node.byteorder == 'little' else '>')
+        self.pipeline = pipeline
+        self.chunks = chunks
+        self.fill = fill
+
+
+    def _readChunk(self, fd, start):
+        if not start in self.chunks:
+            return np.full(self.chunkshape, self.fill, dtype=self.dtype)
+        byteOffset, size, filterMask = self.chunks[start]
+        data = os.pread(fd, size, byteOffset)
+        # filters are undone in reverse order, skipping those not applied to this chunk
+        for i, filterId in reversed(list(enumerate(self.pipeline))):
+            if filterMask & (1 << i): continue
+            if filterId == 1:
+                data = zlib.decompress(data)
+            elif filterId == 2:
+                # the chunk is stored byte plane by byte plane, copying a plane at a time is the fastest
+                planes = np.frombuffer(data, dtype=np.uint8).reshape(self.dtype.itemsize, -1)
+                unshuffled = np.empty(planes.shape[::-1], dtype=np.uint8)
+                for b, plane in enumerate(planes):
+                    unshuffled[:,b] = plane
+                data = unshuffled
+        return np.frombuffer(data, dtype=self.dtype).reshape(self.chunkshape)
+
+
+    def __getitem__(self, key):
+        idxs, keepAxes = _normalizeKey(key, self.shape)
+        outShape = [len(idx) for idx in idxs]
+        out = np.empty(outShape, dtype=self.dtype)
+        if np.prod(outShape) == 0:
+            return out.reshape([outShape[axis] for axis in keepAxes])
+
+        # chunks touched along each axis: (chunk start, indexes in the output, indexes in the chunk)
+        groups = []
+        for idx, c in zip(idxs, self.chunkshape):
+            chunkIdx = idx // c
+            groups.append([(int(k)*c, _toSlice(np.nonzero(chunkIdx == k)[0]), _toSlice(idx[chunkIdx == k] - k*c)) \
+                           for k in np.unique(chunkIdx)])
+
+        fd = os.open(self.fileName, os.O_RDONLY)
+        try:
+            for comb in itertools.product(*groups):
+                chunk = self._readChunk(fd, tuple([c[0] for c in comb]))
+                out[_ixSelection([c[1] for c in comb])] = chunk[_ixSelection([c[2] for c in comb])]
+        finally:
+            os.close(fd)
+        return out.reshape([outShape[axis] for axis in keepAxes])
+
+
+_ZARR_SUFFIX = '.zarr' # directory of the soltabs stored as Zarr arrays, next to the h5parm
+
+
+def _writeJson(fileName, obj):
+    # write to a temporary file and rename it so readers never see a partial file
+    with open(fileName+'.tmp', 'w') as f:
+        json.dump(obj, f)
+    os.replace(fileName+'.tmp', fileName)
+
+
+def _getZarrStore(soltab, create=False):
+    """
+    Get the directory where the val/weight arrays of a soltab are stored as Zarr arrays:
+    "<h5parm>.zarr/<solset>/<soltab>", as a Zarr group.
+
+    Parameters
+    ----------
+    soltab : pytables Group obj
+        The soltab.
+    create : bool, optional
+        If True the path is derived from the soltab name and the directories are created
+        (a stale directory is removed), otherwise it is read from the STORE attribute of val.
+
+    Returns
+    -------
+    str, str
+        The path relative to the h5parm directory and the absolute path.
+    """
+    fileName = os.path.abspath(soltab._v_file.filename)
+    if create:
+        relPath = os.path.join(os.path.basename(fileName)+_ZARR_SUFFIX, soltab._v_parent._v_name, soltab._v_name)
+    else:
+        relPath = soltab.val.attrs['STORE']
+        if not isinstance(relPath, str): relPath = str(relPath, 'utf-8')
+    absPath = os.path.join(os.path.dirname(fileName), relPath)
+
+    if create:
+        if os.path.isdir(absPath): shutil.rmtree(absPath)
+        os.makedirs(absPath)
+        # mark the directories as Zarr groups
+        path = os.path.dirname(fileName)
+        for name in relPath.split(os.sep):
+            path = os.path.join(path, name)
+            if not os.path.isfile(os.path.join(path, '.zgroup')):
+                _writeJson(os.path.join(path, '.zgroup'), {'zarr_format': 2})
+    return relPath, absPath
+
+
+def _setZarrStore(soltab, relPath):
+    """
+    Set the path of the Zarr arrays of a soltab (see _getZarrStore()) in the STORE attribute of
+    its val and weight nodes, empty arrays kept in the h5parm in place of the data.
+    """
+    for name in ['val', 'weight']:
+        if name in soltab._v_children:
+            soltab._f_get_child(name).attrs['STORE'] = relPath
+
+
+def _makeZarrArray(path, data, chunkShape, complevel=5, fill=0, dims=None):
+    """
+    Create an array stored as a directory of chunks (see _ZarrArray) and fill it.
+
+    Parameters
+    ----------
+    path : str
+        The array directory, removed if existing.
+    data : array or pytables Array obj
+        The content of the array, copied by rows of chunks.
+    chunkShape : tuple
+        Shape of a chunk.
+    complevel : int, optional
+        Level of the zlib compression of the chunks, 0 for no compression. By default 5.
+    fill : scalar, optional
+        Value of elements in chunks never written, by default 0.
+    dims : list of str, optional
+        Names of the axes, stored in the attributes as xarray does.
+
+    Returns
+    -------
+    _ZarrArray obj
+    """
+    if os.path.isdir(path): shutil.rmtree(path)
+    os.makedirs(os.path.join(path, '.locks'))
+    dtype = np.dtype(data.dtype)
+    if np.isnan(fill): fill = 'NaN'
+    _writeJson(os.path.join(path, '.zarray'), {'zarr_format': 2, 'shape': [int(l) for l in data.shape], \
+            'chunks': [int(c) for c in chunkShape], 'dtype': dtype.str, 'order': 'C', 'filters': None, \
+            'compressor': {'id': 'zlib', 'level': int(complevel)} if complevel > 0 else None, \
+            'fill_value': fill, 'dimension_separator': '.'})
+    if dims is not None:
+        _writeJson(os.path.join(path, '.zattrs'), {'_ARRAY_DIMENSIONS': list(dims)})
+
+    array = _ZarrArray(path)
+    for start in range(0, array.shape[0], array.chunkshape[0]):
+        array[start:start+array.chunkshape[0]] = data[start:start+array.chunkshape[0]]
+    return array
+
+
+class _ZarrArray( object ):
+    """
+    Array stored as a directory of independently compressed chunks, in the Zarr (v2) format:
+    the ".zarray" metadata and one file per chunk named after its position in the chunk grid ("i.j.k").
+    Chunk files are replaced atomically and writes to the same chunk are serialized by a file lock,
+    so several processes can write to the array at the same time (best if they write distinct chunks).
+    The obj can be pickled and sent to worker processes. Indexing is orthogonal: each list selects
+    independently along its axis.
+
+    Parameters
+    ----------
+    path : str
+        The array directory.
+    """
+
+    def __init__(self, path):
+
+        self.path = path
+        with open(os.path.join(path, '.zarray')) as f:
+            meta = json.load(f)
+        self.shape = tuple(meta['shape'])
+        self.ndim = len(self.shape)
+        self.chunkshape = tuple(meta['chunks'])
+        self.dtype = np.dtype(meta['dtype'])
+        self.fill = np.nan if meta['fill_value'] == 'NaN' else meta['fill_value']
+        self.complevel = meta['compressor']['level'] if meta['compressor'] is not None else 0
+
+
+    def _readChunk(self, name):
+        try:
+            with open(os.path.join(self.path, name), 'rb') as f:
+                data = f.read()
+        except (IOError, OSError):
+            # never written
+            return np.full(self.chunkshape, self.fill, dtype=self.dtype)
+        if self.complevel > 0: data = zlib.decompress(data)
+        return np.frombuffer(data, dtype=self.dtype).reshape(self.chunkshape)
+
+
+    def _writeChunk(self, name, chunk):
+        data = np.ascontiguousarray(chunk, dtype=self.dtype).tobytes()
+        if self.complevel > 0: data = zlib.compress(data, self.complevel)
+        tmpName = os.path.join(self.path, '.locks', '%s.%i.%i.tmp' % (name, os.getpid(), threading.get_ident()))
+        with open(tmpName, 'wb') as f:
+            f.write(data)
+        os.replace(tmpName, os.path.join(self.path, name))
+
+
+    def _split(self, key):
+        """
+        Normalize the selection.
+
+        Returns
+        -------
+        the shape of the selection, the axes which are not removed and the chunks touched along each
+        axis as (position in the chunk grid, indexes in the selection, indexes in the chunk, True if
+        the whole chunk is selected)
+        """
+        idxs, keepAxes = _normalizeKey(key, self.shape)
+        groups = []
+        for idx, c, l in zip(idxs, self.chunkshape, self.shape):
+            chunkIdx = idx // c
+            group = []
+            for k in np.unique(chunkIdx):
+                inChunk = idx[chunkIdx == k] - k*c
+                group.append((int(k), _toSlice(np.nonzero(chunkIdx == k)[0]), _toSlice(inChunk), \
+                              len(np.unique(inChunk)) == min(c, l - k*c)))
+            groups.append(group)
+        return [len(idx) for idx in idxs], keepAxes, groups
+
+
+    def __getitem__(self, key):
+        outShape, keepAxes, groups = self._split(key)
+        out = np.empty(outShape, dtype=self.dtype)
+        if np.prod(outShape) > 0:
+            for comb in itertools.product(*groups):
+                chunk = self._readChunk('.'.join([str(c[0]) for c in comb]))
+                out[_ixSelection([c[1] for c in comb])] = chunk[_ixSelection([c[2] for c in comb])]
+        return out.reshape([outShape[axis] for axis in keepAxes])
+
+
+    def __setitem__(self, key, vals):
+        outShape, keepAxes, groups = self._split(key)
+        if np.prod(outShape) == 0: return
+        vals = np.asarray(vals)
+        if vals.size == np.prod(outShape): vals = vals.reshape(outShape)
+        else: vals = np.broadcast_to(vals, outShape)
+
+        import fcntl
+        for comb in itertools.product(*groups):
+            name = '.'.join([str(c[0]) for c in comb])
+            with open(os.path.join(self.path, '.locks', name), 'a') as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                # read-modify-write unless the whole chunk is overwritten
+                if all([c[3] for c in comb]):
+                    chunk = np.full(self.chunkshape, self.fill, dtype=self.dtype)
+                else:
+                    chunk = self._readChunk(name).copy()
+                chunk[_ixSelection([c[2] for c in comb])] = vals[_ixSelection([c[1] for c in comb])]
+                self._writeChunk(name, chunk)
+
+
+class _ParallelReader( object ):
+    """
+    Pool of threads reading soltabs of a file, each thread through its own file handle.
+    Arrays are read as with memmap=True when h5py is available (see h5parm), so that reading
+    and decompressing are done outside HDF5 and the GIL.
+
+    Parameters
+    ----------
+    fileName : str
+        H5parm filename.
+    mode : str
+        Mode to open the per-thread handles, "r" or "r+" (required if the file is already open for writing).
+    maxWorkers : int
+        Number of threads.
+    """
+
+    def __init__(self, fileName, mode, maxWorkers):
+
+        self.fileName = fileName
+        self.mode = mode
+        self.maxWorkers = maxWorkers
+        self.executor = ThreadPoolExecutor(max_workers=maxWorkers)
+        self.local = threading.local()
+        self.handles = []
+        self.lock = threading.Lock()
+        try:
+            import h5py
+            self.rawReads = True
+        except ImportError:
+            self.rawReads = False
+
+
+    def _getHandle(self):
+        H = getattr(self.local, 'H', None)
+        if H is None:
+            H = tables.open_file(self.fileName, self.mode)
+            H._losotoMemmap = self.rawReads
+            self.local.H = H
+            with self.lock:
+                self.handles.append(H)
+        return H
+
+
+    def _read(self, path, selection, args):
+        soltab = Soltab(self._getHandle().get_node(path))
+        soltab.selection = selection
+        return soltab.getValues(**args)
+
+
+    def submit(self, path, selection, args):
+        return self.executor.submit(self._read, path, selection, args)
+
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        for H in self.handles:
+            H.close()
+        self.handles = []
+
+
+def _getValuesAsync(H, soltabs, selections, maxWorkers, args):
+    """
+    Submit the reads of h5parm.getValuesAsync() and Solset.getValuesAsync() to the _ParallelReader
+    of a pytables File obj, created on first use.
+    """
+    reader = getattr(H, '_losotoReader', None)
+    if reader is not None and reader.maxWorkers != maxWorkers:
+        reader.close()
+        reader = None
+    if reader is None:
+        reader = _ParallelReader(H.filename, 'r' if H.mode == 'r' else 'r+', maxWorkers)
+        H._losotoReader = reader
+    # the per-thread handles must see what was written through this one
+    if H.mode != 'r': H.flush()
+
+    if selections is None: selections = [None] * len(soltabs)
+    if len(selections) != len(soltabs):
+        logging.error('Provide one selection per soltab.')
+        raise Exception('Provide one selection per soltab.')
+
+    futures = []
+    for soltab, selection in zip(soltabs, selections):
+        if isinstance(soltab, Soltab):
+            path = soltab.obj._v_pathname
+            sel = list(soltab.selection)
+            if selection is not None:
+                soltab = Soltab(soltab.obj, args=selection)
+                sel = soltab.selection
+        else:
+            node = H.get_node('/'+soltab)
+            path = node._v_pathname
+            sel = Soltab(node, args=selection or {}).selection
+        futures.append(reader.submit(path, sel, args))
+    return futures
+
+
+def _closeParallelReader(H):
+    reader = getattr(H, '_losotoReader', None)
+    if reader is not None:
+        reader.close()
+        H._losotoReader = None
+
+
+def _getChunkShape(shape, chunkAxesIdx, itemsize=8, chunkBytes=1024*1024):
+    """
+    Derive a chunk shape from the axes lengths and the axes which are usually read together.
+
+    Parameters
+    ----------
+    shape : list of int
+        Lenght of each axis.
+    chunkAxesIdx : list of int
+        Index of the axes that are read together (e.g. the returnAxes of getValuesIter()),
+        these are kept whole in the chunk as long as it fits in chunkBytes.
+    itemsize : int, optional
+        Size in bytes of a single element, by default 8.
+    chunkBytes : int, optional
+        Target chunk size in bytes, by default 1 MB.
+
+    Returns
+    -------
+    tuple
+        The chunk shape.
+    """
+    shape = [max(1, int(l)) for l in shape]
+    chunk = [1] * len(shape)
+    for i in chunkAxesIdx:
+        chunk[i] = shape[i]
+
+    # halve the longest axis untill the chunk fits in the target size
+    while np.prod(chunk)*itemsize > chunkBytes and max(chunk) > 1:
+        i = int(np.argmax(chunk))
+        chunk[i] = int(np.ceil(chunk[i]/2.))
+
+    # fill the chunk with the other axes (fastest varying first) to avoid many tiny chunks
+    for i in reversed(range(len(shape))):
+        if i in chunkAxesIdx: continue
+        chunk[i] = int(min(shape[i], max(1, chunkBytes // (np.prod(chunk)*itemsize))))
+
+    return tuple(chunk)
+
+
+def _encodeAxisValues(vals):
+    """
+    Axis values as stored in an extendable array: strings as fixed size bytes.
+    """
+    vals = np.atleast_1d(np.array(vals))
+    if vals.dtype.kind == 'U':
+        vals = np.char.encode(vals, 'utf-8')
+    return vals
+
+
+# compressors tried by complib='auto' (with shuffle), fastest first: the first one whose compression ratio is
+# within _AUTO_RATIO_TOLERANCE of the best is used, no compression if the best ratio is below _AUTO_MIN_RATIO
+_AUTO_COMPLIBS = ['blosc:lz4', 'blosc:lz4hc', 'blosc:zstd', 'blosc:zlib', 'zlib']
+_AUTO_RATIO_TOLERANCE = 0.1
+_AUTO_MIN_RATIO = 1.1
+
+
+def _getFilters(complib=None, complevel=None, shuffle=True, sample=None):
+    """
+    Get the pytables filters for a soltab.
+
+    Parameters
+    ----------
+    complib : str, optional
+        Compression library (zlib, lzo, bzip2, blosc:lz4, blosc:zstd...) or 'auto' to choose the fastest one
+        compressing a sample of the data almost as well as the best (see _AUTO_COMPLIBS), by default None.
+    complevel : int, optional
+        Compression level from 0 to 9, by default 5.
+    shuffle : bool, optional
+        Shuffle the bytes of the elements before compression, by default True.
+    sample : array, optional
+        Data used to choose the compression library if complib is 'auto'.
+
+    Returns
+    -------
+    pytables Filters obj
+        The filters, None if both complib and complevel are None.
+    """
+    if complib is None and complevel is None:
+        return None
+    if complevel is None: complevel = 5
+    if complib != 'auto' or complevel == 0:
+        return tables.Filters(complevel=complevel, complib=complib if complib not in [None, 'auto'] else 'zlib', shuffle=shuffle)
+
+    # compress the sample with each available compressor (in memory), the choice depends only on the ratios
+    sample = np.ascontiguousarray(sample).ravel()[:512*1024]
+    ratios = []
+    h = tables.open_file('losoto_filters.h5', 'w', driver='H5FD_CORE', driver_core_backing_store=0)
+    try:
+        for i, lib in enumerate(_AUTO_COMPLIBS):
+            if lib.startswith('blosc:') and not lib[6:] in tables.blosc_compressor_list(): continue
+            if tables.which_lib_version(lib.split(':')[0]) is None: continue
+            filters = tables.Filters(complevel=complevel, complib=lib, shuffle=shuffle)
+            node = h.create_carray('/', 'sample%i' % i, obj=sample, filters=filters, chunkshape=(min(len(sample), 128*1024),))
+            h.flush()
+            ratios.append((sample.nbytes / float(max(1, node.size_on_disk)), filters))
+            logging.debug('Compression %s (level %i): ratio %.2f.' % (lib, complevel, ratios[-1][0]))
+    finally:
+        h.close()
+
+    bestRatio = max([ratio for ratio, filters in ratios] + [0])
+    if bestRatio < _AUTO_MIN_RATIO:
+        logging.info('Data not compressible, not using compression.')
+        return tables.Filters(complevel=0)
+    filters = [filters for ratio, filters in ratios if ratio >= bestRatio * (1 - _AUTO_RATIO_TOLERANCE)][0]
+    logging.info('Using compression %s (level %i).' % (filters.complib, filters.complevel))
+    return filters
+
+
+def _copySoltab(soltab, solset, getFilters=None, chunkAxes=None, copyStore=True):
+    """
+    Copy a soltab (with attributes and history) into a solset, possibly of another file.
+    Arrays are copied a block of rows at a time. Zarr arrays are copied next to the other file.
+
+    Parameters
+    ----------
+    soltab : pytables Group obj
+        The soltab to copy.
+    solset : pytables Group obj
+        The solset where the copy is made.
+    getFilters : callable, optional
+        Returns the filters of a copied array from its current ones, by default keep them.
+    chunkAxes : list, optional
+        Axes along which values and weights are re-chunked (see Solset.makeSoltab()), by default keep the chunk shapes.
+    copyStore : bool, optional
+        If False the copy points to the same Zarr arrays (for a file that replaces the original), by default True.
+
+    Returns
+    -------
+    pytables Group obj
+        The copy.
+    """
+    if getFilters is None: getFilters = lambda filters: filters
+    newSoltab = soltab._f_copy(solset, recursive=False)
+    dataNames = ['val', 'weight', 'flag']
+    isZarr = 'STORE' in soltab.val.attrs._v_attrnames
+    for node in soltab._v_leaves.values():
+        if node.name in dataNames and chunkAxes is not None and not isZarr: continue
+        if isinstance(node, tables.Table) or node.chunkshape is not None:
+            node.copy(newSoltab, filters=getFilters(node.filters))
+        else:
+            node.copy(newSoltab)
+
+    if isZarr and copyStore and soltab._v_file is not solset._v_file:
+        relPath, absPath = _getZarrStore(newSoltab, create=True)
+        shutil.rmtree(absPath)
+        shutil.copytree(_getZarrStore(soltab)[1], absPath)
+        _setZarrStore(newSoltab, relPath)
+
+    if chunkAxes is None or isZarr: return newSoltab
+    # re-chunk values and weights (the append axis of extendable soltabs has no limit)
+    val = soltab.val
+    axesNames = val.attrs['AXES']
+    if not isinstance(axesNames, str): axesNames = str(axesNames, 'utf-8')
+    axesNames = axesNames.split(',')
+    shape = list(val.shape)
+    appendIdx = val.extdim if isinstance(val, tables.EArray) else None
+    if appendIdx is not None: shape[appendIdx] = 2**31
+    for chunkAxis in chunkAxes:
+        if not chunkAxis in axesNames:
+            logging.warning('Chunk axis '+chunkAxis+' not found. Ignored.')
+    chunkShape = _getChunkShape(shape, [axesNames.index(a) for a in chunkAxes if a in axesNames], val.dtype.itemsize)
+    filters = getFilters(val.filters)
+    for node in [soltab._v_children[name] for name in dataNames if name in soltab._v_children]:
+        nodeChunkShape = chunkShape
+        if node.name == 'flag':
+            packedAxis = int(node.attrs['PACKED_AXIS'])
+            nodeChunkShape = tuple([int(np.ceil(c/8.)) if i == packedAxis else c for i, c in enumerate(chunkShape)])
+        # copy in chunk aligned blocks along the first (or the append) axis
+        axis = 0 if appendIdx is None else appendIdx
+        step = nodeChunkShape[axis] * max(1, int(64*1024**2 // (np.prod(nodeChunkShape) * node.dtype.itemsize)))
+        atom = tables.Atom.from_dtype(node.dtype)
+        if appendIdx is None:
+            newNode = newSoltab._v_file.create_carray(newSoltab, node.name, atom=atom, shape=node.shape, \
+                    chunkshape=nodeChunkShape, filters=filters)
+        else:
+            newNode = newSoltab._v_file.create_earray(newSoltab, node.name, atom=atom, \
+                    shape=[0 if i == appendIdx else l for i, l in enumerate(node.shape)], chunkshape=nodeChunkShape, filters=filters)
+        for start in range(0, node.shape[axis], step):
+            block = tuple([slice(start, start+step) if i == axis else slice(None) for i in range(node.ndim)])
+            if appendIdx is None:
+                newNode[block] = node[block]
+            else:
+                newNode.append(node[block])
+        node.attrs._f_copy(newNode)
+    return newSoltab
+
+
 class h5parm( object ):
     """
     Create an h5parm object.
@@ -61,12 +710,41 @@ class h5parm( object ):
         compression level from 0 to 9 when creating the file, by default 5.
     complib : str, optional
         library for compression: lzo, zlib, bzip2, by default zlib.
+        Compression is applied only to chunked soltabs (see Solset.makeSoltab()).
+    chunkCacheSize : int, optional
+        Size in bytes of the HDF5 chunk cache, by default use the pyTables default.
+        It should be able to hold all the chunks touched by a single read (see Soltab.getChunkCacheSize()).
+    memmap : bool, optional
+        If True (readonly only) values and weights of contiguous uncompressed soltabs are read through
+        memory maps of the file (requires h5py). Selections are then served by the OS page cache
+        and shared among processes, getValues() returns read-only arrays. Chunked soltabs (uncompressed
+        or zlib compressed) are read chunk by chunk and decompressed outside HDF5. By default False.
+    swmr : bool, optional
+        Single-writer/multi-reader mode, by default False. A writer publishes a consistent state
+        of the file with publish() (e.g. at the end of each step), readers wait for a published
+        state when opening and can pick up newer ones with refresh() or consistentRead().
+        The state is tracked by a generation counter in the "<h5parmFile>.swmr" sidecar file.
+        As the writer keeps the file open, HDF5 file locking must be disabled in the writer process
+        (HDF5_USE_FILE_LOCKING=FALSE in the environment before pyTables is imported) or in the readers.
+    swmrTimeout : float, optional
+        Seconds a swmr reader waits for the writer to publish before giving up, by default wait forever.
     """
 
-    def __init__(self, h5parmFile, readonly=True, complevel=0, complib='zlib'):
+    def __init__(self, h5parmFile, readonly=True, complevel=0, complib='zlib', chunkCacheSize=None, memmap=False, swmr=False, swmrTimeout=None):
 
         self.H = None # variable to store the pytable object
         self.fileName = h5parmFile
+        self.checkedSolsets = set() # solsets checked by _checkSolset()
+        self.readonly = readonly
+        self.swmr = swmr
+        self.swmrTimeout = swmrTimeout
+        self.generation = None # swmr generation of the open file
+
+        # parameters passed to pytables when opening the file
+        params = {'IO_BUFFER_SIZE':1024*1024*10, 'BUFFER_TIMES':500}
+        if chunkCacheSize is not None:
+            params['CHUNK_CACHE_SIZE'] = int(chunkCacheSize)
+        self.params = params
 
         if os.path.isfile(h5parmFile):
             if not tables.is_hdf5_file(h5parmFile):
@@ -74,19 +752,26 @@ class h5parm( object ):
                 raise Exception('Not a HDF5 file: '+h5parmFile+'.')
             if readonly:
                 logging.debug('Reading from '+h5parmFile+'.')
-                self.H = tables.open_file(h5parmFile, 'r', IO_BUFFER_SIZE=1024*1024*10, BUFFER_TIMES=500)
+                if swmr: self.generation = self._waitPublished()
+                self.H = tables.open_file(h5parmFile, 'r', **params)
             else:
                 logging.debug('Appending to '+h5parmFile+'.')
-                self.H = tables.open_file(h5parmFile, 'r+', IO_BUFFER_SIZE=1024*1024*10, BUFFER_TIMES=500)
+                self.H = tables.open_file(h5parmFile, 'r+', **params)
 
-            # Check if it's a valid H5parm file: attribute h5parm_version should be defined in any solset
-            is_h5parm = True
-            for node in self.H.root:
-                if 'h5parm_version' not in node._v_attrs:
-                    is_h5parm=False
-                    break
-            if not is_h5parm:
-                logging.warning('Missing H5pram version. Is this a properly made h5parm?')
+            if memmap and swmr:
+                logging.warning('Memory mapping is not possible in swmr mode, reading through pyTables.')
+                memmap = False
+            if memmap:
+                try:
+                    import h5py
+                except ImportError:
+                    logging.warning('Memory mapping requires h5py, reading through pyTables.')
+                    memmap = False
+            if memmap and not readonly:
+                logging.warning('Memory mapping is possible only in readonly mode, reading through pyTables.')
+                memmap = False
+            # this is checked by the soltabs of this file
+            self.H._losotoMemmap = memmap
 
         else:
             if readonly:
@@ -95,7 +780,15 @@ class h5parm( object ):
                 logging.debug('Creating '+h5parmFile+'.')
                 # add a compression filter
                 f = tables.Filters(complevel=complevel, complib=complib)
-                self.H = tables.open_file(h5parmFile, filters=f, mode='w', IO_BUFFER_SIZE=1024*1024*10, BUFFER_TIMES=500)
+                self.H = tables.open_file(h5parmFile, filters=f, mode='w', **params)
+                # a new file restarts the swmr generations
+                if swmr and os.path.isfile(self._getSwmrFile()):
+                    os.remove(self._getSwmrFile())
+
+        if swmr and not readonly:
+            if os.environ.get('HDF5_USE_FILE_LOCKING', '').upper() != 'FALSE':
+                logging.warning('HDF5 file locking is enabled: swmr readers of '+h5parmFile+' must disable it (HDF5_USE_FILE_LOCKING=FALSE).')
+            self.publish()
 
 
     def close(self):
@@ -103,7 +796,214 @@ class h5parm( object ):
         Close the open table.
         """
         logging.debug('Closing table.')
+        _closeParallelReader(self.H)
+        if self.swmr and not self.readonly and self.H.isopen:
+            self.publish()
+        self.H.close()
+
+
+    def _getSwmrFile(self):
+        return self.fileName+'.swmr'
+
+
+    def getGeneration(self):
+        """
+        Read the swmr state published by the writer.
+
+        Returns
+        -------
+        int, bool
+            Generation of the last published state (0 if nothing was published) and True if the writer
+            is modifying the file since then.
+        """
+        try:
+            with open(self._getSwmrFile()) as f:
+                generation, writing = f.read().split()
+            return int(generation), writing == '1'
+        except (IOError, OSError, ValueError):
+            # missing sidecar (file not written in swmr mode) or being replaced
+            return 0, False
+
+
+    def _setGeneration(self, generation, writing):
+        # write to a temporary file and rename it so readers never see a partial sidecar
+        swmrFile = self._getSwmrFile()
+        with open(swmrFile+'.tmp', 'w') as f:
+            f.write('%i %i\n' % (generation, writing))
+        os.replace(swmrFile+'.tmp', swmrFile)
+
+
+    def beginWrite(self):
+        """
+        Mark the file as being modified (swmr writers only).
+        Readers opening or refreshing in the meanwhile wait for the next publish().
+        """
+        if not self.swmr or self.readonly:
+            raise Exception('beginWrite() requires a swmr h5parm open for writing.')
+        generation, writing = self.getGeneration()
+        if not writing:
+            self._setGeneration(generation, True)
+
+
+    def publish(self):
+        """
+        Flush the file and publish its state as a new generation (swmr writers only).
+        Call it when the file is consistent, e.g. at the end of a step.
+
+        Returns
+        -------
+        int
+            The published generation.
+        """
+        if not self.swmr or self.readonly:
+            raise Exception('publish() requires a swmr h5parm open for writing.')
+        # NOTE: values of cached soltabs are published once the soltab is flushed
+        self.H.flush()
+        self.generation = self.getGeneration()[0]+1
+        self._setGeneration(self.generation, False)
+        return self.generation
+
+
+    def _waitPublished(self):
+        # wait until the writer is not modifying the file, return the published generation
+        start = time.time()
+        while True:
+            generation, writing = self.getGeneration()
+            if not writing: return generation
+            if self.swmrTimeout is not None and time.time()-start > self.swmrTimeout:
+                logging.error('Timeout waiting for a published state of '+self.fileName+'.')
+                raise Exception('Timeout waiting for a published state of '+self.fileName+'.')
+            time.sleep(0.1)
+
+
+    def refresh(self):
+        """
+        Reopen the file if the writer published a new generation (swmr readers only).
+        Solset and soltab objects obtained before a refresh point to the old state and must be asked again.
+
+        Returns
+        -------
+        bool
+            True if the file was reopened.
+        """
+        if not self.swmr or not self.readonly:
+            raise Exception('refresh() requires a swmr h5parm open in readonly mode.')
+        generation = self._waitPublished()
+        if generation == self.generation and self.H.isopen:
+            return False
+        logging.debug('Refreshing '+self.fileName+' to generation %i.' % generation)
+        memmap = self.H._losotoMemmap
+        _closeParallelReader(self.H)
         self.H.close()
+        self.H = tables.open_file(self.fileName, 'r', **self.params)
+        self.H._losotoMemmap = memmap
+        self.checkedSolsets = set()
+        self.generation = generation
+        return True
+
+
+    def consistentRead(self, func):
+        """
+        Run a read on the last published state (swmr readers only), seqlock style: if the writer
+        starts modifying the file during the read, the read is repeated on the next published state.
+        A read failing while the writer modifies the file (e.g. reading a partially written node)
+        is repeated as well, until swmrTimeout; failures on a published state are raised.
+
+        Parameters
+        ----------
+        func : callable
+            Function called with this h5parm as argument, it must get the solsets/soltabs from it.
+
+        Returns
+        -------
+        Whatever func returns.
+        """
+        start = time.time()
+        while True:
+            self.refresh()
+            try:
+                result = func(self)
+            except Exception as e:
+                if self.getGeneration() == (self.generation, False):
+                    raise
+                if self.swmrTimeout is not None and time.time()-start > self.swmrTimeout:
+                    logging.error('Timeout reading a published state of '+self.fileName+'.')
+                    raise
+                logging.debug('Read of '+self.fileName+' failed while the writer modified it, retrying: '+str(e))
+                self.generation = None # reopen on the next published state, the file handle may be inconsistent
+                continue
+            if self.getGeneration() == (self.generation, False):
+                return result
+
+
+    def compact(self, outFile=None, complevel=None, complib=None, chunkAxes=None):
+        """
+        Copy the live solsets and soltabs into a new file, reclaiming the space left by deleted or
+        rewritten soltabs. Arrays are copied a block of rows at a time, so the memory used does not
+        depend on the size of the soltabs. Without outFile the new file atomically replaces this
+        h5parm, which is then reopened: solset and soltab objects obtained before must be asked again.
+
+        Parameters
+        ----------
+        outFile : str, optional
+            Write the compacted copy to this file instead of replacing the h5parm (which can then be readonly).
+        complevel : int, optional
+            Compression level from 0 to 9 of the chunked arrays, by default keep the one of each array.
+        complib : str, optional
+            Compression library of the chunked arrays, by default keep the one of each array.
+        chunkAxes : list, optional
+            Re-chunk values and weights of each soltab along these axes (see Solset.makeSoltab()),
+            contiguous soltabs become chunked. By default keep the chunk shapes.
+
+        Returns
+        -------
+        int
+            Size in bytes of the compacted file.
+        """
+        if outFile is None and self.readonly:
+            raise Exception('compact() replaces the h5parm only if it is open for writing, give outFile.')
+        if outFile is not None and os.path.abspath(outFile) == os.path.abspath(self.fileName):
+            outFile = None
+        tmpFile = self.fileName+'.compact.tmp' if outFile is None else outFile
+
+        def getFilters(filters):
+            if complevel is None and complib is None: return filters
+            level = filters.complevel if complevel is None else complevel
+            lib = (filters.complib or 'zlib') if complib is None else complib
+            return tables.Filters(complevel=level, complib=lib, shuffle=level > 0, fletcher32=filters.fletcher32)
+
+        logging.info('Compacting '+self.fileName+' into '+tmpFile+'.')
+        if self.swmr and not self.readonly and outFile is None: self.beginWrite()
+        self.H.flush()
+        oldSize = os.path.getsize(self.fileName)
+        dst = tables.open_file(tmpFile, mode='w', filters=getFilters(self.H.filters), **self.params)
+        try:
+            self.H.root._v_attrs._f_copy(dst.root)
+            for solset in self.H.root._v_groups.values():
+                newSolset = solset._f_copy(dst.root, recursive=False)
+                for node in solset._v_leaves.values():
+                    node.copy(newSolset, filters=getFilters(node.filters))
+                for soltab in solset._v_groups.values():
+                    _copySoltab(soltab, newSolset, getFilters, chunkAxes, copyStore=outFile is not None)
+            dst.close()
+        except:
+            dst.close()
+            os.remove(tmpFile)
+            raise
+
+        if outFile is None:
+            # replace and reopen, soltabs stored as Zarr arrays stay where they are
+            memmap = getattr(self.H, '_losotoMemmap', False)
+            _closeParallelReader(self.H)
+            self.H.close()
+            os.replace(tmpFile, self.fileName)
+            self.H = tables.open_file(self.fileName, 'r' if self.readonly else 'r+', **self.params)
+            self.H._losotoMemmap = memmap
+            self.checkedSolsets = set()
+            if self.swmr and not self.readonly: self.publish()
+        newSize = os.path.getsize(tmpFile if outFile is not None else self.fileName)
+        logging.info('Compacted %s: %.1f MB -> %.1f MB.' % (self.fileName, oldSize/1024.**2, newSize/1024.**2))
+        return newSize
 
 
     def __str__(self):
@@ -176,10 +1076,37 @@ class h5parm( object ):
         """
         solsets = []
         for solset in self.H.root._v_groups.values():
+            self._checkSolset(solset)
             solsets.append(Solset(solset))
         return solsets
 
 
+    def getValuesAsync(self, soltabs, selections=None, maxWorkers=4, **args):
+        """
+        Read several soltabs, or several selections of the same soltab, in parallel.
+        Each thread reads through its own file handle and arrays are read as with memmap=True
+        (if h5py is available) so that reading and decompressing are done outside the GIL.
+
+        Parameters
+        ----------
+        soltabs : list
+            The soltabs to read: Soltab objs or addresses like "solset000/phase000".
+        selections : list of dicts, optional
+            A selection for each soltab (see Soltab.setSelection()), by default the current selection
+            of Soltab objs and no selection for addresses.
+        maxWorkers : int, optional
+            Number of threads reading, by default 4.
+        args
+            Passed to Soltab.getValues() (e.g. weight, retAxesVals, reference).
+
+        Returns
+        -------
+        list
+            A concurrent.futures.Future obj for each soltab, resolving to what Soltab.getValues() returns.
+        """
+        return _getValuesAsync(self.H, soltabs, selections, maxWorkers, args)
+
+
     def getSolsetNames(self):
         """
         Get all solution set names.
@@ -213,7 +1140,25 @@ class h5parm( object ):
             logging.critical("Cannot find solset: "+solset+".")
             raise Exception("Cannot find solset: "+solset+".")
 
-        return Solset(self.H.get_node('/',solset))
+        solset = self.H.get_node('/',solset)
+        self._checkSolset(solset)
+        return Solset(solset)
+
+
+    def _checkSolset(self, solset):
+        """
+        Check if a solset is part of a valid H5parm file: attribute h5parm_version should be defined.
+        Solsets are checked only when first accessed, so that opening a file does not walk all the solsets.
+
+        Parameters
+        ----------
+        solset : pytables Group obj
+            The solset.
+        """
+        if solset._v_name in self.checkedSolsets: return
+        self.checkedSolsets.add(solset._v_name)
+        if not 'h5parm_version' in solset._v_attrs:
+            logging.warning('Missing H5pram version. Is this a properly made h5parm?')
 
 
     def _firstAvailSolsetName(self):
@@ -363,6 +1308,13 @@ class h5parm( object ):
                     weights = soltab.getValues(weight = True, retAxesVals = False)
                     vals = soltab.getValues(weight = False, retAxesVals = False)
                     info += '    Flagged data: %.3f%%\n' % (100.*np.sum(weights==0 | np.isnan(vals))/len(weights.flat))
+                    if 'ant' in axisNames:
+                        # no selection: the summary is computed from the weights already read
+                        if soltab.getFlagSummary(compute=False) is None: soltab._setFlagSummary(weights)
+                        flaggedAnts = [ant for ant, frac in zip(soltab.getAxisValues('ant', ignoreSelection=True, copy=False), \
+                                soltab.getFlagSummary()['ant']) if frac == 1]
+                        if len(flaggedAnts) > 0:
+                            info += '    Fully flagged stations: %s\n' % ', '.join(flaggedAnts)
 
                     # Add some extra attributes stored in screen-type tables
                     if soltab.getType() == 'screen':
@@ -440,7 +1392,8 @@ class Solset( object ):
 
     def makeSoltab(self, soltype=None, soltabName=None,
             axesNames = [], axesVals = [], chunkShape=None, vals=None,
-            weights=None, parmdbType='', weightDtype='f16'):
+            weights=None, parmdbType='', weightDtype='f16', chunkAxes=None, valDtype='f64', complib=None, complevel=None,
+            storage='hdf5', appendAxis=None):
         """
         Create a Soltab into this solset.
 
@@ -455,7 +1408,8 @@ class Solset( object ):
         axesVals : list
             List with the axes values (each is a separate list)
         chunkShape : list, optional
-            List with the chunk shape
+            List with the chunk shape, if given val/weight are stored as chunked arrays
+            compressed with the soltab (complib/complevel) or h5parm filters. By default contiguous arrays (no compression).
         vals : numpy array
             Array with shape given by the axesVals lenghts
         weights : numpy array
@@ -464,7 +1418,32 @@ class Solset( object ):
         parmdbType : str
             Original parmdb solution type
         weightDtype : str
-            THe dtype of weights allowed values are ('f16' or 'f32' or 'f64')
+            THe dtype of weights allowed values are ('f16' or 'f32' or 'f64' or 'bit').
+            With 'bit' only flags (weight = 0) are stored, packed in bits (see Soltab.isPacked()).
+        chunkAxes : list, optional
+            Axes which are usually read together (e.g. ['freq','time']), used to derive
+            the chunk shape if chunkShape is not given. By default None.
+        valDtype : str, optional
+            The dtype of values, allowed values are ('f32' or 'f64' or 'q16'). By default 'f64'.
+            With 'q16' values are stored as 16 bit integers with a scale and an offset: the absolute error is
+            bounded (relative for positive amplitudes, stored as log10), see Soltab.getQuantizationError().
+        complib : str, optional
+            Compression library for this soltab (zlib, lzo, bzip2, blosc:lz4, blosc:zstd...), always with shuffle.
+            If 'auto' the fastest library compressing a sample of the values almost as well as the best is used.
+            Compressed soltabs are chunked (along chunkAxes if given). By default use the h5parm filters.
+        complevel : int, optional
+            Compression level from 0 to 9 for this soltab, by default 5 if complib is given.
+        storage : str, optional
+            Where values and weights are stored: 'hdf5' (in the h5parm) or 'zarr', as Zarr arrays of zlib
+            compressed chunks (complevel) in the directory "<h5parm>.zarr/<solset>/<soltab>" (axes and metadata
+            stay in the h5parm, val and weight are empty arrays with the path in their STORE attribute).
+            Worker processes can write zarr soltabs directly (see Soltab.getParallelWriter()),
+            without waiting for each other if they write distinct chunks. Not possible with valDtype 'q16'
+            or weightDtype 'bit'. See also Soltab.setStorage(). By default 'hdf5'.
+        appendAxis : str, optional
+            Axis along which the soltab can grow with Soltab.appendValues() (e.g. 'time'): values, weights and
+            the axis values are then extendable chunked arrays. If no chunk shape is given the chunks span as
+            many appended elements as fit in 1 MB. Not possible with storage 'zarr'. By default the soltab has a fixed size.
 
         Returns
         -------
@@ -497,18 +1476,21 @@ class Solset( object ):
         assert dim == list(vals.shape)
         assert dim == list(weights.shape)
 
+        if appendAxis is not None:
+            assert appendAxis in axesNames, "The append axis must be one of the axes"
+            assert storage == 'hdf5', "Only soltabs stored in the h5parm can grow"
+            appendIdx = axesNames.index(appendAxis)
+
         # if input is OK, create table
         soltab = self.obj._v_file.create_group("/"+self.name, soltabName, title=soltype)
         soltab._v_attrs['parmdb_type'] = parmdbType
         for i, axisName in enumerate(axesNames):
-            axis = self.obj._v_file.create_array('/'+self.name+'/'+soltabName, axisName, obj=axesVals[i])
-
-        # create the val/weight Carrays
-        #val = self.obj._v_file.create_carray('/'+self.name+'/'+soltabName, 'val', obj=vals.astype(np.float64), chunkshape=None, atom=tables.Float64Atom())
-        #weight = self.obj._v_file.create_carray('/'+self.name+'/'+soltabName, 'weight', obj=weights.astype(np.float16), chunkshape=None, atom=tables.Float16Atom())
-        # array do not have compression but are much faster
-        val = self.obj._v_file.create_array('/'+self.name+'/'+soltabName, 'val', obj=vals.astype(np.float64), atom=tables.Float64Atom())
-        assert weightDtype in ['f16','f32', 'f64'], "Allowed weight dtypes are 'f16','f32', 'f64'"
+            if axisName == appendAxis:
+                axis = self.obj._v_file.create_earray('/'+self.name+'/'+soltabName, axisName, obj=_encodeAxisValues(axesVals[i]))
+            else:
+                axis = self.obj._v_file.create_array('/'+self.name+'/'+soltabName, axisName, obj=axesVals[i])
+
+        assert weightDtype in ['f16','f32', 'f64', 'bit'], "Allowed weight dtypes are 'f16','f32', 'f64', 'bit'"
         if weightDtype == 'f16':
             np_d = np.float16
             pt_d = tables.Float16Atom()
@@ -518,11 +1500,114 @@ class Solset( object ):
         elif weightDtype == 'f64':
             np_d = np.float64
             pt_d = tables.Float64Atom()
-        weight = self.obj._v_file.create_array('/'+self.name+'/'+soltabName, 'weight', obj=weights.astype(np_d), atom=pt_d)
+        elif weightDtype == 'bit':
+            # flags (weight = 0) packed in bits along the longest axis (but the append axis)
+            packedAxis = int(np.argmax([-1 if appendAxis == axisName else l for axisName, l in zip(axesNames, dim)]))
+            assert appendAxis is None or len(dim) > 1, "Bit-packed flags need an axis other than the append axis"
+            np_d = np.uint8
+            pt_d = tables.UInt8Atom()
+        weightName = 'flag' if weightDtype == 'bit' else 'weight'
+        weightsOnDisk = _packFlags(weights == 0, packedAxis) if weightDtype == 'bit' else weights.astype(np_d)
+
+        assert valDtype in ['f32', 'f64', 'q16'], "Allowed value dtypes are 'f32', 'f64', 'q16'"
+        origVals = vals
+        if valDtype == 'f32':
+            np_v = np.float32
+            pt_v = tables.Float32Atom()
+        elif valDtype == 'q16':
+            # 16 bit integers with scale and offset
+            quantization = _getQuantization(vals, soltype)
+            vals = _QuantizedValues(None, quantization).encode(vals)
+            np_v = np.int16
+            pt_v = tables.Int16Atom()
+        else:
+            np_v = np.float64
+            pt_v = tables.Float64Atom()
+        vals = vals.astype(np_v)
+
+        # filters of this soltab, compression requires chunked arrays
+        filters = _getFilters(complib, complevel, sample=vals)
+        if filters is not None and filters.complevel > 0 and chunkShape is None and chunkAxes is None:
+            chunkAxes = []
+
+        if appendAxis is not None and chunkShape is None and chunkAxes is None:
+            chunkAxes = []
+
+        if chunkShape is None and chunkAxes is not None:
+            for chunkAxis in chunkAxes:
+                if not chunkAxis in axesNames:
+                    logging.warning('Chunk axis '+chunkAxis+' not found. Ignored.')
+            chunkDim = dim
+            if appendAxis is not None:
+                # the append axis has no limit
+                chunkDim = [2**31 if i == appendIdx else l for i, l in enumerate(dim)]
+            chunkShape = _getChunkShape(chunkDim, [axesNames.index(a) for a in chunkAxes if a in axesNames], np.dtype(np_v).itemsize)
+
+        assert storage in ['hdf5', 'zarr'], "Allowed storages are 'hdf5', 'zarr'"
+        if storage == 'zarr':
+            if valDtype == 'q16' or weightDtype == 'bit':
+                raise Exception('Quantized values and bit-packed flags cannot be stored as Zarr arrays.')
+            if not complib in [None, 'zlib']:
+                logging.warning('Zarr soltabs are compressed with zlib, ignoring complib '+complib+'.')
+            if chunkShape is None:
+                chunkShape = _getChunkShape(dim, [], np.dtype(np_v).itemsize)
+            chunkShape = tuple([int(c) for c in chunkShape])
+            relPath, absPath = _getZarrStore(soltab, create=True)
+            logging.debug('Storing '+soltabName+' in '+absPath+' with chunk shape '+str(chunkShape)+'.')
+            _makeZarrArray(os.path.join(absPath, 'val'), vals, chunkShape, 5 if complevel is None else complevel, np.nan, axesNames)
+            _makeZarrArray(os.path.join(absPath, 'weight'), weightsOnDisk, chunkShape, 5 if complevel is None else complevel, 0, axesNames)
+            # val and weight are empty arrays holding the attributes and the path of the Zarr arrays
+            val = self.obj._v_file.create_array('/'+self.name+'/'+soltabName, 'val', obj=np.zeros(0, dtype=np_v))
+            weight = self.obj._v_file.create_array('/'+self.name+'/'+soltabName, 'weight', obj=np.zeros(0, dtype=weightsOnDisk.dtype))
+            _setZarrStore(soltab, relPath)
+        elif chunkShape is None:
+            # array do not have compression but are much faster
+            val = self.obj._v_file.create_array('/'+self.name+'/'+soltabName, 'val', obj=vals, atom=pt_v)
+            weight = self.obj._v_file.create_array('/'+self.name+'/'+soltabName, weightName, obj=weightsOnDisk, atom=pt_d)
+        else:
+            # chunked arrays are compressed with the h5parm filters and allow fast partial reads
+            chunkShape = tuple([int(c) for c in chunkShape])
+            assert len(chunkShape) == len(dim), "Chunk shape must have one entry per axis"
+            if filters is None: filters = self.obj._v_file.filters
+            logging.debug('Chunk shape for '+soltabName+': '+str(chunkShape))
+            def makeArray(name, data, atom, chunks):
+                if appendAxis is None:
+                    return self.obj._v_file.create_carray('/'+self.name+'/'+soltabName, name, obj=data, \
+                            atom=atom, chunkshape=chunks, filters=filters)
+                # extendable along the append axis
+                shape = [0 if i == appendIdx else l for i, l in enumerate(data.shape)]
+                array = self.obj._v_file.create_earray('/'+self.name+'/'+soltabName, name, \
+                        atom=atom, shape=shape, chunkshape=chunks, filters=filters)
+                array.append(data)
+                return array
+            val = makeArray('val', vals, pt_v, chunkShape)
+            weightChunkShape = chunkShape
+            if weightDtype == 'bit':
+                weightChunkShape = tuple([int(np.ceil(c/8.)) if i == packedAxis else c for i, c in enumerate(chunkShape)])
+            weight = makeArray(weightName, weightsOnDisk, pt_d, weightChunkShape)
         val.attrs['AXES'] = ','.join([axisName for axisName in axesNames])
-        weight.attrs['AXES'] = ','.join([axisName for axisName in axesNames])
-
-        return Soltab(soltab)
+        if weight is not None:
+            weight.attrs['AXES'] = ','.join([axisName for axisName in axesNames])
+        if weightDtype == 'bit':
+            weight.attrs['SHAPE'] = np.array(dim)
+            weight.attrs['PACKED_AXIS'] = packedAxis
+        if valDtype == 'q16':
+            for attr, attrVal in quantization.items():
+                val.attrs[attr] = attrVal
+
+        soltab = Soltab(soltab)
+        soltab._stamp()
+        soltab._setFlagSummary(weights)
+        if valDtype == 'q16':
+            maxError, errorBound = soltab.getQuantizationError(origVals)
+            logging.info('Quantization of %s: max error %g (bound %g%s).' % \
+                    (soltabName, maxError, errorBound, ', of log10' if quantization['QUANT_LOG'] else ''))
+        if chunkShape is not None and storage == 'hdf5':
+            cacheSize = soltab.getChunkCacheSize()
+            if cacheSize > self.obj._v_file.params['CHUNK_CACHE_SIZE']:
+                logging.warning('Chunk cache too small for soltab %s, open the h5parm with chunkCacheSize >= %i.' % (soltabName, cacheSize))
+
+        return soltab
 
 
     def _fisrtAvailSoltabName(self, soltype):
@@ -548,7 +1633,33 @@ class Solset( object ):
         return soltype+"%03d" % min(list(set(range(1000)) - set(nums)))
 
 
-    def getSoltabs(self, useCache=False, sel={}):
+    def getValuesAsync(self, soltabs, selections=None, maxWorkers=4, **args):
+        """
+        Read several soltabs of this solset, or several selections of the same soltab, in parallel
+        (see h5parm.getValuesAsync()).
+
+        Parameters
+        ----------
+        soltabs : list
+            The soltabs to read: Soltab objs or soltab names.
+        selections : list of dicts, optional
+            A selection for each soltab (see Soltab.setSelection()), by default the current selection
+            of Soltab objs and no selection for names.
+        maxWorkers : int, optional
+            Number of threads reading, by default 4.
+        args
+            Passed to Soltab.getValues() (e.g. weight, retAxesVals, reference).
+
+        Returns
+        -------
+        list
+            A concurrent.futures.Future obj for each soltab, resolving to what Soltab.getValues() returns.
+        """
+        soltabs = [soltab if isinstance(soltab, Soltab) else self.name+'/'+soltab for soltab in soltabs]
+        return _getValuesAsync(self.obj._v_file, soltabs, selections, maxWorkers, args)
+
+
+    def getSoltabs(self, useCache=False, sel={}, cacheSize=None):
         """
         Get all Soltabs in this Solset.
 
@@ -558,15 +1669,18 @@ class Solset( object ):
             soltabs obj will use cache, by default False
         sel : dict, optional
             selection dict, by default no selection
+        cacheSize : int, optional
+            Max memory in bytes used by the cache of each soltab, by default no limit.
 
         Returns
         -------
         list
-            List of solution tables objects for all available soltabs in this solset
+            List of solution tables objects for all available soltabs in this solset.
+            They are opened only when first accessed.
         """
         soltabs = []
-        for soltab in self.obj._v_groups.values():
-            soltabs.append(Soltab(soltab, useCache, sel))
+        for soltabName in self.getSoltabNames():
+            soltabs.append(Soltab((self.obj, soltabName), useCache, sel, cacheSize, lazy=True))
         return soltabs
 
 
@@ -585,7 +1699,7 @@ class Solset( object ):
         return soltabNames
 
 
-    def getSoltab(self, soltab, useCache=False, sel={}):
+    def getSoltab(self, soltab, useCache=False, sel={}, cacheSize=None):
         """
         Get a soltab with a given name.
 
@@ -597,6 +1711,8 @@ class Solset( object ):
             Soltabs obj will use cache, by default False.
         sel : dict, optional
             Selection dict, by default no selection.
+        cacheSize : int, optional
+            Max memory in bytes used by the cache, by default no limit.
 
         Returns
         -------
@@ -609,7 +1725,7 @@ class Solset( object ):
         if not soltab in self.getSoltabNames():
             raise Exception("Solution-table "+soltab+" not found in solset "+self.name+".")
 
-        return Soltab(self.obj._f_get_child(soltab), useCache, sel)
+        return Soltab((self.obj, soltab), useCache, sel, cacheSize, lazy=True)
 
 
     def getAnt(self):
@@ -621,13 +1737,8 @@ class Solset( object ):
         dict
             Available antennas in the form {name1:[position coords], name2:[position coords], ...}.
         """
-        ants = {}
-        try:
-            for x in self.obj.antenna:
-                ants[x['name']] = x['position']
-        except: pass
-
-        return ants
+        names, positions = self.getAntArrays()
+        return dict(zip(names.tolist(), np.array(positions)))
 
 
     def getSou(self):
@@ -639,21 +1750,122 @@ class Solset( object ):
         dict
             Available sources in the form {name1:[ra,dec], name2:[ra,dec], ...}.
         """
-        sources = {}
-        try:
-            for x in self.obj.source:
-                sources[x['name']] = x['dir']
-        except: pass
+        names, dirs = self.getSouArrays()
+        return dict(zip(names.tolist(), np.array(dirs)))
 
-        return sources
 
-    def getAntDist(self, ant=None):
+    def getAntArrays(self):
         """
-        Get antenna distance to a specified one.
+        Get antenna names and positions as arrays. The antenna table is decoded once
+        and cached until it is modified.
 
-        Parameters
-        ----------
-        ant : str
+        Returns
+        -------
+        array, array
+            Read-only arrays of the antenna names (N) and positions (Nx3).
+        """
+        table = self._getTable('antenna', 'position')
+        return table['names'], table['coords']
+
+
+    def getSouArrays(self):
+        """
+        Get source names and directions as arrays. The source table is decoded once
+        and cached until it is modified.
+
+        Returns
+        -------
+        array, array
+            Read-only arrays of the source names (N) and directions (Nx2).
+        """
+        table = self._getTable('source', 'dir')
+        return table['names'], table['coords']
+
+
+    def getAntIndex(self, ant):
+        """
+        Get the position of an antenna in the arrays returned by getAntArrays().
+
+        Parameters
+        ----------
+        ant : str or list
+            Antenna name or list of names.
+
+        Returns
+        -------
+        int or list
+            Index or list of indexes.
+        """
+        return self._getTableIndex('antenna', 'position', ant)
+
+
+    def getSouIndex(self, sou):
+        """
+        Get the position of a source in the arrays returned by getSouArrays().
+
+        Parameters
+        ----------
+        sou : str or list
+            Source name or list of names.
+
+        Returns
+        -------
+        int or list
+            Index or list of indexes.
+        """
+        return self._getTableIndex('source', 'dir', sou)
+
+
+    def _getTable(self, tableName, coordsName):
+        """
+        Read an antenna/source table with a single bulk read and cache it. The table is read at each
+        call (rows can be modified in place by any pytables write), names and coordinates are decoded
+        and indexed again only when the read rows differ from the cached ones.
+
+        Returns
+        -------
+        dict
+            With 'names', 'coords' (read-only arrays) and 'index' (name -> position) entries.
+        """
+        cache = self._getCache()
+        if not tableName in self.obj._v_children:
+            version = None
+        else:
+            node = self.obj._f_get_child(tableName)
+            rows = node.read()
+            version = (node._v_objectid, rows.dtype.descr, rows.tobytes())
+
+        if not tableName in cache or cache[tableName]['version'] != version:
+            if version is None:
+                names = np.array([], dtype=str)
+                coords = np.zeros((0, 3 if coordsName == 'position' else 2))
+            else:
+                names = np.array([n.decode() if isinstance(n, bytes) else str(n) for n in rows['name']], dtype=str)
+                coords = np.array(rows[coordsName])
+            names.flags.writeable = False
+            coords.flags.writeable = False
+            cache[tableName] = {'version': version, 'names': names, 'coords': coords, \
+                    'index': {name: i for i, name in enumerate(names.tolist())}}
+        return cache[tableName]
+
+
+    def _getTableIndex(self, tableName, coordsName, names):
+        index = self._getTable(tableName, coordsName)['index']
+        for name in (names if type(names) is list else [names]):
+            if not name in index:
+                raise Exception("Missing %s %s in %s table." % (tableName, name, tableName))
+        if type(names) is list:
+            return [index[name] for name in names]
+        return index[names]
+
+
+    def getAntDist(self, ant=None):
+        """
+        Get antenna distance to a specified one.
+
+        Parameters
+        ----------
+        ant : str
             An antenna name.
 
         Returns
@@ -662,15 +1874,732 @@ class Solset( object ):
             Dict of distances to each antenna. The distance with the antenna "ant" is 0.
         """
         if ant is None:
-            raise "Missing antenna name."
+            raise Exception("Missing antenna name.")
+
+        antNames, antDists = self.getAntDistMatrix()
+
+        if not ant in antNames:
+            raise Exception("Missing antenna %s in antenna table." % ant)
+
+        return dict(zip(antNames, antDists[antNames.index(ant)]))
+
+
+    def getAntDistMatrix(self):
+        """
+        Get the distances between all the antennas of the antenna table.
+        The matrix is computed once and cached until the antenna table is modified.
+
+        Returns
+        -------
+        list, array
+            The antenna names and the matrix of their distances (same order of the names).
+        """
+        cache = self._getCache()
+        table = self._getTable('antenna', 'position')
+        if cache.get('antDist', (None,))[0] is not table:
+            pos = np.array(table['coords'], dtype=float)
+            antDists = np.sqrt( ((pos[:,np.newaxis,:] - pos[np.newaxis,:,:])**2).sum(axis=-1) )
+            antDists.flags.writeable = False
+            cache['antDist'] = (table, antDists)
+
+        return table['names'].tolist(), cache['antDist'][1]
+
+
+    def _getCache(self):
+        """
+        Get the dict used to cache data derived from the solset tables. It is stored in the
+        pytables group, so it is shared by all the Solset objs of the same solset.
+        """
+        if not '_losotoCache' in self.obj.__dict__:
+            self.obj._losotoCache = {}
+        return self.obj._losotoCache
+
+
+
+class _RegionCache( object ):
+    """
+    In-memory cache of a val/weight array. Data are loaded lazily by regions (blocks of a regular grid
+    over the array), regions modified by a write are marked dirty and only those are written back
+    by flush(). If a memory limit is set, the least recently used regions are evicted (dirty ones are
+    written back first). Indexing is orthogonal: each list selects independently along its axis.
+
+    Parameters
+    ----------
+    node : pytables Array obj
+        The val or weight array.
+    regionShape : tuple
+        Shape of a region.
+    maxMemory : int, optional
+        Max memory in bytes used by the cached regions, by default None (no limit).
+    """
+
+    def __init__(self, node, regionShape, maxMemory=None):
+
+        self.node = node
+        self.shape = tuple(node.shape)
+        self.dtype = node.dtype
+        self.ndim = len(self.shape)
+        self.regionShape = tuple(regionShape)
+        self.maxMemory = maxMemory
+        self.regions = OrderedDict() # region index -> array, in LRU order
+        self.dirty = set()
+        self.nbytes = 0
+
+
+    def _regionSlices(self, r):
+        return tuple([slice(i*s, min((i+1)*s, l)) for i, s, l in zip(r, self.regionShape, self.shape)])
+
+
+    def _getRegion(self, r):
+        if r in self.regions:
+            self.regions.move_to_end(r)
+            return self.regions[r]
+        data = self.node[self._regionSlices(r)]
+        self.regions[r] = data
+        self.nbytes += data.nbytes
+        self._evict(keep=r)
+        return data
+
+
+    def _evict(self, keep):
+        if self.maxMemory is None: return
+        for r in list(self.regions.keys()):
+            if self.nbytes <= self.maxMemory: break
+            if r == keep: continue
+            if r in self.dirty:
+                self.node[self._regionSlices(r)] = self.regions[r]
+                self.dirty.discard(r)
+            self.nbytes -= self.regions.pop(r).nbytes
+
+
+    def _split(self, key):
+        """
+        Normalize the selection and group the selected indexes by region along each axis.
+
+        Returns
+        -------
+        list of lists of (region index, output positions, positions in the region) for each axis,
+        the output shape with 1 for the removed axes and the axes which are not removed
+        """
+        idxs, keepAxes = _normalizeKey(key, self.shape)
+        groups = []
+        outShape = []
+        for idx, s in zip(idxs, self.regionShape):
+            outShape.append(len(idx))
+            rIdx = idx // s
+            axisGroups = []
+            for r in np.unique(rIdx):
+                outPos = np.where(rIdx == r)[0]
+                axisGroups.append((int(r), _toSlice(outPos), _toSlice(idx[outPos] - r*s)))
+            groups.append(axisGroups)
+        return groups, tuple(outShape), keepAxes
+
+
+    def __getitem__(self, key):
+        groups, outShape, keepAxes = self._split(key)
+        out = np.empty(outShape, dtype=self.dtype)
+        for comb in itertools.product(*groups):
+            region = self._getRegion(tuple([c[0] for c in comb]))
+            out[_ixSelection([c[1] for c in comb])] = region[_ixSelection([c[2] for c in comb])]
+        return out.reshape([outShape[axis] for axis in keepAxes])
+
+
+    def __setitem__(self, key, vals):
+        groups, outShape, keepAxes = self._split(key)
+        vals = np.asarray(vals)
+        if vals.size == np.prod(outShape): vals = vals.reshape(outShape)
+        else: vals = np.broadcast_to(vals, outShape)
+        for comb in itertools.product(*groups):
+            r = tuple([c[0] for c in comb])
+            region = self._getRegion(r)
+            region[_ixSelection([c[2] for c in comb])] = vals[_ixSelection([c[1] for c in comb])]
+            self.dirty.add(r)
+
+
+    def flush(self):
+        """
+        Write back the dirty regions.
+
+        Returns
+        -------
+        int
+            Number of bytes written.
+        """
+        written = 0
+        for r in sorted(self.dirty):
+            self.node[self._regionSlices(r)] = self.regions[r]
+            written += self.regions[r].nbytes
+        self.dirty = set()
+        return written
+
+
+    def clear(self):
+        """
+        Write back the dirty regions and drop all the regions, e.g. after the array was modified
+        by other processes.
+        """
+        self.flush()
+        self.regions = OrderedDict()
+        self.nbytes = 0
+
+
+# cost of a single I/O call, in bytes of data transferred in the same time
+_IO_OP_COST = 64*1024
+# size of the HDF5 sieve buffer: strided reads shorter than this read the whole buffer
+_IO_SIEVE = 64*1024
+
+def _normalizeKey(key, shape):
+    """
+    Normalize an orthogonal selection (a slice, list or int per axis) to the selected indexes.
+
+    Returns
+    -------
+    list of arrays with the selected indexes along each axis, list of the axes not removed by an int selection
+    """
+    if not isinstance(key, tuple): key = (key,)
+    key = list(key)
+    ellipsis = [i for i, sel in enumerate(key) if sel is Ellipsis]
+    if ellipsis:
+        key[ellipsis[0]:ellipsis[0]+1] = [slice(None)] * (len(shape) - len(key) + 1)
+    key = key + [slice(None)] * (len(shape) - len(key))
+    idxs = []
+    keepAxes = []
+    for axis, (sel, l) in enumerate(zip(key, shape)):
+        if isinstance(sel, slice):
+            idx = np.arange(l)[sel]
+        else:
+            idx = np.atleast_1d(np.array(sel, dtype=int))
+            idx[idx < 0] += l
+        if not isinstance(sel, (int, np.integer)): keepAxes.append(axis)
+        idxs.append(idx)
+    return idxs, keepAxes
+
+
+def _packFlags(flags, axis):
+    """
+    Pack a boolean array in bits along an axis.
+    """
+    return np.packbits(np.asarray(flags, dtype=bool), axis=axis)
+
+
+class _PackedFlags( object ):
+    """
+    Weights stored as bit-packed flags: one bit per element (set if flagged), packed along one axis.
+    They are accessed as an array of weights equal to 0 (flagged) or 1 (not flagged), any non-zero
+    weight written is stored as 1. Indexing is orthogonal: each list selects independently along its axis.
+
+    Parameters
+    ----------
+    node : pytables Array obj
+        The packed flags array, with the unpacked shape and the packed axis in the attributes.
+    """
+
+    def __init__(self, node):
+
+        self.node = node
+        self.shape = tuple([int(l) for l in node.attrs['SHAPE']])
+        self.packedAxis = int(node.attrs['PACKED_AXIS'])
+        self.dtype = np.dtype(np.float16)
+        self.ndim = len(self.shape)
+
+
+    def _split(self, key):
+        """
+        Normalize the selection.
+
+        Returns
+        -------
+        the selected indexes for each axis, the axes which are not removed, the selection of the
+        packed array and the first byte read along the packed axis
+        """
+        idxs, keepAxes = _normalizeKey(key, self.shape)
+
+        # the bytes covering the selection along the packed axis
+        idx = idxs[self.packedAxis]
+        b0 = int(idx.min()) // 8 if len(idx) > 0 else 0
+        b1 = int(idx.max()) // 8 + 1 if len(idx) > 0 else 0
+        diskSel = [_toSlice(idx) for idx in idxs]
+        diskSel[self.packedAxis] = slice(b0, b1)
+        return idxs, keepAxes, diskSel, b0
+
+
+    def getFlags(self, key):
+        """
+        Read the flags of a selection as a boolean array (True if flagged), without making weights.
+        """
+        idxs, keepAxes, diskSel, b0 = self._split(key)
+        outShape = [len(idx) for idx in idxs]
+        if np.prod(outShape) == 0:
+            return np.zeros(outShape, dtype=bool).reshape([outShape[axis] for axis in keepAxes])
+
+        packed = _SelectionPlan(diskSel, self.node.shape, 1).read(self.node)
+        flags = np.take(np.unpackbits(packed, axis=self.packedAxis), idxs[self.packedAxis] - b0*8, axis=self.packedAxis)
+        return flags.astype(bool).reshape([outShape[axis] for axis in keepAxes])
+
+
+    def setFlags(self, key, flags, add=False):
+        """
+        Write the flags of a selection (True if flagged). If add is True the elements already
+        flagged stay flagged (the new flags are or-ed with the stored bits).
+        """
+        idxs, keepAxes, diskSel, b0 = self._split(key)
+        outShape = [len(idx) for idx in idxs]
+        if np.prod(outShape) == 0: return
+        flags = np.asarray(flags, dtype=bool)
+        if flags.size == np.prod(outShape): flags = flags.reshape(outShape)
+        else: flags = np.broadcast_to(flags, outShape)
+
+        # read-modify-write of the bytes covering the selection
+        packed = _SelectionPlan(diskSel, self.node.shape, 1).read(self.node)
+        diskFlags = np.unpackbits(packed, axis=self.packedAxis)
+        flagSel = [slice(None)] * self.ndim
+        flagSel[self.packedAxis] = idxs[self.packedAxis] - b0*8
+        if add:
+            diskFlags[tuple(flagSel)] |= flags
+        else:
+            diskFlags[tuple(flagSel)] = flags
+        _SelectionPlan(diskSel, self.node.shape, 1, write=True).write(self.node, _packFlags(diskFlags, self.packedAxis))
+
+
+    def __getitem__(self, key):
+        return np.logical_not(self.getFlags(key)).astype(self.dtype)
+
+
+    def __setitem__(self, key, vals):
+        self.setFlags(key, np.asarray(vals) == 0)
+
 
-        ants = self.getAnt()
+_QUANT_MAX = 32767 # quantized values are in [-_QUANT_MAX, _QUANT_MAX]
+_QUANT_NAN = -32768 # quantized NaN
 
-        if not ant in list(ants.keys()):
-            raise "Missing antenna %s in antenna table." % ant 
 
-        return {a:np.sqrt( (loc[0]-ants[ant][0])**2 + (loc[1]-ants[ant][1])**2 + (loc[2]-ants[ant][2])**2 ) for a, loc in ants.items() }
+def _getQuantization(vals, soltype):
+    """
+    Get the scale and offset to store values as 16 bit integers.
+    Phases are quantized over at least [-pi, pi], positive amplitudes as log10.
+
+    Parameters
+    ----------
+    vals : array
+        The values.
+    soltype : str
+        The solution type.
+
+    Returns
+    -------
+    dict
+        The quantization attributes: QUANT_SCALE, QUANT_OFFSET, QUANT_LOG and QUANT_MAX_ERROR
+        (max absolute error, of log10 for amplitudes).
+    """
+    finite = vals[np.isfinite(vals)]
+    useLog = soltype == 'amplitude' and len(finite) > 0 and np.all(finite > 0)
+    if useLog: finite = np.log10(finite)
+    vmin, vmax = (np.min(finite), np.max(finite)) if len(finite) > 0 else (0., 0.)
+    if soltype in ['phase', 'scalarphase', 'rotation']:
+        vmin, vmax = min(vmin, -np.pi), max(vmax, np.pi)
+    scale = (vmax - vmin) / (2. * _QUANT_MAX) if vmax > vmin else 1.
+    return {'QUANT_SCALE': float(scale), 'QUANT_OFFSET': float((vmax + vmin) / 2.), 'QUANT_LOG': bool(useLog), 'QUANT_MAX_ERROR': float(scale / 2.)}
+
+
+class _QuantizedValues( object ):
+    """
+    Values stored as 16 bit integers with a scale and an offset (and as log10 for amplitudes),
+    decoded when read and encoded when written. Values outside the quantization range are clipped.
+    Indexing is orthogonal: each list selects independently along its axis.
+
+    Parameters
+    ----------
+    node : pytables Array obj
+        The quantized values array, with the quantization in the attributes (see _getQuantization()).
+    quantization : dict, optional
+        The quantization, by default read from the node attributes. Without a node only encode()
+        and decode() can be used.
+    """
+
+    def __init__(self, node, quantization=None):
+
+        self.node = node
+        if quantization is None:
+            quantization = {attr: node.attrs[attr] for attr in ['QUANT_SCALE', 'QUANT_OFFSET', 'QUANT_LOG', 'QUANT_MAX_ERROR']}
+        self.scale = float(quantization['QUANT_SCALE'])
+        self.offset = float(quantization['QUANT_OFFSET'])
+        self.log = bool(quantization['QUANT_LOG'])
+        self.maxError = float(quantization['QUANT_MAX_ERROR'])
+        self.dtype = np.dtype(np.float64)
+        if node is not None:
+            self.shape = tuple(node.shape)
+            self.ndim = len(self.shape)
+            self.chunkshape = node.chunkshape
+
+
+    def decode(self, q):
+        vals = q * self.scale + self.offset
+        vals[q == _QUANT_NAN] = np.nan
+        if self.log: vals = 10**vals
+        return vals
+
+
+    def encode(self, vals):
+        vals = np.array(vals, dtype=float)
+        nans = np.isnan(vals)
+        if self.log:
+            with np.errstate(invalid='ignore', divide='ignore'):
+                vals = np.log10(vals)
+        q = np.round((vals - self.offset) / self.scale)
+        if np.any(np.abs(q[~nans]) > _QUANT_MAX):
+            logging.warning('Values outside the quantization range are clipped.')
+        q = np.clip(np.nan_to_num(q), -_QUANT_MAX, _QUANT_MAX).astype(np.int16)
+        q[nans] = _QUANT_NAN
+        return q
+
+
+    def __getitem__(self, key):
+        idxs, keepAxes = _normalizeKey(key, self.shape)
+        outShape = [len(idx) for idx in idxs]
+        if np.prod(outShape) == 0:
+            return np.empty(outShape, dtype=self.dtype).reshape([outShape[axis] for axis in keepAxes])
+        q = _SelectionPlan([_toSlice(idx) for idx in idxs], self.shape, 2).read(self.node)
+        return self.decode(q).reshape([outShape[axis] for axis in keepAxes])
+
+
+    def __setitem__(self, key, vals):
+        idxs, keepAxes = _normalizeKey(key, self.shape)
+        outShape = [len(idx) for idx in idxs]
+        if np.prod(outShape) == 0: return
+        vals = np.asarray(vals)
+        if vals.size == np.prod(outShape): vals = vals.reshape(outShape)
+        else: vals = np.broadcast_to(vals, outShape)
+        _SelectionPlan([_toSlice(idx) for idx in idxs], self.shape, 2, write=True).write(self.node, self.encode(vals))
+
+
+class _SelectionPlan( object ):
+    """
+    Plan to read or write an orthogonal selection (a slice, list or int per axis) of an on-disk array
+    with a small number of hyperslab operations. For each axis the selected indexes can be:
+    * split in runs of consecutive indexes (one operation per run),
+    * covered by their bounding box (one operation, read-modify-write when writing),
+    * passed as a list to pyTables (one operation, at most one axis).
+    The combination with the lowest estimated cost (number of operations and bytes touched on disk) is chosen.
+
+    Parameters
+    ----------
+    selection : list
+        A slice, list or int for each axis.
+    shape : tuple
+        Shape of the array.
+    itemsize : int
+        Size in bytes of an element.
+    write : bool, optional
+        If True the plan is optimized for writing, by default False.
+    """
 
+    def __init__(self, selection, shape, itemsize, write=False):
+
+        self.outShape = [] # shape of the selected data (1 for int selections)
+        self.keepAxes = [] # axes not removed by an int selection
+        # for each axis, list of possible (mode, entries, elements per operation, pieces per operation, extent per operation)
+        candidates = []
+
+        for axis, (sel, l) in enumerate(zip(selection, shape)):
+            if isinstance(sel, (int, np.integer)):
+                idx = np.array([sel if sel >= 0 else sel + l])
+            else:
+                self.keepAxes.append(axis)
+                idx = np.arange(l)[sel] if isinstance(sel, slice) else np.array(sel, dtype=int)
+                idx[idx < 0] += l
+            n = len(idx)
+            self.outShape.append(n)
+
+            if isinstance(sel, slice) and n > 0:
+                # strided slices are handled natively
+                step = sel.step or 1
+                candidates.append([('runs', [(slice(int(idx[0]), int(idx[-1])+1, step), slice(0, n), None)], \
+                        n, n if abs(step) > 1 else 1, int(abs(idx[-1] - idx[0])) + 1)])
+                continue
+
+            # runs of consecutive indexes
+            breaks = np.where(np.diff(idx) != 1)[0] + 1
+            starts = np.concatenate([[0], breaks]).astype(int)
+            stops = np.concatenate([breaks, [n]]).astype(int)
+            runs = [(slice(int(idx[a]), int(idx[b-1])+1), slice(int(a), int(b)), None) for a, b in zip(starts, stops)]
+            axisCandidates = [('runs', runs, float(n)/len(runs), 1, float(n)/len(runs))]
+            if len(runs) > 1:
+                bmin, bmax = int(idx.min()), int(idx.max())
+                extent = bmax - bmin + 1
+                axisCandidates.append(('bbox', [(slice(bmin, bmax+1), slice(0, n), idx - bmin)], extent, 1, extent))
+                if np.all(np.diff(idx) > 0):
+                    axisCandidates.append(('list', [(idx.tolist(), slice(0, n), None)], n, len(runs), extent))
+            candidates.append(axisCandidates)
+
+        # choose the cheapest combination
+        bestCost = None
+        for comb in itertools.product(*candidates):
+            modes = [c[0] for c in comb]
+            if modes.count('list') > 1: continue
+            nOps = np.prod([len(c[1]) for c in comb])
+            opBytes = self._opBytes(shape, itemsize, [c[2] for c in comb], [c[3] for c in comb], [c[4] for c in comb])
+            if write and 'bbox' in modes: opBytes *= 2 # read-modify-write
+            cost = nOps * (_IO_OP_COST + opBytes)
+            if bestCost is None or cost < bestCost:
+                bestCost = cost
+                self.modes = modes
+                self.entries = [c[1] for c in comb]
+        self.nOps = int(np.prod([len(e) for e in self.entries]))
+
+
+    @staticmethod
+    def _opBytes(shape, itemsize, counts, pieces, extents):
+        """
+        Estimate the bytes touched on disk by a single hyperslab operation on a contiguous array.
+        Going from the fastest varying axis, rows shorter than the sieve buffer are read whole,
+        along the first longer axis each piece (or the whole extent, if cheaper) costs at least a sieve buffer.
+        """
+        b = float(itemsize)
+        for a in reversed(range(len(shape))):
+            if pieces[a] == 1 and counts[a] == shape[a]:
+                b *= shape[a]
+                continue
+            if b * shape[a] <= _IO_SIEVE:
+                b *= shape[a]
+                continue
+            rowBytes = min(pieces[a] * max(float(counts[a])/pieces[a]*b, _IO_SIEVE), max(extents[a]*b, _IO_SIEVE))
+            return rowBytes * np.prod(counts[:a])
+        return b
+
+
+    def _iterOps(self):
+        for comb in itertools.product(*self.entries):
+            diskSel = tuple([c[0] for c in comb])
+            valSel = tuple([c[1] for c in comb])
+            inner = None
+            if any([c[2] is not None for c in comb]):
+                inner = [c[2] if c[2] is not None else slice(0, c[1].stop - c[1].start) for c in comb]
+                inner = _ixSelection(inner)
+            yield diskSel, valSel, inner
+
+
+    def read(self, data):
+        """
+        Read the selection.
+
+        Parameters
+        ----------
+        data : pytables Array obj or array
+
+        Returns
+        -------
+        array
+            The selected data, axes selected with an int are removed.
+        """
+        out = np.empty(self.outShape, dtype=data.dtype)
+        for diskSel, valSel, inner in self._iterOps():
+            block = data[diskSel]
+            if inner is not None: block = block[inner]
+            out[valSel] = block
+        return out.reshape([self.outShape[axis] for axis in self.keepAxes])
+
+
+    def write(self, data, vals):
+        """
+        Write the selection.
+
+        Parameters
+        ----------
+        data : pytables Array obj
+        vals : array or float
+            Values with the size of the selection (they are reshaped) or a scalar.
+        """
+        vals = np.asarray(vals)
+        if vals.ndim > 0:
+            # the reshape is needed when saving e.g. [512] (vals shape) into [512,1,1] (selection output)
+            if vals.size == np.prod(self.outShape): vals = vals.reshape(self.outShape)
+            else: vals = np.broadcast_to(vals, self.outShape)
+        for diskSel, valSel, inner in self._iterOps():
+            v = vals if vals.ndim == 0 else vals[valSel]
+            if inner is None:
+                data[diskSel] = v
+            else:
+                block = data[diskSel]
+                block[inner] = v
+                data[diskSel] = block
+
+
+def _toSlice(idx):
+    """
+    Convert an array of increasing indexes to a slice if they are continuous.
+    """
+    if len(idx) > 0 and idx[-1] - idx[0] == len(idx) - 1:
+        return slice(int(idx[0]), int(idx[-1])+1)
+    return idx
+
+
+def _ixSelection(sel):
+    """
+    Orthogonal selection from a list of slices (with explicit start/stop) and index arrays.
+    """
+    if len([s for s in sel if not isinstance(s, slice)]) <= 1: return tuple(sel)
+    return np.ix_(*[np.arange(s.start, s.stop) if isinstance(s, slice) else s for s in sel])
+
+
+_axisIndexes = OrderedDict() # shared _AxisIndex objs, indexed by axis name and content
+_AXIS_INDEXES_MAX = 256
+
+
+def _getAxisIndex(axis, axisVals):
+    """
+    Get the _AxisIndex of an axis. Soltabs with identical axes (as normally all soltabs
+    in a solset) share the same obj and therefore the same compiled selections.
+
+    Parameters
+    ----------
+    axis : str
+        The name of the axis.
+    axisVals : array
+        The axis values (strings already decoded).
+
+    Returns
+    -------
+    _AxisIndex obj
+    """
+    key = (axis, axisVals.dtype.str, len(axisVals), hashlib.sha1(np.ascontiguousarray(axisVals).tobytes()).hexdigest())
+    if key in _axisIndexes:
+        _axisIndexes.move_to_end(key)
+    else:
+        _axisIndexes[key] = _AxisIndex(axisVals)
+        while len(_axisIndexes) > _AXIS_INDEXES_MAX:
+            _axisIndexes.popitem(last=False)
+    return _axisIndexes[key]
+
+
+class _AxisIndex( object ):
+    """
+    Index of the values of an axis used to resolve selections without scanning the axis.
+    Exact matches use a hash table, min/max ranges a binary search if the axis is sorted.
+    Resolved selections are compiled once and memoized.
+
+    Parameters
+    ----------
+    axisVals : array
+        The axis values (strings already decoded).
+    """
+
+    def __init__(self, axisVals):
+        self.vals = np.array(axisVals)
+        self.vals.flags.writeable = False
+        self.isStr = self.vals.dtype.kind in 'SU'
+        self.isSorted = not self.isStr and (len(self.vals) < 2 or bool(np.all(self.vals[1:] >= self.vals[:-1])))
+        self.positions = None # value -> list of indexes, built on first exact matching
+        self.compiled = {}
+
+
+    def _getPositions(self):
+        if self.positions is None:
+            self.positions = {}
+            for i, item in enumerate(self.vals.tolist()):
+                self.positions.setdefault(item, []).append(i)
+        return self.positions
+
+
+    def select(self, selVal, axis=''):
+        """
+        Compile a selection (see Soltab.setSelection()) on this axis.
+
+        Parameters
+        ----------
+        selVal : str, dict, list or single value
+            The selection criteria.
+        axis : str, optional
+            Axis name, only used for logging.
+
+        Returns
+        -------
+        slice, list or None
+            The selected indexes. None if the selection is ignored (all values are used),
+            False if a single value cannot be found.
+        """
+        if type(selVal) is np.ndarray: selVal = selVal.tolist()
+        if type(selVal) is dict:
+            key = ('dict', tuple(sorted(selVal.items())))
+        elif type(selVal) is list:
+            key = ('list', tuple(selVal))
+        else:
+            key = (type(selVal).__name__, selVal)
+        try:
+            if not key in self.compiled:
+                self.compiled[key] = self._compile(selVal, axis)
+            sel = self.compiled[key]
+        except TypeError: # unhashable criteria, do not memoize
+            sel = self._compile(selVal, axis)
+        return list(sel) if type(sel) is list else sel
+
+
+    def _compile(self, selVal, axis):
+        axisVals = self.vals
+
+        # string -> regular expression
+        if type(selVal) is str:
+            if not self.isStr:
+                logging.warning("Cannot select on axis \""+axis+"\" with a regular expression. Use all available values.")
+                return None
+            regexp = re.compile(selVal)
+            sel = [i for i, item in enumerate(axisVals.tolist()) if regexp.search(item)]
+
+        # dict -> min max
+        elif type(selVal) is dict:
+            # some checks
+            if 'min' in selVal and selVal['min'] > np.max(axisVals):
+                logging.error("Selection with min > than maximum value. Use all available values.")
+                return None
+            if 'max' in selVal and selVal['max'] < np.min(axisVals):
+                logging.error("Selection with max < than minimum value. Use all available values.")
+                return None
+            if not 'min' in selVal and not 'max' in selVal:
+                logging.error("Selection with a dict must have 'min' and/or 'max' entry. Use all available values.")
+                return None
+
+            if self.isSorted:
+                start = int(np.searchsorted(axisVals, selVal['min'], side='left')) if 'min' in selVal else 0
+                stop = int(np.searchsorted(axisVals, selVal['max'], side='right')) if 'max' in selVal else None
+            else:
+                start = int(np.where(axisVals >= selVal['min'])[0][0]) if 'min' in selVal else 0
+                stop = int(np.where(axisVals <= selVal['max'])[0][-1])+1 if 'max' in selVal else None
+            return slice(start, stop, selVal.get('step'))
+
+        # single val/list -> exact matching
+        else:
+            if not type(selVal) is list: selVal = [selVal]
+            # convert to correct data type (from parset everything is a str)
+            if not self.isStr:
+                selVal = np.array(selVal, dtype=axisVals.dtype).tolist()
+            positions = self._getPositions()
+
+            if len(selVal) == 1:
+                # speedup in the common case of a single value
+                if not selVal[0] in positions:
+                    logging.error('Cannot find value %s in axis %s. Skip selection.' % (selVal[0], axis))
+                    return False
+                sel = positions[selVal[0]][0:1]
+            else:
+                sel = sorted(itertools.chain.from_iterable(positions[item] for item in set(selVal) if item in positions))
+
+        # transform list of 1 element in a relative slice(), faster as it gets a reference
+        if len(sel) == 1: return slice(sel[0], sel[0]+1)
+        # transform list of continuous numbers in slices, faster as it gets a reference
+        elif type(selVal) is list and len(sel) != 0 and len(sel)-1 == sel[-1] - sel[0]:
+            return slice(sel[0], sel[-1]+1)
+        return sel
+
+
+_FLAG_SUMMARY_AXES = ['ant', 'dir', 'pol'] # axes of the flag summary of a soltab
+
+
+def _isSameSelection(sel1, sel2):
+    """
+    Check if two selections (slice, list or array of indexes) of an axis are the same.
+    """
+    if sel1 is sel2: return True
+    if isinstance(sel1, slice) or isinstance(sel2, slice): return sel1 == sel2
+    return np.array_equal(sel1, sel2)
 
 
 class Soltab( object ):
@@ -678,10 +2607,11 @@ class Soltab( object ):
     Parameters
     ----------
     soltab : pytables Table obj
-        Pytable Table object.
+        Pytable Table object. If lazy, a tuple of (solset pytables Group obj, soltab name).
     useCache : bool, optional
-        Cache all data in memory, by default False.
-    **args : optional
+        Cache data in memory, by default False. Data are loaded lazily by regions and only the modified regions
+        are written back by flush().
+    args : dict, optional
         Used to create a selection.
         Selections examples:
         axisName = None # to select all
@@ -691,9 +2621,25 @@ class Soltab( object ):
         axisName = {min: xxx} # to selct values grater or equal than xxx
         axisName = {max: yyy} # to selct values lower or equal than yyy
         axisName = {min: xxx, max: yyy} # to selct values greater or equal than xxx and lower or equal than yyy
+    cacheSize : int, optional
+        Max memory in bytes used by the cache, least recently used regions are evicted above it. By default no limit.
+    lazy : bool, optional
+        If True nothing is read from the file until the first access to the soltab
+        (only the name is available before), by default False.
     """
 
-    def __init__(self, soltab, useCache = False, args = {}):
+    def __init__(self, soltab, useCache = False, args = {}, cacheSize = None, lazy = False):
+
+        self.deferFlush = False # set if the cache is written back by a working set (see lib_losoto.WorkingSet)
+        if lazy:
+            # opened by __getattr__ on first access to any missing attribute
+            self._lazy = (soltab, useCache, args, cacheSize)
+            self.name = soltab[1]
+            return
+        self._open(soltab, useCache, args, cacheSize)
+
+
+    def _open(self, soltab, useCache, args, cacheSize):
 
         if not isinstance( soltab, tables.Group ):
             logging.error("Object must be initialized with a pyTables Table object.")
@@ -701,6 +2647,7 @@ class Soltab( object ):
 
         self.obj = soltab
         self.name = soltab._v_name
+        self._openNodes()
 
         # list of axes names, set once to speed up calls
         axesNamesInH5 = soltab.val.attrs['AXES']
@@ -713,53 +2660,330 @@ class Soltab( object ):
         self.axes = {}
         for axis in self.getAxesNames():
             self.axes[axis] = soltab._f_get_child(axis)
+        self.axesVals = {} # read-only in-memory axes values, set on first use
+        self.axesSelVals = {} # memoized (selection, values) of the selected axes values
+        self.axesIndex = {} # _AxisIndex objs used for selections, set on first use
 
         # initialize selection
         self.setSelection(**args)
 
-        self.useCache = useCache
+        self.useCache = useCache
+        if self.useCache:
+            logging.debug("Caching...")
+            self.setCache(self.valNode, self.weightNode, cacheSize)
+
+        self.fullyFlaggedAnts = None # this is populated if required by reference
+        self.flagSummary = None # flagged fractions, see getFlagSummary()
+
+        # memory maps of val/weight, created on first access (readonly h5parm opened with memmap=True)
+        self.useMemmap = getattr(soltab._v_file, '_losotoMemmap', False) and not useCache
+        self.memmaps = {}
+
+        self._plans = {} # memoized read/write plans of selections
+        self.stamped = False # write id changed since the cache was written back, see _stamp()
+
+
+    def _openNodes(self):
+        soltab = self.obj
+
+        # values on disk, quantized values are accessed through a _QuantizedValues obj
+        # and soltabs stored as Zarr arrays through _ZarrArray objs
+        if 'STORE' in soltab.val.attrs._v_attrnames:
+            self.store = _getZarrStore(soltab)[1]
+            self.valNode = _ZarrArray(os.path.join(self.store, 'val'))
+        elif 'QUANT_SCALE' in soltab.val.attrs._v_attrnames:
+            self.valNode = _QuantizedValues(soltab.val)
+        else:
+            self.valNode = soltab.val
+
+        # weights on disk, bit-packed flags are accessed through a _PackedFlags obj
+        if 'STORE' in soltab.val.attrs._v_attrnames:
+            self.weightNode = _ZarrArray(os.path.join(self.store, 'weight'))
+        elif 'flag' in soltab._v_children:
+            self.weightNode = _PackedFlags(soltab.flag)
+        else:
+            self.weightNode = soltab.weight
+
+
+    def delete(self):
+        """
+        Delete this soltab.
+        """
+        logging.info("Soltab \""+self.name+"\" deleted.")
+        if self.getStorage() == 'zarr':
+            shutil.rmtree(self.store, ignore_errors=True)
+        self.obj._f_remove(recursive=True)
+
+
+    def rename(self, newname, overwrite=False):
+        """
+        Rename this soltab.
+
+        Parameters
+        ----------
+        newname : str
+            New solution table name.
+        overwrite : bool, optional
+            Overwrite existing soltab with same name.
+        """
+        self.obj._f_rename(newname, overwrite)
+        logging.info('Soltab "'+self.name+'" renamed to "'+newname+'".')
+        self.name = self.obj._v_name
+        if self.getStorage() == 'zarr':
+            # keep the directory named after the soltab
+            relPath, absPath = _getZarrStore(self.obj, create=True)
+            shutil.rmtree(absPath)
+            os.rename(self.store, absPath)
+            _setZarrStore(self.obj, relPath)
+            self.store = absPath
+            self.valNode.path = os.path.join(absPath, 'val')
+            self.weightNode.path = os.path.join(absPath, 'weight')
+
+
+    def setCache(self, val, weight, cacheSize=None):
+        """
+        Set the cache of values and weights. Data are loaded lazily by regions (the chunks
+        for chunked arrays, contiguous slabs of about 4 MB otherwise).
+
+        Parameters
+        ----------
+        val : pytables Array obj or _QuantizedValues obj
+        weight : pytables Array obj or _PackedFlags obj
+        cacheSize : int, optional
+            Max memory in bytes used by the cache, by default None (no limit).
+        """
+        regionShape = val.chunkshape
+        if regionShape is None:
+            regionShape = _getChunkShape(val.shape, [], val.dtype.itemsize, chunkBytes=4*1024*1024)
+
+        # split the memory between val and weight proportionally to their size
+        valSize = weightSize = None
+        if cacheSize is not None:
+            valSize = int(cacheSize * val.dtype.itemsize / (val.dtype.itemsize + weight.dtype.itemsize))
+            weightSize = int(cacheSize) - valSize
+        self.cacheVal = _RegionCache(val, regionShape, valSize)
+        self.cacheWeight = _RegionCache(weight, regionShape, weightSize)
+
+
+    def _getData(self, weight=False):
+        """
+        Get the array (cached or on disk) storing values or weights.
+
+        Parameters
+        ----------
+        weight : bool, optional
+            If true return the weights array, by default False.
+
+        Returns
+        -------
+        array
+            The _RegionCache obj if the cache is used, the np.memmap/_RawChunks obj if memory mapping is used,
+            the _PackedFlags/_QuantizedValues obj for bit-packed weights/quantized values,
+            otherwise the pytables Array obj.
+        """
+        if self.useCache:
+            return self.cacheWeight if weight else self.cacheVal
+
+        node = self.weightNode if weight else self.valNode
+        if self.useMemmap and isinstance(node, tables.Array):
+            if not node.name in self.memmaps:
+                self.memmaps[node.name] = _getMemmap(node) if node.chunkshape is None else _getRawChunks(node)
+                if self.memmaps[node.name] is None:
+                    logging.debug('Cannot memory map %s/%s, reading through pyTables.' % (self.name, node.name))
+            if self.memmaps[node.name] is not None:
+                return self.memmaps[node.name]
+        return node
+
+
+    def getStorage(self):
+        """
+        Get where values and weights are stored (see Solset.makeSoltab()).
+
+        Returns
+        -------
+        str
+            'hdf5' or 'zarr'.
+        """
+        return 'zarr' if isinstance(self.valNode, _ZarrArray) else 'hdf5'
+
+
+    def setStorage(self, storage, complevel=5):
+        """
+        Move values and weights between the h5parm and a directory of Zarr arrays (see Solset.makeSoltab()).
+        The conversion is lossless: dtypes, chunk shape and attributes are kept. With 'zarr' the val and weight
+        nodes in the h5parm become empty arrays with the attributes and the path of the Zarr arrays (STORE
+        attribute, relative to the h5parm directory): readers not aware of it must open the Zarr arrays there.
+
+        Parameters
+        ----------
+        storage : str
+            'hdf5' or 'zarr'.
+        complevel : int, optional
+            Compression level from 0 to 9 of the new arrays (with zlib, or the compression library of
+            the h5parm filters for arrays in the h5parm), by default 5.
+        """
+        assert storage in ['hdf5', 'zarr'], "Allowed storages are 'hdf5', 'zarr'"
+        if storage == self.getStorage(): return
+        if isinstance(self.valNode, _QuantizedValues) or self.isPacked():
+            raise Exception('Quantized values and bit-packed flags cannot be stored as Zarr arrays.')
+        if self.getAppendAxis() is not None:
+            raise Exception('Extendable soltabs cannot be stored as Zarr arrays.')
+        if self.useCache: self.flush(force=True)
+
+        logging.info('Moving soltab '+self.name+' to '+storage+' storage.')
+        f = self.obj._v_file
+        dims = self.getAxesNames()
+        oldVal = self.obj.val
+        if storage == 'zarr':
+            chunkShape = oldVal.chunkshape
+            if chunkShape is None: chunkShape = _getChunkShape(oldVal.shape, [], oldVal.dtype.itemsize)
+            relPath, absPath = _getZarrStore(self.obj, create=True)
+            _makeZarrArray(os.path.join(absPath, 'val'), oldVal, chunkShape, complevel, np.nan, dims)
+            _makeZarrArray(os.path.join(absPath, 'weight'), self.obj.weight, chunkShape, complevel, 0, dims)
+            val = f.create_array(self.obj, 'val_new', obj=np.zeros(0, dtype=oldVal.dtype))
+            oldVal.attrs._f_copy(val)
+            oldWeight = self.obj.weight
+            weight = f.create_array(self.obj, 'weight_new', obj=np.zeros(0, dtype=oldWeight.dtype))
+            oldWeight.attrs._f_copy(weight)
+            oldWeight._f_remove()
+            weight._f_rename('weight')
+            val.attrs['STORE'] = weight.attrs['STORE'] = relPath
+        else:
+            filters = tables.Filters(complevel=complevel, complib=f.filters.complib or 'zlib', shuffle=True)
+            if 'weight' in self.obj._v_children: self.obj.weight._f_remove()
+            for name, data in [('val_new', self.valNode), ('weight', self.weightNode)]:
+                node = f.create_carray(self.obj, name, atom=tables.Atom.from_dtype(data.dtype), shape=data.shape, \
+                        chunkshape=data.chunkshape, filters=filters)
+                for start in range(0, data.shape[0], data.chunkshape[0]):
+                    node[start:start+data.chunkshape[0]] = data[start:start+data.chunkshape[0]]
+                if name == 'weight': node.attrs['AXES'] = oldVal.attrs['AXES']
+            oldVal.attrs._f_copy(self.obj.val_new)
+            del self.obj.val_new.attrs['STORE']
+            shutil.rmtree(self.store)
+        oldVal._f_remove()
+        self.obj.val_new._f_rename('val')
+        f.flush()
+
+        # reopen, keeping the selection and the cache
+        selection = self.selection
+        cacheSize = None
+        if self.useCache and self.cacheVal.maxMemory is not None:
+            cacheSize = self.cacheVal.maxMemory + self.cacheWeight.maxMemory
+        self._open(self.obj, self.useCache, {}, cacheSize)
+        self.selection = selection
+
+
+    def getParallelWriter(self, weight=False):
+        """
+        Get an obj that worker processes can use to write values or weights directly into a soltab
+        stored as Zarr arrays (see Solset.makeSoltab()): writer[tuple(selection)] = vals, with the
+        selection on the whole soltab (e.g. the one returned by getValuesIter()).
+        Call endParallelWrite() once the workers are done.
+
+        Parameters
+        ----------
+        weight : bool, optional
+            If true get the writer of the weights, by default False.
+
+        Returns
+        -------
+        _ZarrArray obj
+            The writer, None if the soltab is stored in the h5parm: results must be written
+            by this process with setValues().
+        """
+        if self.getStorage() != 'zarr':
+            return None
+        self._stamp()
+        # workers must not be overwritten by cached data
         if self.useCache:
-            logging.debug("Caching...")
-            self.setCache(self.obj.val, self.obj.weight)
+            self.cacheVal.flush()
+            self.cacheWeight.flush()
+        return self.weightNode if weight else self.valNode
 
-        self.fullyFlaggedAnts = None # this is populated if required by reference
+
+    def endParallelWrite(self):
+        """
+        Make the data written by worker processes (see getParallelWriter()) visible to this soltab.
+        """
+        if self.useCache:
+            self.cacheVal.clear()
+            self.cacheWeight.clear()
+        self._dropFlagSummary()
 
 
-    def delete(self):
+    def isPacked(self):
         """
-        Delete this soltab.
+        Check if the weights are stored as bit-packed flags (see Solset.makeSoltab()).
+
+        Returns
+        -------
+        bool
+            True if only flags are stored, weights are then either 0 or 1.
         """
-        logging.info("Soltab \""+self.name+"\" deleted.")
-        self.obj._f_remove(recursive=True)
+        return isinstance(self.weightNode, _PackedFlags)
 
 
-    def rename(self, newname, overwrite=False):
+    def getQuantizationError(self, vals):
         """
-        Rename this soltab.
+        Compare values with the stored ones (e.g. the values before quantization) for the current selection.
 
         Parameters
         ----------
-        newname : str
-            New solution table name.
-        overwrite : bool, optional
-            Overwrite existing soltab with same name.
+        vals : array
+            Values with the shape of the selection.
+
+        Returns
+        -------
+        float, float
+            The max absolute error (of log10 for quantized amplitudes) and its bound (0 if values are not quantized).
         """
-        self.obj._f_rename(newname, overwrite)
-        logging.info('Soltab "'+self.name+'" renamed to "'+newname+'".')
-        self.name = self.obj._v_name
+        stored = self.getValues(retAxesVals=False)
+        vals = np.asarray(vals, dtype=float)
+        errorBound = 0.
+        if isinstance(self.valNode, _QuantizedValues):
+            errorBound = self.valNode.maxError
+            if self.valNode.log:
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    vals, stored = np.log10(vals), np.log10(stored)
+        diff = np.abs(vals - stored)
+        diff = diff[np.isfinite(diff)]
+        return (float(np.max(diff)) if len(diff) > 0 else 0.), errorBound
+
+
+    def getChunkShape(self):
+        """
+        Get the chunk shape of the val/weight arrays.
+
+        Returns
+        -------
+        tuple
+            The chunk shape, None if the arrays are contiguous.
+        """
+        return self.valNode.chunkshape
 
 
-    def setCache(self, val, weight):
+    def getChunkCacheSize(self):
         """
-        Set cache values.
+        Get the chunk cache size needed to hold all the chunks touched by reading
+        the chunked axes for a single value of the other axes (the typical getValuesIter() read).
 
-        Parameters
-        ----------
-        val : array
-        weight : array
+        Returns
+        -------
+        int
+            Cache size in bytes (val + weight), 0 if the arrays are contiguous or not stored in the h5parm.
         """
-        self.cacheVal = np.copy(val)
-        self.cacheWeight = np.copy(weight)
+        chunkShape = self.getChunkShape()
+        if chunkShape is None or self.getStorage() != 'hdf5':
+            return 0
+
+        shape = self.obj.val.shape
+        cacheSize = 0
+        for data in [self.obj.val, self.weightNode]:
+            itemSize = 1/8. if isinstance(data, _PackedFlags) else data.dtype.itemsize
+            # chunks are read whole along the axes where they do not span the full lenght
+            nChunks = np.prod([int(np.ceil(float(l)/c)) for l, c in zip(shape, chunkShape) if c > 1])
+            cacheSize += int(nChunks * np.prod(chunkShape) * itemSize)
+        return cacheSize
 
 
     def getSolset(self):
@@ -809,6 +3033,8 @@ class Soltab( object ):
             Only update axes passed as arguments, the rest is maintained. Default: False.
             
         """
+        self.axesSelVals = {}
+
         # create an initial selection which selects all values
         if not update:
             self.selection = [slice(None)] * len(self.getAxesNames())
@@ -827,68 +3053,11 @@ class Soltab( object ):
             # slice -> let the slice be as it is
             if isinstance(selVal, slice):
                 self.selection[idx] = selVal
-
-            # string -> regular expression
-            elif type(selVal) is str:
-                if not self.getAxisType(axis).char is 'S':
-                    logging.warning("Cannot select on axis \""+axis+"\" with a regular expression. Use all available values.")
-                    continue
-                self.selection[idx] = [i for i, item in enumerate(self.getAxisValues(axis)) if re.search(selVal, item)]
-
-                # transform list of 1 element in a relative slice(), faster as it gets reference
-                if len(self.selection[idx]) == 1: self.selection[idx] = slice(self.selection[idx][0],self.selection[idx][0]+1)
-
-            # dict -> min max
-            elif type(selVal) is dict:
-                axisVals = self.getAxisValues(axis)
-                # some checks
-                if 'min' in selVal and selVal['min'] > np.max(axisVals):
-                    logging.error("Selection with min > than maximum value. Use all available values.")
-                    continue
-                if 'max' in selVal and selVal['max'] < np.min(axisVals):
-                    logging.error("Selection with max < than minimum value. Use all available values.")
-                    continue
-
-                if 'min' in selVal and 'max' in selVal:
-                    self.selection[idx] = slice(np.where(axisVals >= selVal['min'])[0][0], np.where(axisVals <= selVal['max'])[0][-1]+1)
-                    #thisSelection[idx] = list(np.where((axisVals>=selVal['min']) & (axisVals<=selVal['max']))[0])
-                elif 'min' in selVal:
-                    self.selection[idx] = slice(np.where(axisVals >= selVal['min'])[0][0], None)
-                    #thisSelection[idx] = list(np.where(axisVals>=selVal['min'])[0])
-                elif 'max' in selVal:
-                    self.selection[idx] = slice(0, np.where(axisVals <= selVal['max'])[0][-1]+1)
-                    #thisSelection[idx] = list(np.where(axisVals<=selVal['max'])[0])
-                else:
-                    logging.error("Selection with a dict must have 'min' and/or 'max' entry. Use all available values.")
-                    continue
-                if 'step' in selVal:
-                    self.selection[idx] = slice(self.selection[idx].start, self.selection[idx].stop, selVal['step'])
-                    #thisSelection[idx] = thisSelection[idx][::selVal['step']]
-
-            # single val/list -> exact matching
             else:
-                if type(selVal) is np.array or type(selVal) is np.ndarray: selVal = selVal.tolist()
-                if not type(selVal) is list: selVal = [selVal]
-                # convert to correct data type (from parset everything is a str)
-                if not self.getAxisType(axis).type is np.string_:
-                    selVal = np.array(selVal, dtype=self.getAxisType(axis))
-                else:
-                    selVal = np.array(selVal)
-
-                if len(selVal) == 1:
-                    # speedup in the common case of a single value
-                    if not selVal[0] in self.getAxisValues(axis).tolist():
-                        logging.error('Cannot find value %s in axis %s. Skip selection.' % (selVal[0], axis))
-                        return
-                    self.selection[idx] = [self.getAxisValues(axis).tolist().index(selVal)]
-                else:
-                    self.selection[idx] = [i for i, item in enumerate(self.getAxisValues(axis)) if item in selVal]
-
-                # transform list of 1 element in a relative slice(), faster as it gets a reference
-                if len(self.selection[idx]) == 1: self.selection[idx] = slice(self.selection[idx][0], self.selection[idx][0]+1)
-                # transform list of continuous numbers in slices, faster as it gets a reference
-                elif len(self.selection[idx]) != 0 and len(self.selection[idx])-1 == self.selection[idx][-1] - self.selection[idx][0]:
-                    self.selection[idx] = slice(self.selection[idx][0], self.selection[idx][-1]+1)
+                sel = self.getAxisIndex(axis).select(selVal, axis)
+                if sel is None: continue
+                elif sel is False: return
+                self.selection[idx] = sel
 
             # if a selection return an empty list (maybe because of a wrong name), then use all values
             if type(self.selection[idx]) is list and len(self.selection[idx]) == 0:
@@ -939,7 +3108,7 @@ class Soltab( object ):
         int
             The axis lenght.
         """
-        return len(self.getAxisValues(axis, ignoreSelection = ignoreSelection))
+        return len(self.getAxisValues(axis, ignoreSelection = ignoreSelection, copy = False))
 
 
     def getAxisType(self, axis):
@@ -963,7 +3132,7 @@ class Soltab( object ):
         return self.obj._f_get_child(axis).dtype
 
 
-    def getAxisValues(self, axis, ignoreSelection=False):
+    def getAxisValues(self, axis, ignoreSelection=False, copy=True):
         """
         Get the values of a given axis.
 
@@ -973,6 +3142,8 @@ class Soltab( object ):
             The name of the axis.
         ignoreSelection : bool, optional
             If True returns the axis values without any selection active, by default False.
+        copy : bool, optional
+            If False returns the read-only array kept in memory instead of a copy, by default True.
 
         Returns
         -------
@@ -983,17 +3154,47 @@ class Soltab( object ):
             logging.error('Axis \"'+axis+'\" not found.')
             return None
 
+        # axes values are read once, selected values are memoized until the selection changes
+        if not axis in self.axesVals:
+            axisvalues = np.array(self.axes[axis].read())
+            if axisvalues.dtype.str[0:2] == '|S':
+                # Convert to native string format for python 3
+                axisvalues = axisvalues.astype(str)
+            axisvalues.flags.writeable = False
+            self.axesVals[axis] = axisvalues
+
         if ignoreSelection:
-            axisvalues = np.copy(self.axes[axis])
+            axisvalues = self.axesVals[axis]
         else:
-            axisIdx = self.getAxesNames().index(axis)
-            axisvalues = np.copy(self.axes[axis][ self.selection[axisIdx] ])
+            axisSel = self.selection[self.getAxesNames().index(axis)]
+            if not axis in self.axesSelVals or not _isSameSelection(self.axesSelVals[axis][0], axisSel):
+                axisvalues = self.axesVals[axis][axisSel]
+                axisvalues.flags.writeable = False
+                self.axesSelVals[axis] = (axisSel, axisvalues)
+            axisvalues = self.axesSelVals[axis][1]
 
-        if axisvalues.dtype.str[0:2] == '|S':
-            # Convert to native string format for python 3
-            return axisvalues.astype(str)
-        else:
-            return axisvalues
+        if copy:
+            return np.copy(axisvalues)
+        return axisvalues
+
+
+    def getAxisIndex(self, axis):
+        """
+        Get the index used to resolve selections on an axis. It is shared with the
+        other soltabs having the same axis values.
+
+        Parameters
+        ----------
+        axis : str
+            The name of the axis.
+
+        Returns
+        -------
+        _AxisIndex obj
+        """
+        if not axis in self.axesIndex:
+            self.axesIndex[axis] = _getAxisIndex(axis, self.getAxisValues(axis, ignoreSelection=True, copy=False))
+        return self.axesIndex[axis]
 
 
     def setAxisValues(self, axis, vals):
@@ -1013,7 +3214,11 @@ class Soltab( object ):
             return
 
         axisIdx = self.getAxesNames().index(axis)
+        self._stamp()
         self.axes[axis][ self.selection[axisIdx] ] = vals
+        self.axesVals.pop(axis, None)
+        self.axesSelVals.pop(axis, None)
+        self.axesIndex.pop(axis, None)
 
 
     def setValues(self, vals, selection = None, weight = False):
@@ -1035,48 +3240,155 @@ class Soltab( object ):
         """
         if selection is None: selection = self.selection
 
-        if self.useCache:
-            if weight: dataVals = self.cacheWeight
-            else: dataVals = self.cacheVal
+        dataVals = self._getData(weight)
+        self._stamp()
+        if weight: self._dropFlagSummary()
+
+        if isinstance(dataVals, (_RegionCache, _PackedFlags, _QuantizedValues, _ZarrArray)):
+            # the cache/packed flags handle any selection and the reshape of vals
+            dataVals[tuple(selection)] = vals
         else:
-            if weight: dataVals = self.obj.weight
-            else: dataVals = self.obj.val
+            # NOTE: pytables has a nasty limitation that only one list can be applied when selecting.
+            # The plan turns any selection in a small set of hyperslab writes.
+            self._getPlan(selection, dataVals, write=True).write(dataVals, vals)
 
-        # NOTE: pytables has a nasty limitation that only one list can be applied when selecting.
-        # Conversely, one can apply how many slices he wants.
-        # Single values/contigous values are converted in slices in h5parm.
-        # This try/except implements a workaround for this limitation. Once the pytables will be updated, the except can be removed.
+
+    def addFlags(self, flags, selection = None):
+        """
+        Flag data (set the weights to 0) where flags is True, the other weights are not changed.
+        With bit-packed flags (see isPacked()) only the bits are read and written, no weights are made.
+
+        Parameters
+        ----------
+        flags : array, bool
+            True for the elements to flag, an n-dimentional array which match the selection dimention.
+
+        selection : selection format, optional
+            To flag only a subset of data, overriding global selection, by default use global selection
+            (as in setValues()).
+        """
+        if selection is None: selection = self.selection
+
+        dataWeights = self._getData(weight=True)
+        if isinstance(dataWeights, _PackedFlags):
+            self._stamp()
+            self._dropFlagSummary()
+            dataWeights.setFlags(tuple(selection), flags, add=True)
+        else:
+            weights = self._applyAdvSelection(dataWeights, selection)
+            self.setValues(np.where(np.reshape(flags, weights.shape), 0, weights), selection, weight=True)
+
+
+    def getAppendAxis(self):
+        """
+        Get the axis along which the soltab can grow with appendValues().
+
+        Returns
+        -------
+        str
+            The axis name, None if the soltab has a fixed size.
+        """
+        if isinstance(self.obj.val, tables.EArray):
+            return self.getAxesNames()[self.obj.val.extdim]
+        return None
+
+
+    def appendValues(self, vals, weights, axisVals):
+        """
+        Append values and weights along the append axis of the soltab (see Solset.makeSoltab()),
+        e.g. the solutions of new time slots while they are computed. The axis values, the values
+        and the weights grow together: if any write fails the soltab is left as it was.
+        Quantized values outside the range set at creation are clipped.
+
+        Parameters
+        ----------
+        vals : array
+            New values, with the shape of the whole soltab but along the append axis.
+        weights : array
+            New weights, same shape as vals.
+        axisVals : list
+            The values of the append axis for the new elements.
+        """
+        axis = self.getAppendAxis()
+        if axis is None:
+            logging.error('Soltab '+self.name+' has a fixed size, use makeSoltab(appendAxis=...) to make it extendable.')
+            raise Exception('Soltab '+self.name+' has a fixed size.')
+        axesNames = self.getAxesNames()
+        axisIdx = axesNames.index(axis)
+
+        axisVals = _encodeAxisValues(axisVals)
+        axisNode = self.axes[axis]
+        if axisVals.dtype.kind == 'S' and axisVals.dtype.itemsize > axisNode.atom.itemsize:
+            logging.error('Values of axis '+axis+' longer than %i characters.' % axisNode.atom.itemsize)
+            raise Exception('Values of axis '+axis+' longer than %i characters.' % axisNode.atom.itemsize)
+        shape = [len(axisVals) if i == axisIdx else self.getAxisLen(a, ignoreSelection=True) for i, a in enumerate(axesNames)]
+        vals = np.asarray(vals)
+        weights = np.asarray(weights)
+        if list(vals.shape) != shape or list(weights.shape) != shape:
+            logging.error('Values and weights must have shape '+str(shape)+'.')
+            raise Exception('Values and weights must have shape '+str(shape)+'.')
+
+        if self.useCache: self.flush(force=True)
+        self._stamp()
+
+        # axis values last: readers never see more axis values than data
+        oldLen = axisNode.nrows
+        packed = isinstance(self.weightNode, _PackedFlags)
+        weightNode = self.obj.flag if packed else self.obj.weight
         try:
-            # the float check allows quick reset of large arrays to a single value
-            if isinstance(vals, (np.floating, float)): dataVals[tuple(selection)] = vals
-            # the reshape is needed when saving e.g. [512] (vals shape) into [512,1,1] (selection output)
-            else: dataVals[tuple(selection)] = np.reshape(vals, dataVals[tuple(selection)].shape)
+            if isinstance(self.valNode, _QuantizedValues):
+                self.obj.val.append(self.valNode.encode(vals))
+            else:
+                self.obj.val.append(vals)
+            if packed:
+                weightNode.append(_packFlags(weights == 0, self.weightNode.packedAxis))
+            else:
+                weightNode.append(weights)
+            axisNode.append(axisVals)
         except:
-            #logging.debug('Optimizing selection writing '+str(selection))
-            selectionListsIdx = [i for i, s in enumerate(selection) if type(s) is list]
-            subSelection = selection[:]
-            # create a subSelection also for the "vals" array
-            subSelectionForVals = [slice(None) for i in range(len(subSelection))]
-            # cycle across lists and save data index by index
-            for selectionListValsIter in itertools.product(*[selection[selectionListIdx] for selectionListIdx in selectionListsIdx[1:]]):
-                for i, selectionListIdx in enumerate(selectionListsIdx[1:]):
-                    # this is the sub selection which has a slice for every slice and a single value for every list
-                    subSelection[selectionListIdx] = selectionListValsIter[i]
-                    subSelectionForVals[selectionListIdx] = i
-                if type(vals) == float: dataVals[tuple(subSelection)] = vals
-                else: dataVals[tuple(subSelection)] = vals[tuple(subSelectionForVals)]
+            logging.error('Cannot append to soltab '+self.name+', rolling back.')
+            for node in [self.obj.val, weightNode, axisNode]:
+                if node.nrows > oldLen: node.truncate(oldLen)
+            raise
+        if packed:
+            weightNode.attrs['SHAPE'] = np.array(self.obj.val.shape)
+
+        # refresh everything depending on the axis length
+        self._openNodes()
+        self.memmaps = {}
+        self.axesVals.pop(axis, None)
+        self.axesSelVals.pop(axis, None)
+        self.axesIndex.pop(axis, None)
+        self._appendFlagSummary(weights, axisIdx, oldLen)
+        if self.useCache:
+            cacheSize = None
+            if self.cacheVal.maxMemory is not None:
+                cacheSize = self.cacheVal.maxMemory + self.cacheWeight.maxMemory
+            self.setCache(self.valNode, self.weightNode, cacheSize)
 
-    def flush(self):
+
+    def flush(self, force=False):
         """
-        Copy cached values into the table
+        Copy the modified cached values into the table
+
+        Parameters
+        ----------
+        force : bool, optional
+            If True write back also if the soltab is kept in memory by a working set (see lib_losoto.WorkingSet),
+            which otherwise writes it back when needed, by default False.
         """
         if not self.useCache:
             logging.error("Flushing non cached data.")
             sys.exit(1)
+        if self.deferFlush and not force:
+            logging.debug('Soltab '+self.name+' kept in memory, writing back later.')
+            return
 
         logging.info("Writing results...")
-        self.obj.weight[:] = self.cacheWeight
-        self.obj.val[:] = self.cacheVal
+        # the flag summary was dropped when the weights were set, it is computed again only when needed
+        written = self.cacheWeight.flush() + self.cacheVal.flush()
+        logging.debug('Flushed %.1f MB.' % (written/1024.**2))
+        self.stamped = False
 
 
     def __getattr__(self, axis):
@@ -1089,6 +3401,14 @@ class Soltab( object ):
         axis : str
             The axis name.
         """
+        lazy = self.__dict__.get('_lazy')
+        if lazy is not None:
+            logging.debug('Opening soltab '+self.name+'.')
+            self._lazy = None
+            solset, soltabName = lazy[0]
+            self._open(solset._f_get_child(soltabName), *lazy[1:])
+            return getattr(self, axis)
+
         if axis == 'val':
             return self.getValues(retAxesVals=False)
         elif axis == 'weight':
@@ -1101,56 +3421,273 @@ class Soltab( object ):
             #return None
 
 
+    def _getPlan(self, selection, data, write=False):
+        """
+        Get the (memoized) plan to read or write a selection.
+
+        Parameters
+        ----------
+        selection : list
+            The selection.
+        data : pytables Array obj or array
+            The array to read/write.
+        write : bool, optional
+            If True get a plan for writing, by default False.
+
+        Returns
+        -------
+        _SelectionPlan obj
+        """
+        # exact content of the selection: repr() abbreviates large arrays
+        key = []
+        for sel in selection:
+            if isinstance(sel, slice): key.append((sel.start, sel.stop, sel.step))
+            elif isinstance(sel, (list, np.ndarray)): key.append(('idx',) + tuple(np.asarray(sel).tolist()))
+            else: key.append(sel)
+        key = (tuple(key), data.shape, data.dtype.itemsize, write)
+        if not key in self._plans:
+            if len(self._plans) > 32: self._plans.clear()
+            self._plans[key] = _SelectionPlan(selection, data.shape, data.dtype.itemsize, write)
+        return self._plans[key]
+
+
     def _applyAdvSelection(self, data, selection):
         # NOTE: pytables has a nasty limitation that only one list can be applied when selecting.
-        # Conversely, one can apply how many slices he wants.
-        # Single values/contigous values are converted in slices in h5parm.
-        # This implements a workaround for this limitation. Once the pytables will be updated, the except can be removed.
-        if np.sum( [1. for sel in selection if type(sel) is list] ) > 1 and \
-           ( type(data) is np.ndarray or \
-           np.sum( [len(sel)-1 for sel in selection if type(sel) is list] ) > 0 ):
-        
-            #logging.debug('Optimizing selection reading '+str(selection))
-            # for performances is important to minimize the fetched data
-            # move all slices at the first selection and lists afterwards (first list is allowd in firstselection)
-            selectionListsIdx = [i for i, s in enumerate(selection) if type(s) is list]
-            firstSelection = selection[:]
-            for i in selectionListsIdx[1:]:
-                firstSelection[i] = slice(None)
-            # create a second selection using np.ix_
-            secondSelection = []
-            for i, sel in enumerate(selection):
-                #if i == selectionListsIdx[0]: secondSelection.append(range(self.getAxisLen(self.getAxesNames()[i], ignoreSelection=False)))
-                if i == selectionListsIdx[0]: secondSelection.append(list(range(len(sel))))
-                elif type(sel) is list: secondSelection.append(sel)
-                elif type(sel) is slice: secondSelection.append(list(range(self.getAxisLen(self.getAxesNames()[i], ignoreSelection=False))))
-            #print firstSelection
-            #print secondSelection
-            #print data[tuple(firstSelection)].shape
-            #print data[tuple(firstSelection)][np.ix_(*secondSelection)].shape
-            return data[tuple(firstSelection)][np.ix_(*secondSelection)]
-        else:
+        # Conversely, one can apply how many slices he wants (for numpy more lists are not orthogonal).
+        # Reads from disk and with more lists are done through a plan of few hyperslab reads.
+        if isinstance(data, (_RegionCache, _PackedFlags, _QuantizedValues, _ZarrArray, _RawChunks)) or \
+           ( isinstance(data, np.ndarray) and len([sel for sel in selection if type(sel) is list]) <= 1 ):
             return data[tuple(selection)]
+        else:
+            return self._getPlan(selection, data).read(data)
 
 
     def _getFullyFlaggedAnts(self):
         if self.fullyFlaggedAnts is None:
             self.fullyFlaggedAnts = [] # fully flagged antennas
-            antAxis = self.getAxesNames().index('ant')
+            flagFrac = self.getFlagSummary()['ant']
+            for antToCheck, frac in zip(self.getAxisValues('ant', ignoreSelection=True, copy=False), flagFrac):
+                if frac == 1:
+                    self.fullyFlaggedAnts.append(antToCheck)
+
+        return self.fullyFlaggedAnts
+
+
+    def getWriteId(self):
+        """
+        Get the write id of the soltab: a random id given to the soltab each time its values, weights
+        or axes values are modified through this module (e.g. with setValues()).
+        Two equal write ids mean the same content, without reading it (see lib_steplog).
+
+        Returns
+        -------
+        str
+            The write id, None if the soltab was written otherwise (e.g. by an older version).
+        """
+        if not 'WRITEID' in self.obj._v_attrs._v_attrnames:
+            return None
+        return str(self.obj._v_attrs['WRITEID'])
+
+
+    def setWriteId(self, writeId):
+        """
+        Set the write id of a soltab with none (see getWriteId()), e.g. a hash of its content.
+
+        Parameters
+        ----------
+        writeId : str
+            The write id.
+        """
+        self.obj._v_attrs['WRITEID'] = writeId
+
+
+    def _stamp(self):
+        """
+        Give the soltab a new write id before its data are modified. Cached soltabs get a new one only once
+        until the cache is written back.
+        """
+        if self.useCache and self.stamped: return
+        if self.obj._v_file.mode != 'r':
+            self.obj._v_attrs['WRITEID'] = uuid.uuid4().hex
+        self.stamped = True
+
+
+    def getFlagSummary(self, compute=True):
+        """
+        Get the fraction of flagged data (weight = 0) for each antenna, direction and polarization.
+        The summary is stored in the soltab attributes (if the h5parm is writable), it is
+        dropped when weights are written with setValues() and computed again when needed.
+
+        Parameters
+        ----------
+        compute : bool, optional
+            If False do not read the weights, return None if the summary is not stored, by default True.
+
+        Returns
+        -------
+        dict
+            Flagged fractions in the form {axisName: array}, one value for each element
+            of the (not selected) axis, for the axes among ant, dir and pol.
+        """
+        if self.flagSummary is None:
+            axesNames = [axis for axis in self.getAxesNames() if axis in _FLAG_SUMMARY_AXES]
+            attrs = self.obj._v_attrs
+            if all(['FLAG_SUMMARY_'+axis in attrs._v_attrnames for axis in axesNames]):
+                self.flagSummary = {axis: np.array(attrs['FLAG_SUMMARY_'+axis]) for axis in axesNames}
+            elif compute:
+                self._setFlagSummary(self._getData(weight=True))
+        return self.flagSummary
+
 
-            if self.useCache:
-                dataWeights = self.cacheWeight
+    def _setFlagSummary(self, weights, blockSize=64*1024*1024):
+        """
+        Compute the flag summary in a single pass over the weights and store it.
+
+        Parameters
+        ----------
+        weights : array
+            The weights (pytables Array obj, _RegionCache obj or array).
+        blockSize : int, optional
+            Memory in bytes read at once, by default 64 MB.
+        """
+        axesNames = self.getAxesNames()
+        shape = weights.shape
+        sumAxes = [i for i, axis in enumerate(axesNames) if axis in _FLAG_SUMMARY_AXES]
+        otherAxes = tuple([i for i in range(len(shape)) if not i in sumAxes])
+
+        # count flags in blocks along the first axis, reducing to the summary axes only
+        flagged = np.zeros([shape[i] for i in sumAxes])
+        step = max(1, int(blockSize // max(1, np.prod(shape[1:]) * weights.dtype.itemsize)))
+        for start in range(0, shape[0], step):
+            block = weights[slice(start, start+step)]
+            counts = np.sum(block == 0, axis=otherAxes)
+            if 0 in sumAxes:
+                flagged[start:start+step] += counts
             else:
-                dataWeights = self.obj.weight
+                flagged += counts
 
-            for antToCheck in self.getAxisValues('ant', ignoreSelection=True):
-                # fully flagged?
-                refSelection = [slice(None)] * len(self.getAxesNames())
-                refSelection[antAxis] = [self.getAxisValues('ant', ignoreSelection=True).tolist().index(antToCheck)]
-                if (self._applyAdvSelection(dataWeights, refSelection) == 0 ).all():
-                    self.fullyFlaggedAnts.append(antToCheck)
+        total = float(np.prod(shape))
+        self.flagSummary = {}
+        for j, i in enumerate(sumAxes):
+            frac = np.sum(flagged, axis=tuple([k for k in range(len(sumAxes)) if k != j])) / (total / shape[i]) if total > 0 else np.zeros(shape[i])
+            self.flagSummary[axesNames[i]] = frac
+        self._storeFlagSummary()
 
-        return self.fullyFlaggedAnts
+
+    def _appendFlagSummary(self, weights, axisIdx, oldLen):
+        """
+        Update the flag summary with the weights appended along an axis, without reading
+        the weights already on disk. If the summary is not stored it is computed when needed.
+
+        Parameters
+        ----------
+        weights : array
+            The appended weights.
+        axisIdx : int
+            Index of the append axis.
+        oldLen : int
+            Length of the append axis before appending.
+        """
+        oldSummary = self.getFlagSummary(compute=False)
+        self.fullyFlaggedAnts = None
+        if oldSummary is None: return
+
+        axesNames = self.getAxesNames()
+        shape = self.weightNode.shape
+        newTotal = float(np.prod(shape))
+        oldTotal = newTotal / shape[axisIdx] * oldLen
+        self.flagSummary = {}
+        for axis, frac in oldSummary.items():
+            i = axesNames.index(axis)
+            counts = np.sum(weights == 0, axis=tuple([k for k in range(len(shape)) if k != i]))
+            if i == axisIdx:
+                # new elements of the summary axis
+                frac = np.concatenate([frac, counts / (weights.size / float(max(1, shape[i] - oldLen)))])
+            elif newTotal > 0:
+                frac = (frac * (oldTotal / shape[i]) + counts) / (newTotal / shape[i])
+            self.flagSummary[axis] = frac
+        self._storeFlagSummary()
+
+
+    def _storeFlagSummary(self):
+        """
+        Store the flag summary in the soltab attributes (if the h5parm is writable).
+        """
+        if self.obj._v_file.mode != 'r':
+            for axis, frac in self.flagSummary.items():
+                self.obj._v_attrs['FLAG_SUMMARY_'+axis] = frac
+
+
+    def _dropFlagSummary(self):
+        """
+        Drop the flag summary after the weights changed.
+        """
+        self.flagSummary = None
+        self.fullyFlaggedAnts = None
+        if self.obj._v_file.mode != 'r':
+            attrs = self.obj._v_attrs
+            for attrName in attrs._v_attrnames:
+                if attrName.startswith('FLAG_SUMMARY_'):
+                    del attrs[attrName]
+
+
+    def _getClosestAnts(self):
+        """
+        Find the closest antenna (excluding itself and the fully flagged ones) to each selected antenna.
+
+        Returns
+        -------
+        array
+            Index along the (not selected) antenna axis of the reference antenna of each selected antenna.
+        """
+        antNames, antDists = self.getSolset().getAntDistMatrix()
+        antNamesIdx = {ant: i for i, ant in enumerate(antNames)}
+        allAnts = self.getAxisValues('ant', ignoreSelection=True, copy=False).tolist()
+        allAntsIdx = {ant: i for i, ant in enumerate(allAnts)}
+        selAnts = self.getAxisValues('ant', copy=False).tolist()
+        for ant in selAnts:
+            if not ant in antNamesIdx:
+                raise Exception("Missing antenna %s in antenna table." % ant)
+
+        badAnts = set(self._getFullyFlaggedAnts())
+        candidates = [i for i, ant in enumerate(allAnts) if not ant in badAnts and ant in antNamesIdx]
+        candidatesIdx = {c: j for j, c in enumerate(candidates)}
+        if len(candidates) == 0 or (len(candidates) == 1 and allAnts[candidates[0]] in selAnts):
+            raise Exception("No antenna available for referencing to the closest antenna.")
+
+        dists = antDists[np.ix_([antNamesIdx[ant] for ant in selAnts], [antNamesIdx[allAnts[c]] for c in candidates])]
+        # an antenna cannot be referenced to itself
+        for i, ant in enumerate(selAnts):
+            if allAntsIdx[ant] in candidatesIdx:
+                dists[i, candidatesIdx[allAntsIdx[ant]]] = np.inf
+
+        return np.array(candidates)[np.argmin(dists, axis=1)]
+
+
+    def _checkReference(self, reference):
+        """
+        Check if the soltab can be referenced to a given antenna.
+
+        Parameters
+        ----------
+        reference : str
+            Reference antenna name or "closest".
+
+        Returns
+        -------
+        bool
+            True if referencing is possible.
+        """
+        if not self.getType() in ['phase', 'scalarphase', 'rotation', 'tec', 'clock', 'tec3rd']:
+            logging.error('Reference possible only for phase, scalarphase, clock, tec, tec3rd, and rotation solution tables. Ignore referencing.')
+            return False
+        elif not 'ant' in self.getAxesNames():
+            logging.error('Cannot find antenna axis for referencing phases. Ignore referencing.')
+            return False
+        elif not reference in self.getAxisValues('ant', ignoreSelection=True, copy=False) and reference != 'closest':
+            logging.error('Cannot find antenna '+reference+'. Ignore referencing.')
+            return False
+        return True
 
 
     def getValues(self, retAxesVals=True, weight=False, reference=None):
@@ -1175,64 +3712,38 @@ class Soltab( object ):
             A numpy ndarrey (values or weights depending on parameters)
             If selected, returns also the axes values
         """
-        if self.useCache:
-            if weight: dataVals = self.cacheWeight
-            else: dataVals = self.cacheVal
-        else:
-            if weight: dataVals = self.obj.weight
-            else: dataVals = self.obj.val
-
-        dataVals = self._applyAdvSelection(dataVals, self.selection)
+        dataVals = self._applyAdvSelection(self._getData(weight), self.selection)
 
         if not reference is None:
-            if not self.getType() in ['phase', 'scalarphase', 'rotation', 'tec', 'clock', 'tec3rd']:
-                logging.error('Reference possible only for phase, scalarphase, clock, tec, tec3rd, and rotation solution tables. Ignore referencing.')
-            elif not 'ant' in self.getAxesNames():
-                logging.error('Cannot find antenna axis for referencing phases. Ignore referencing.')
-            elif not reference in self.getAxisValues('ant', ignoreSelection = True) and reference != 'closest':
-                logging.error('Cannot find antenna '+reference+'. Ignore referencing.')
-            else:
+            if self._checkReference(reference):
 
-                if self.useCache:
-                    if weight: dataValsRef = self.cacheWeight
-                    else: dataValsRef = self.cacheVal
-                else:
-                    if weight: dataValsRef = self.obj.weight
-                    else: dataValsRef = self.obj.val
+                dataValsRef = self._getData(weight)
+                # memory mapped data are read-only
+                if not dataVals.flags.writeable: dataVals = np.array(dataVals)
 
                 antAxis = self.getAxesNames().index('ant')
                 refSelection = self.selection[:]
 
                 if reference == 'closest':
-                    
-                    # put antenna axis first
-                    dataVals = np.swapaxes(dataVals, 0, antAxis)
-
-                    for i, antToRef in enumerate(self.getAxisValues('ant')):
-                        # get the closest antenna
-                        antDists = self.getSolset().getAntDist(antToRef) # this is a dict
-                        for badAnt in self._getFullyFlaggedAnts(): del antDists[badAnt] # remove bad ants
-
-                        reference = list(antDists.keys())[list(antDists.values()).index( sorted(antDists.values())[1] ) ] # get the second closest antenna (the first is itself)
-
-                        refSelection[antAxis] = [self.getAxisValues('ant', ignoreSelection=True).tolist().index(reference)]
-                        dataValsRef_i = self._applyAdvSelection(dataValsRef, refSelection)
-                        dataValsRef_i = np.swapaxes(dataValsRef_i, 0, antAxis)
-                        if weight:
-                            dataVals[i][ dataValsRef_i[0] == 0. ] = 0.
-                        else:
-                            dataVals[i] -= dataValsRef_i[0]
+                    # read all the reference antennas at once and use them for each antenna
+                    refIdx = self._getClosestAnts()
+                    refAnts, refInv = np.unique(refIdx, return_inverse=True)
+                    refSelection[antAxis] = refAnts.tolist()
+                    dataValsRef = np.take(self._applyAdvSelection(dataValsRef, refSelection), refInv, axis=antAxis)
+
+                    if weight:
+                        dataVals[ dataValsRef == 0. ] = 0.
+                    else:
+                        dataVals = dataVals - dataValsRef
 
-                    dataVals = np.swapaxes(dataVals, 0, antAxis)
- 
                 else:
-                    refSelection[antAxis] = [self.getAxisValues('ant', ignoreSelection=True).tolist().index(reference)]
+                    refSelection[antAxis] = [self.getAxisValues('ant', ignoreSelection=True, copy=False).tolist().index(reference)]
                     dataValsRef = self._applyAdvSelection(dataValsRef, refSelection)
     
                     if weight:
-                        dataVals[ np.repeat(dataValsRef, axis=antAxis, repeats=len(self.getAxisValues('ant'))) == 0. ] = 0.
+                        dataVals[ np.repeat(dataValsRef, axis=antAxis, repeats=self.getAxisLen('ant')) == 0. ] = 0.
                     else:
-                        dataVals = dataVals - np.repeat(dataValsRef, axis=antAxis, repeats=len(self.getAxisValues('ant')))
+                        dataVals = dataVals - np.repeat(dataValsRef, axis=antAxis, repeats=self.getAxisLen('ant'))
                 
                 if not weight and not self.getType() != 'tec' and not self.getType() != 'clock' and not self.getType() != 'tec3rd':
                     dataVals = normalize_phase(dataVals)
@@ -1247,12 +3758,12 @@ class Soltab( object ):
         return dataVals, axisVals
 
 
-    def getValuesIter(self, returnAxes=[], weight=False, reference=None):
+    def getValuesIter(self, returnAxes=[], weight=False, reference=None, stream=False, blockSize=64*1024*1024, onlyWeight=False):
         """
         Return an iterator which yields the values matrix (with axes = returnAxes) iterating along the other axes.
         E.g. if returnAxes are ['freq','time'], one gets a interetion over all the possible NxM
         matrix where N are the freq and M the time dimensions. The other axes are iterated in the getAxesNames() order.
-        Note that all the data are fetched in memory before returning them one at a time. This is quicker.
+        Note that, unless stream is True, all the data are fetched in memory before returning them one at a time. This is quicker.
 
         Parameters
         ----------
@@ -1262,56 +3773,289 @@ class Soltab( object ):
             If true return also the weights, by default False.
         reference : str
             In case of phase solutions, reference to this station name.
+        stream : bool, optional
+            If true read the data in blocks (aligned to the on-disk chunks) of at most blockSize bytes,
+            so that tables larger than the memory can be iterated. By default False.
+        blockSize : int, optional
+            Max size in bytes of a block read when stream is True, by default 64 MB.
+        onlyWeight : bool, optional
+            If true return only the weights (the values are not read), by default False.
 
         Returns
         -------
-        1) data ndarray of dim=dim(returnAxes) and with the axes ordered as in getAxesNames()
-        2) (if weight == True) weigth ndarray of dim=dim(returnAxes) and with the axes ordered as in getAxesNames()
+        1) (unless onlyWeight == True) data ndarray of dim=dim(returnAxes) and with the axes ordered as in getAxesNames()
+        2) (if weight or onlyWeight == True) weigth ndarray of dim=dim(returnAxes) and with the axes ordered as in getAxesNames()
         3) a dict with axis values in the form:
         {'axisname1':[axisvals1],'axisname2':[axisvals2],...}
         4) a selection which should be used to write this data back using a setValues()
         """
-        if weight: weigthVals = self.getValues(retAxesVals=False, weight=True, reference=reference)
-        dataVals = self.getValues(retAxesVals=False, weight=False, reference=reference)
-
-        # get dimensions of non-returned axis (in correct order)
-        iterAxesDim = [self.getAxisLen(axis) for axis in self.getAxesNames() if not axis in returnAxes]
-
-        # generator to cycle over all the combinations of iterAxes
-        # it "simply" gets the indexes of this particular combination of iterAxes
-        # and use them to refine the selection.
-        def g():
-            for axisIdx in np.ndindex(tuple(iterAxesDim)):
-                refSelection = []
-                returnSelection = []
-                thisAxesVals = {}
-                i = 0
-                for j, axisName in enumerate(self.getAxesNames()):
-                    if axisName in returnAxes:
-                        thisAxesVals[axisName] = self.getAxisValues(axisName)
-                        # add a slice with all possible values (main selection is preapplied)
-                        refSelection.append(slice(None))
-                        # for the return selection use the "main" selection for the return axes
-                        returnSelection.append(self.selection[j])
-                    else:
-                        #TODO: the iteration axes are not into a 1 element array, is it a problem?
-                        thisAxesVals[axisName] = self.getAxisValues(axisName)[axisIdx[i]]
-                        # add this index to the refined selection, this will return a single value for this axis
-                        # an int is appended, this will remove an axis from the final data
-                        refSelection.append(axisIdx[i])
-                        # for the return selection use the complete axis and find the correct index
-                        returnSelection.append( [self.getAxisValues(axisName, ignoreSelection=True).tolist().index(thisAxesVals[axisName])] )
-                        i += 1
-
-                # costly command
-                data = dataVals[tuple(refSelection)]
-                if weight:
-                    weights = weigthVals[tuple(refSelection)]
-                    yield (data, weights, thisAxesVals, returnSelection)
+        for dataVals, weightVals, coords, selections in self._getValuesIterBlocks(returnAxes, weight, reference, stream, blockSize, onlyWeight):
+            for i, selection in enumerate(selections):
+                # each item gets its own copy of the values of the returned axes, callers may modify them
+                thisAxesVals = {axisName: axisVals[i] if axisName in coords['iter'] else axisVals.copy() \
+                        for axisName, axisVals in coords['vals'].items()}
+                if onlyWeight:
+                    yield (weightVals[i], thisAxesVals, selection)
+                elif weight:
+                    yield (dataVals[i], weightVals[i], thisAxesVals, selection)
+                else:
+                    yield (dataVals[i], thisAxesVals, selection)
+
+
+    def getValuesIterBatch(self, returnAxes=[], batchSize=1, weight=False, reference=None, stream=False, blockSize=64*1024*1024, onlyWeight=False):
+        """
+        Return an iterator which yields the values of batchSize iterations of getValuesIter() stacked together.
+        Batches do not span the blocks read from disk, so they can be shorter than batchSize.
+
+        Parameters
+        ----------
+        returnAxes : list
+            Axes of the returned array, all _others_ will be cycled on each element combinations.
+        batchSize : int, optional
+            Number of iterations stacked in each batch, by default 1.
+        weight : bool, optional
+            If true return also the weights, by default False.
+        reference : str
+            In case of phase solutions, reference to this station name.
+        stream : bool, optional
+            If true read the data in blocks of at most blockSize bytes, by default False.
+        blockSize : int, optional
+            Max size in bytes of a block read when stream is True, by default 64 MB.
+        onlyWeight : bool, optional
+            If true return only the weights (the values are not read), by default False.
+
+        Returns
+        -------
+        1) (unless onlyWeight == True) data ndarray of dim=1+dim(returnAxes), the first axis runs over the iterations in the batch
+        2) (if weight or onlyWeight == True) weigth ndarray with the same shape of data
+        3) a dict with axis values in the form:
+        {'axisname1':[axisvals1],'axisname2':[axisvals2],...}
+        where the values of the iterated axes are arrays with one element per iteration in the batch
+        4) a list of selections (one per iteration in the batch) which should be used to write the data back using setValues()
+        """
+        batchSize = max(1, int(batchSize))
+        for dataVals, weightVals, coords, selections in self._getValuesIterBlocks(returnAxes, weight, reference, stream, blockSize, onlyWeight):
+            for start in range(0, len(selections), batchSize):
+                batch = slice(start, start+batchSize)
+                thisAxesVals = {axisName: axisVals[batch] if axisName in coords['iter'] else axisVals.copy() \
+                        for axisName, axisVals in coords['vals'].items()}
+                if onlyWeight:
+                    yield (weightVals[batch], thisAxesVals, selections[batch])
+                elif weight:
+                    yield (dataVals[batch], weightVals[batch], thisAxesVals, selections[batch])
                 else:
-                    yield (data, thisAxesVals, returnSelection)
+                    yield (dataVals[batch], thisAxesVals, selections[batch])
+
+
+    def _getValuesIterBlocks(self, returnAxes, weight, reference, stream, blockSize, onlyWeight):
+        """
+        Read the data for getValuesIter() in blocks which are contiguous in the iteration order.
+        Without streaming there is a single block with the whole selection. When streaming, the inner iteration
+        axes are read whole, the outer ones one element at a time and the axis in between is split in runs
+        aligned to the on-disk chunks so that each block is at most blockSize bytes.
+        All the metadata (axes values and write-back selections) are computed once per block.
+
+        Parameters
+        ----------
+        See getValuesIter().
+
+        Returns
+        -------
+        generator
+            For each block: values and weights (None if not requested) with shape (Nitems, returnAxes dims...),
+            a dict with the axes values ('vals') and the names of the iterated axes ('iter'),
+            a list with the write-back selection of each item.
+        """
+        if stream and reference == 'closest':
+            logging.debug('Cannot stream data referenced to the closest antenna, loading all data in memory.')
+            stream = False
+        if reference is not None and not self._checkReference(reference): reference = None
+        getVals = not onlyWeight
+        getWeights = weight or onlyWeight
+
+        axesNames = self.getAxesNames()
+        selection = self.selection[:]
+        iterAxesIdx = [j for j, axisName in enumerate(axesNames) if not axisName in returnAxes]
+        iterAxesNames = [axesNames[j] for j in iterAxesIdx]
+
+        # absolute indexes and values of the selected elements along each axis, computed once
+        selIdx = [np.arange(self.getAxisLen(axisName, ignoreSelection=True))[selection[j]] for j, axisName in enumerate(axesNames)]
+        axesVals = {}
+        for axisName in axesNames:
+            axesVals[axisName] = self.getAxisValues(axisName)
+            axesVals[axisName].setflags(write=False) # shared among all the blocks
+
+        def readBlock(blockSelection, reference):
+            try:
+                self.selection = blockSelection
+                dataVals = self.getValues(retAxesVals=False, weight=False, reference=reference) if getVals else None
+                weightVals = self.getValues(retAxesVals=False, weight=True, reference=reference) if getWeights else None
+            finally:
+                self.selection = selection
+            return dataVals, weightVals
+
+        def toItems(data):
+            # move the iterated axes first and flatten them: one row per item, in iteration order
+            data = np.moveaxis(data, iterAxesIdx, list(range(len(iterAxesIdx))))
+            return data.reshape((-1,)+data.shape[len(iterAxesIdx):])
+
+        def makeBlock(dataVals, weightVals, blockStart, blockShape):
+            # positions in the global selection of all items of this block
+            pos = np.unravel_index(np.arange(int(np.prod(blockShape))), blockShape) if len(blockShape) > 0 else ()
+            coords = {'vals': {axisName: axesVals[axisName] for axisName in axesNames}, 'iter': iterAxesNames}
+            absIdx = []
+            for j, p in zip(iterAxesIdx, pos):
+                coords['vals'][axesNames[j]] = axesVals[axesNames[j]][p + blockStart[j]]
+                absIdx.append(selIdx[j][p + blockStart[j]].tolist())
+            selections = []
+            for itemIdx in zip(*absIdx) if len(absIdx) > 0 else [()]:
+                returnSelection = selection[:]
+                for j, idx in zip(iterAxesIdx, itemIdx):
+                    returnSelection[j] = [idx]
+                selections.append(returnSelection)
+            return (toItems(dataVals) if getVals else None, toItems(weightVals) if getWeights else None, coords, selections)
+
+        if not stream:
+            dataVals, weightVals = readBlock(selection, reference)
+            yield makeBlock(dataVals, weightVals, [0] * len(axesNames), tuple([len(selIdx[j]) for j in iterAxesIdx]))
+            return
+
+        # the reference antenna is read once, before any data is written back
+        if reference is not None:
+            antAxis = axesNames.index('ant')
+            refSelection = selection[:]
+            refIdx = self.getAxisValues('ant', ignoreSelection=True, copy=False).tolist().index(reference)
+            refSelection[antAxis] = slice(refIdx, refIdx+1)
+            refVals, refWeights = readBlock(refSelection, None)
+
+        elementBytes = (self.valNode.dtype.itemsize if getVals else 0) + (self.weightNode.dtype.itemsize if getWeights else 0)
+        for blockSelection, blockStart in self._getBlockSelections(returnAxes, elementBytes, blockSize):
+            dataVals, weightVals = readBlock(blockSelection, None)
+            blockShape = (dataVals if getVals else weightVals).shape
+
+            if reference is not None:
+                blockRel = [slice(blockStart[j], blockStart[j]+blockShape[j]) for j in range(len(axesNames))]
+                blockRel[antAxis] = slice(None)
+                if getVals:
+                    dataVals = dataVals - refVals[tuple(blockRel)]
+                if getWeights:
+                    if not weightVals.flags.writeable: weightVals = np.array(weightVals)
+                    weightVals[ np.broadcast_to(refWeights[tuple(blockRel)] == 0, blockShape) ] = 0.
+
+            yield makeBlock(dataVals, weightVals, blockStart, tuple([blockShape[j] for j in iterAxesIdx]))
+
+
+    def _getBlockSelections(self, returnAxes, elementBytes, blockSize):
+        """
+        Split the selection in blocks which are contiguous in the iteration order of getValuesIter(): the returnAxes
+        and the inner iteration axes are read whole, the outer ones one element at a time and the axis in between
+        is split in runs aligned to the on-disk chunks so that each block is at most blockSize bytes.
+
+        Parameters
+        ----------
+        returnAxes : list
+            Axes which are never split.
+        elementBytes : int
+            Bytes read for each element of the selection.
+        blockSize : int
+            Max size in bytes of a block.
 
-        return g()
+        Returns
+        -------
+        generator
+            For each block: its selection and the position of its first element in the selection.
+        """
+        axesNames = self.getAxesNames()
+        selection = self.selection[:]
+        iterAxesIdx = [j for j, axisName in enumerate(axesNames) if not axisName in returnAxes]
+        selIdx = [np.arange(self.getAxisLen(axisName, ignoreSelection=True))[selection[j]] for j, axisName in enumerate(axesNames)]
+
+        # number of items (single iterations) which fit in a block
+        itemSize = np.prod([len(selIdx[j]) for j in range(len(axesNames)) if not j in iterAxesIdx])
+        nItems = max(1, int(blockSize // max(1, itemSize * elementBytes)))
+
+        # find the iteration axis along which blocks are split: inner axes are read whole, outer axes one element at a time
+        splitPos = None
+        for pos in reversed(range(len(iterAxesIdx))):
+            n = len(selIdx[iterAxesIdx[pos]])
+            if n > nItems:
+                splitPos = pos
+                break
+            nItems //= n
+
+        # group elements along the split axis in runs aligned to chunks of at least nItems elements
+        if splitPos is None:
+            runs = [(0, None)]
+            outerAxesIdx = []
+        else:
+            splitAxis = iterAxesIdx[splitPos]
+            outerAxesIdx = iterAxesIdx[:splitPos]
+            chunkShape = self.cacheVal.regionShape if self.useCache else self.getChunkShape()
+            chunkLen = 1 if chunkShape is None else chunkShape[splitAxis]
+            chunkIds = selIdx[splitAxis] // chunkLen
+            runs = []
+            start = 0
+            for k in range(1, len(chunkIds)+1):
+                # close the run at the end of the axis or at a chunk boundary once it is full
+                if k == len(chunkIds) or (chunkIds[k] != chunkIds[k-1] and k - start >= nItems):
+                    runs.append((start, k))
+                    start = k
+
+        def toSel(idx):
+            # list of continuous indexes -> slice, faster to read
+            if len(idx) > 0 and idx[-1] - idx[0] == len(idx) - 1:
+                return slice(int(idx[0]), int(idx[-1])+1)
+            return [int(x) for x in idx]
+
+        for outerPos in np.ndindex(tuple([len(selIdx[j]) for j in outerAxesIdx])):
+            for start, stop in runs:
+                # selection (absolute) and position in the global selection (relative) of this block
+                blockSelection = selection[:]
+                blockStart = [0] * len(axesNames)
+                for j, pos in zip(outerAxesIdx, outerPos):
+                    blockSelection[j] = slice(int(selIdx[j][pos]), int(selIdx[j][pos])+1)
+                    blockStart[j] = pos
+                if splitPos is not None:
+                    blockSelection[splitAxis] = toSel(selIdx[splitAxis][start:stop])
+                    blockStart[splitAxis] = start
+                yield blockSelection, blockStart
+
+
+    def getValuesBlocks(self, returnAxes=[], weight=False, blockSize=64*1024*1024):
+        """
+        Return an iterator which yields the selected values in blocks (aligned to the on-disk chunks) of at most
+        blockSize bytes, with the returnAxes never split. Unlike getValuesIter() the blocks are not split in items,
+        each keeps all the axes (ordered as in getAxesNames()) and is written back at once with setValues().
+        This is the quickest way to apply a function which is elementwise along the axes not in returnAxes.
+
+        Parameters
+        ----------
+        returnAxes : list, optional
+            Axes which are never split, by default none.
+        weight : bool, optional
+            If true return also the weights, by default False.
+        blockSize : int, optional
+            Max size in bytes of a block, by default 64 MB.
+
+        Returns
+        -------
+        1) data ndarray of the block
+        2) (if weight == True) weigth ndarray of the block
+        3) the selection which should be used to write the block back using a setValues()
+        """
+        selection = self.selection
+        elementBytes = self.valNode.dtype.itemsize + (self.weightNode.dtype.itemsize if weight else 0)
+        for blockSelection, blockStart in list(self._getBlockSelections(returnAxes, elementBytes, blockSize)):
+            try:
+                self.selection = blockSelection
+                dataVals = self.getValues(retAxesVals=False, weight=False)
+                weightVals = self.getValues(retAxesVals=False, weight=True) if weight else None
+            finally:
+                self.selection = selection
+            if weight:
+                yield (dataVals, weightVals, blockSelection)
+            else:
+                yield (dataVals, blockSelection)
 
 
     def addHistory(self, entry):
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Fusion of consecutive elementwise steps in a single pass over the data
+
+import logging
+from losoto.lib_losoto import getParAxis, getStepSoltabNames, getStepSoltabs
+
+
+def _sameSelection(parser, step, otherStep, H, soltabs):
+    """
+    True if two steps select the same soltabs with the same axes selection
+    """
+    soltabNames = [solset.name+'/'+soltabName for solset in H.getSolsets() for soltabName in solset.getSoltabNames()]
+    if getStepSoltabNames(parser, step, soltabNames) != getStepSoltabNames(parser, otherStep, soltabNames):
+        return False
+    axesNames = set([axisName for soltab in soltabs for axisName in soltab.getAxesNames()])
+    return all([getParAxis(parser, step, axisName) == getParAxis(parser, otherStep, axisName) for axisName in axesNames])
+
+
+def getFusedSteps(parser, steps, H, ops, parsed=None):
+    """
+    Find the consecutive steps, from the first of a list, which can run in a single pass over the data:
+    steps whose operation has an array kernel (a _kernel_parser() returning a Kernel obj for these options,
+    see lib_operations.Kernel) and which select the same soltabs with the same axes selection.
+    A _kernel_parser() returning None should not log anything (e.g. checkSpelling()): the step then
+    runs through its _run_parser(), which reports again.
+    A step with "checkpoint = True" ends the group, a step reading a soltab modified by the group
+    (e.g. RESIDUALS) is not fused with it.
+
+    Parameters
+    ----------
+    parser : parser obj
+        configuration file
+
+    steps : list
+        names of the next steps, in order
+
+    H : h5parm obj
+        the h5parm object
+
+    ops : dict
+        operation name: operation module
+
+    parsed : dict, optional
+        kept by the caller between calls: the kernels of a step parsed but not fused are stored there
+        and reused when the step runs, so each step is parsed only once
+
+    Returns
+    -------
+    list
+        names of the fused steps (only the first one if it cannot be fused with the next)
+    list
+        for each selected soltab, a tuple with the soltab obj and the kernels of the fused steps,
+        None if the first step must run through its operation
+    """
+    if parsed is None: parsed = {}
+
+    def kernelParser(step):
+        op = parser.getstr(step, 'Operation')
+        return getattr(ops.get(op), '_kernel_parser', None)
+
+    if steps and steps[0] in parsed:
+        # already parsed by the previous call, run through its kernels
+        soltabs, kernels = parsed.pop(steps[0])
+        soltabKernels = [(soltab, [kernel]) for soltab, kernel in zip(soltabs, kernels)]
+        group = [steps[0]]
+    else:
+        if len(steps) < 2 or kernelParser(steps[0]) is None or kernelParser(steps[1]) is None \
+                or parser.getbool(steps[0], 'checkpoint', False):
+            return steps[:1], None
+        soltabs = getStepSoltabs(parser, steps[0], H, useCache=False)
+        if soltabs == []: return steps[:1], None
+        soltabKernels = [(soltab, []) for soltab in soltabs]
+        group = []
+    soltabNames = [soltab.getSolset().name+'/'+soltab.name for soltab in soltabs]
+
+    for step in steps[len(group):]:
+        if group and parser.getbool(group[-1], 'checkpoint', False): break
+        if kernelParser(step) is None or (group and not _sameSelection(parser, group[0], step, H, soltabs)): break
+        kernels = [kernelParser(step)(soltab, parser, step) for soltab in soltabs]
+        if any([kernel is None for kernel in kernels]): break
+        # soltabs read by a kernel must not be modified by the group
+        if group and any([name in soltabNames for kernel in kernels for name in kernel.reads]):
+            parsed[step] = (soltabs, kernels)
+            break
+        for (soltab, soltabKernel), kernel in zip(soltabKernels, kernels):
+            soltabKernel.append(kernel)
+        group.append(step)
+
+    if group == []:
+        return steps[:1], None
+    return group, soltabKernels
+
+
+def runFusedSteps(steps, soltabKernels, blockSize=64*1024*1024):
+    """
+    Run fused steps (see getFusedSteps()): the data of each soltab are read in blocks, all the kernels
+    are applied in the order of the steps and each block is written back once.
+
+    Parameters
+    ----------
+    steps : list
+        names of the fused steps
+
+    soltabKernels : list
+        for each soltab, a tuple with the soltab obj and the kernels of the steps
+
+    blockSize : int, optional
+        max size in bytes of a block, by default 64 MB
+
+    Returns
+    -------
+    int
+        0 if all the steps completed, otherwise the number of failures reported by the kernels
+    """
+    returncode = 0
+    for soltab, kernels in soltabKernels:
+        logging.info('Fusing steps %s on soltab %s in a single pass.' % (', '.join(steps), soltab.name))
+        returnAxes = []
+        for kernel in kernels:
+            returnAxes += [axisName for axisName in kernel.returnAxes if not axisName in returnAxes]
+        setVals = any([kernel.setVals for kernel in kernels])
+        setWeights = any([kernel.setWeights for kernel in kernels])
+
+        for vals, weights, selection in soltab.getValuesBlocks(returnAxes=returnAxes, weight=True, blockSize=blockSize):
+            for kernel in kernels:
+                vals, weights = kernel(vals, weights, selection)
+            if setVals: soltab.setValues(vals, selection)
+            if setWeights: soltab.setValues(weights, selection, weight=True)
+
+        for kernel in kernels:
+            if kernel.end is not None: returncode += kernel.end() or 0
+            soltab.addHistory(kernel.history)
+
+    return returncode
@@ -39,7 +39,7 @@ class LosotoParser(ConfigParser):
         check if any value in the step is missing from a value list and return a warning
         """
         entries = [x.lower() for x in list(dict(self.items(s)).keys())]
-        availValues = ['soltab','operation'] + availValues + \
+        availValues = ['soltab','operation','checkpoint'] + availValues + \
                     soltab.getAxesNames() + [a+'.minmaxstep' for a in soltab.getAxesNames()] + [a+'.regexp' for a in soltab.getAxesNames()]
         availValues = [x.lower() for x in availValues]
         for e in entries:
@@ -168,9 +168,9 @@ def getParAxis( parser, step, axisName ):
     return axisOpt
 
 
-def getStepSoltabs(parser, step, H):
+def getStepSoltabNames(parser, step, soltabNames):
     """
-    Return a list of soltabs object for a step and apply selection creteria
+    Return the names of the soltabs selected by a step
 
     Parameters
     ----------
@@ -180,13 +180,13 @@ def getStepSoltabs(parser, step, H):
     step : str
         current step
 
-    H : h5parm obj
-        the h5parm object
+    soltabNames : list
+        names of the available soltabs as "solset/soltab"
 
     Returns
     -------
     list
-        list of soltab obj with applied selection
+        names of the selected soltabs, in the same order
     """
 
     # selection on soltabs
@@ -198,14 +198,135 @@ def getStepSoltabs(parser, step, H):
         stsel = ['.*/.*'] # select all
     #if not type(stsel) is list: stsel = [stsel]
 
+    return [soltabName for soltabName in soltabNames if any(re.compile(this_stsel).match(soltabName) for this_stsel in stsel)]
+
+
+class WorkingSet(object):
+    """
+    Soltabs of the cached steps (see cacheSteps) kept in memory from one step to the next,
+    so that consecutive steps on the same soltab do not read it again and write it back each time.
+    The modified data are written back by flush(): at the end, at a checkpoint, and before a step
+    that may read or write them on disk (see beginStep()).
+    """
+
+    def __init__(self):
+        self.soltabs = {} # (solset name, soltab name) -> Soltab obj
+
+    def getSoltab(self, solset, soltabName, cacheSize=None):
+        """
+        Return the cached soltab obj kept in memory, created if not yet present
+
+        Parameters
+        ----------
+        solset : solset obj
+            the solset of the soltab
+
+        soltabName : str
+            name of the soltab
+
+        cacheSize : int, optional
+            max memory in bytes used by the cache of a new soltab obj, by default no limit
+
+        Returns
+        -------
+        soltab obj
+        """
+        key = (solset.name, soltabName)
+        if key in self.soltabs:
+            logging.debug('Using soltab %s/%s kept in memory.' % key)
+        else:
+            soltab = solset.getSoltab(soltabName, useCache=True, cacheSize=cacheSize)
+            soltab.deferFlush = True
+            self.soltabs[key] = soltab
+        return self.soltabs[key]
+
+    def flush(self, keep=[]):
+        """
+        Write back the modified data of the soltabs kept in memory
+
+        Parameters
+        ----------
+        keep : list, optional
+            names ("solset/soltab") of the soltabs not written back, by default none
+        """
+        for key, soltab in self.soltabs.items():
+            if not '/'.join(key) in keep:
+                soltab.flush(force=True)
+
+    def release(self):
+        """
+        Write back and drop all the soltabs kept in memory
+        """
+        self.flush()
+        self.soltabs = {}
+
+    def isClean(self):
+        """
+        True if all the data of the soltabs kept in memory are written back
+        """
+        return all([len(soltab.cacheVal.dirty) == 0 and len(soltab.cacheWeight.dirty) == 0 for soltab in self.soltabs.values()])
+
+    def beginStep(self, parser, step):
+        """
+        Prepare for a step: a cached step keeps in memory the soltabs it selects, the others are
+        written back as the step may read them from disk; before any other step all the soltabs
+        are written back and dropped, as the step may also modify them on disk
+
+        Parameters
+        ----------
+        parser : parser obj
+            configuration file
+
+        step : str
+            current step
+        """
+        if parser.getstr(step, 'operation', '').lower() in cacheSteps:
+            self.flush(keep=getStepSoltabNames(parser, step, ['/'.join(key) for key in self.soltabs.keys()]))
+        else:
+            self.release()
+
+
+def getStepSoltabs(parser, step, H, workingSet=None, useCache=True):
+    """
+    Return a list of soltabs object for a step and apply selection creteria
+
+    Parameters
+    ----------
+    parser : parser obj
+        configuration file
+
+    step : str
+        current step
+
+    H : h5parm obj
+        the h5parm object
+
+    workingSet : WorkingSet obj, optional
+        if given the soltabs of cached steps are taken from it
+
+    useCache : bool, optional
+        if False the soltabs of cached steps are not cached either, by default True
+
+    Returns
+    -------
+    list
+        list of soltab obj with applied selection
+    """
+
+    # memory limit for the cache (MB), 0 is no limit
+    cacheSize = parser.getint('_global', 'cacheSize', 0)
+    cacheSize = cacheSize*1024*1024 if cacheSize > 0 else None
+
     soltabs = []
     for solset in H.getSolsets():
-        for soltabName in solset.getSoltabNames():
-            if any(re.compile(this_stsel).match(solset.name+'/'+soltabName) for this_stsel in stsel):
-                if parser.getstr(step, 'operation').lower() in cacheSteps:
-                    soltabs.append( solset.getSoltab(soltabName, useCache=True) )
-                else:
-                    soltabs.append( solset.getSoltab(soltabName, useCache=False) )
+        for soltabName in getStepSoltabNames(parser, step, [solset.name+'/'+soltabName for soltabName in solset.getSoltabNames()]):
+            soltabName = soltabName.split('/')[1]
+            if parser.getstr(step, 'operation').lower() in cacheSteps and useCache and workingSet is not None:
+                soltabs.append( workingSet.getSoltab(solset, soltabName, cacheSize=cacheSize) )
+            elif parser.getstr(step, 'operation').lower() in cacheSteps and useCache:
+                soltabs.append( solset.getSoltab(soltabName, useCache=True, cacheSize=cacheSize) )
+            else:
+                soltabs.append( solset.getSoltab(soltabName, useCache=False) )
 
     if soltabs == []:
         logging.warning('No soltabs selected for step %s.' % step)
@@ -85,6 +85,44 @@ class multiprocManager(object):
         self.inQueue.join()
 
 
+class Kernel(object):
+    """
+    The array kernel of an operation: a pure function of the values and weights of a block of data.
+    Consecutive steps with a kernel are run together in a single pass over the data (see lib_fusion).
+
+    Parameters
+    ----------
+    func : function
+        func(vals, weights, selection) returns the new (vals, weights) of a block, with the axes ordered
+        as in getAxesNames(), selection is the selection of the block. The input arrays are not modified.
+    history : str
+        Entry added to the soltab history.
+    returnAxes : list, optional
+        Axes which must be whole in a block, by default none (elementwise kernel).
+    setVals : bool, optional
+        True if the kernel modifies the values, by default True.
+    setWeights : bool, optional
+        True if the kernel modifies the weights, by default False.
+    reads : list, optional
+        Other soltabs ("solset/soltab") read by the kernel, by default none.
+    end : function, optional
+        Called once all the blocks are done (e.g. to log a summary), by default None.
+        It can return a non-zero code if the step is incomplete.
+    """
+
+    def __init__(self, func, history, returnAxes=[], setVals=True, setWeights=False, reads=[], end=None):
+        self.func = func
+        self.history = history
+        self.returnAxes = returnAxes
+        self.setVals = setVals
+        self.setWeights = setWeights
+        self.reads = reads
+        self.end = end
+
+    def __call__(self, vals, weights, selection):
+        return self.func(vals, weights, selection)
+
+
 def reorderAxes( a, oldAxes, newAxes ):
     """
     Reorder axis of an array to match a new name pattern.
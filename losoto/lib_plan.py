@@ -0,0 +1,245 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Dry run of a parset: estimate of the resources used by each step
+
+import os, multiprocessing
+import logging
+import numpy as np
+from losoto.lib_losoto import getStepSoltabNames, getStepSoltabs
+from losoto.lib_scheduler import planSteps, stepAccess
+
+# Cost model of each operation, for a soltab with S selected elements:
+# 'mem' is the number of float64 arrays of S elements held at the same time,
+# 'itemAxes' are the axes of a work item (names, (option, default) of the step or 'all'), the items
+# are the combinations of the other axes, 'itemMem' is the number of float64 arrays as large as an item
+# held by each process, 'stream' is True if the selection is read in blocks instead of all at once,
+# 'read' is the number of soltabs as large as the selection read and 'write' what is written:
+# 'vals', 'weights', 'both', 'new' (new soltabs as large as the selection) or None.
+# The processes used are given by lib_scheduler.stepAccess. Operations not listed use defaultCost.
+defaultCost = {'mem': 3, 'itemAxes': 'all', 'itemMem': 0, 'stream': False, 'read': 1, 'write': 'both'}
+stepCost = {
+    'ABS': {'mem': 2, 'write': 'vals'},
+    'CLIP': {'mem': 3, 'stream': True, 'write': 'weights'},
+    'CLOCKTEC': {'mem': 3, 'itemAxes': ['ant','freq','pol','time'], 'itemMem': 4, 'write': 'new'},
+    'DIRECTIONSCREEN': {'mem': 5, 'write': 'new'},
+    'DUPLICATE': {'mem': 0, 'write': 'new'},
+    'FARADAY': {'mem': 2, 'itemAxes': ['freq','pol','time'], 'itemMem': 3, 'write': 'new'},
+    'FLAG': {'mem': 4, 'itemAxes': [('axesToFlag', [])], 'itemMem': 6, 'write': 'weights'},
+    'FLAGEXTEND': {'mem': 2, 'itemAxes': [('axesToExt', [])], 'itemMem': 3, 'write': 'weights'},
+    'FLAGSTATION': {'mem': 4, 'itemAxes': ['freq','pol','time'], 'itemMem': 4, 'write': 'weights'},
+    'INTERPOLATE': {'mem': 4, 'itemAxes': [('axisToRegrid', [])], 'stream': True, 'write': 'new'},
+    'LOFARBEAM': {'mem': 2, 'itemAxes': ['ant','time','pol','freq'], 'write': 'vals'},
+    'NORM': {'mem': 3, 'itemAxes': [('axesToNorm', [])], 'write': 'vals'},
+    'PLOT': {'mem': 2, 'itemAxes': [('axesInPlot', []), ('axisInTable', []), ('axisInCol', []), ('axisDiff', [])], \
+             'itemMem': 4, 'write': None},
+    'PLOTSCREEN': {'mem': 4, 'write': None},
+    'POLALIGN': {'mem': 3, 'itemAxes': ['freq','pol','time'], 'write': 'new'},
+    'PREFACTOR_BANDPASS': {'mem': 5, 'itemAxes': ['pol','ant','freq','time'], 'itemMem': 4, 'write': 'new'},
+    'PREFACTOR_XYOFFSET': {'mem': 4, 'itemAxes': ['pol','ant','freq','time'], 'write': 'new'},
+    'REPLICATEONAXIS': {'mem': 2, 'write': 'both'},
+    'RESET': {'mem': 1, 'read': 0, 'write': 'vals'},
+    'RESIDUALS': {'mem': 4, 'read': 2, 'write': 'both'},
+    'REWEIGHT': {'mem': 3, 'itemAxes': ['time'], 'itemMem': 4, 'write': 'weights'},
+    'SMOOTH': {'mem': 3, 'itemAxes': [('axesToSmooth', [])], 'stream': True, 'write': 'vals'},
+    'SPLITLEAK': {'mem': 4, 'write': 'new'},
+    'STATIONSCREEN': {'mem': 6, 'write': 'new'},
+    'STRUCTURE': {'mem': 2, 'itemAxes': ['freq','pol','ant','time'], 'write': None},
+    'TEC': {'mem': 2, 'itemAxes': ['freq','time'], 'stream': True, 'write': 'new'},
+    'TECJUMP': {'mem': 3, 'itemAxes': ['time'], 'write': 'vals'},
+}
+
+
+class StepEstimate(object):
+    """
+    Estimate of the resources used by a step on a soltab.
+
+    Parameters
+    ----------
+    step : str
+        Name of the step.
+    op : str
+        Operation of the step.
+    soltabName : str
+        The soltab ("solset/soltab"), None if the step selects no soltab.
+    """
+
+    def __init__(self, step, op, soltabName):
+        self.step = step
+        self.op = op
+        self.soltabName = soltabName
+        self.estimated = False # False if the soltab does not exist yet
+        self.items = 0 # work items
+        self.ncpu = 1 # processes
+        self.memory = 0 # peak memory, bytes
+        self.read = 0 # bytes read
+        self.written = 0 # bytes written
+        self.warnings = [] # limits exceeded
+
+
+def _getItemAxes(parser, step, soltab, itemAxes):
+    """
+    Return the axes of a work item of a step on a soltab
+    """
+    if itemAxes == 'all':
+        return soltab.getAxesNames()
+    axes = []
+    for itemAxis in itemAxes:
+        if isinstance(itemAxis, tuple):
+            axes += [a for a in parser.getarraystr(step, itemAxis[0], itemAxis[1]) if a != '']
+        else:
+            axes.append(itemAxis)
+    return [axisName for axisName in soltab.getAxesNames() if axisName in axes]
+
+
+def estimateStep(parser, step, soltab, maxCpu=0, blockSize=64*1024*1024):
+    """
+    Estimate the resources used by a step on a soltab from the selected axes lengths and the cost model
+    of its operation (see stepCost)
+
+    Parameters
+    ----------
+    parser : parser obj
+        configuration file
+
+    step : str
+        the step
+
+    soltab : soltab obj
+        a soltab selected by the step, with the selection of the step
+
+    maxCpu : int, optional
+        processes available, by default all cpus
+
+    blockSize : int, optional
+        max size in bytes of the blocks read by streaming operations, by default 64 MB
+
+    Returns
+    -------
+    StepEstimate obj
+    """
+    if maxCpu == 0: maxCpu = multiprocessing.cpu_count()
+    op = parser.getstr(step, 'Operation')
+    cost = dict(defaultCost)
+    cost.update(stepCost.get(op, {}))
+    estimate = StepEstimate(step, op, soltab.getSolset().name+'/'+soltab.name)
+    estimate.estimated = True
+
+    axesLen = {axisName: soltab.getAxisLen(axisName) for axisName in soltab.getAxesNames()}
+    nElements = int(np.prod(list(axesLen.values())))
+    itemElements = int(np.prod([axesLen[axisName] for axisName in _getItemAxes(parser, step, soltab, cost['itemAxes'])]))
+    estimate.items = nElements // max(1, itemElements)
+
+    if 'ncpu' in stepAccess.get(op, {}):
+        section, option, default = stepAccess[op]['ncpu']
+        ncpu = parser.getint(step if section is None else section, option, default)
+        estimate.ncpu = max(1, min(ncpu if ncpu > 0 else maxCpu, maxCpu, estimate.items))
+
+    valBytes = nElements * soltab.valNode.dtype.itemsize
+    if soltab.isPacked():
+        # one bit per element, whole lines along the packed axis padded to bytes
+        packedAxis = soltab.getAxesNames()[soltab.weightNode.packedAxis]
+        weightBytes = nElements // max(1, axesLen[packedAxis]) * ((soltab.getAxisLen(packedAxis, ignoreSelection=True)+7)//8)
+    else:
+        weightBytes = nElements * soltab.weightNode.dtype.itemsize
+    estimate.read = cost['read'] * (valBytes + weightBytes)
+    estimate.written = {'vals': valBytes, 'weights': weightBytes, 'both': valBytes + weightBytes, \
+            'new': nElements * 8 + weightBytes, None: 0}[cost['write']]
+
+    memory = cost['mem'] * nElements * 8
+    if cost['stream']:
+        memory = min(memory, cost['mem'] * max(blockSize, itemElements * 8))
+    estimate.memory = memory + estimate.ncpu * cost['itemMem'] * itemElements * 8
+    return estimate
+
+
+def planRun(parser, H, maxCpu=0):
+    """
+    Estimate the resources used by each step of a parset without running it.
+    The soltabs and selections of each step are resolved as in a run (see lib_losoto.getStepSoltabs()),
+    soltabs created by previous steps cannot be estimated. Steps exceeding the global options
+    maxMemory or maxIO (MB, by default the physical memory and no limit) are reported.
+
+    Parameters
+    ----------
+    parser : parser obj
+        configuration file
+
+    H : h5parm obj
+        the h5parm object
+
+    maxCpu : int, optional
+        processes available, by default all cpus
+
+    Returns
+    -------
+    list
+        StepEstimate obj of each step and selected soltab, in order
+    """
+    maxMemory = parser.getint('_global', 'maxMemory', 0) * 1024 * 1024
+    if maxMemory == 0:
+        try:
+            maxMemory = os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+        except (ValueError, OSError, AttributeError):
+            maxMemory = None
+    maxIO = parser.getint('_global', 'maxIO', 0) * 1024 * 1024
+
+    soltabNames = [solset.name+'/'+soltabName for solset in H.getSolsets() for soltabName in solset.getSoltabNames()]
+    estimates = []
+    for step in planSteps(parser, H, maxCpu):
+        soltabs = {soltab.getSolset().name+'/'+soltab.name: soltab for soltab in getStepSoltabs(parser, step.name, H, useCache=False)}
+        # soltabs created by the previous steps are selected too
+        selected = getStepSoltabNames(parser, step.name, soltabNames)
+        if selected == []:
+            estimates.append(StepEstimate(step.name, step.op, None))
+        for soltabName in selected:
+            if soltabName in soltabs:
+                estimate = estimateStep(parser, step.name, soltabs[soltabName], maxCpu)
+                if maxMemory is not None and estimate.memory > maxMemory:
+                    estimate.warnings.append('memory')
+                if maxIO > 0 and estimate.read + estimate.written > maxIO:
+                    estimate.warnings.append('I/O')
+                for warning in estimate.warnings:
+                    logging.warning('Step %s on soltab %s exceeds the %s limit.' % (step.name, soltabName, warning))
+            else:
+                estimate = StepEstimate(step.name, step.op, soltabName)
+            estimates.append(estimate)
+        soltabNames += sorted(step.outputs - set(soltabNames))
+    return estimates
+
+
+def formatPlan(estimates):
+    """
+    Return a table with the estimates of planRun()
+
+    Parameters
+    ----------
+    estimates : list
+        StepEstimate objs
+
+    Returns
+    -------
+    str
+        the table, one line per step and soltab
+    """
+    def size(nbytes):
+        for unit in ['B', 'kB', 'MB', 'GB']:
+            if nbytes < 1024: return '%.1f %s' % (nbytes, unit)
+            nbytes /= 1024.
+        return '%.1f TB' % nbytes
+
+    rows = [['Step', 'Operation', 'Soltab', 'Items', 'Cpu', 'Memory', 'Read', 'Written', 'Notes']]
+    for e in estimates:
+        if e.soltabName is None:
+            rows.append([e.step, e.op, '-', '-', '-', '-', '-', '-', ''])
+        elif not e.estimated:
+            rows.append([e.step, e.op, e.soltabName, '?', '?', '?', '?', '?', '(new soltab)'])
+        else:
+            rows.append([e.step, e.op, e.soltabName, str(e.items), str(e.ncpu), size(e.memory), size(e.read), \
+                    size(e.written), ', '.join(['exceeds '+w+' limit' for w in e.warnings])])
+    widths = [max([len(row[i]) for row in rows]) for i in range(len(rows[0]))]
+    lines = ['  '.join([cell.ljust(w) for cell, w in zip(row, widths)]).rstrip() for row in rows]
+    total = [e for e in estimates if e.estimated]
+    lines.append('Peak memory: %s, read: %s, written: %s.' % (size(max([e.memory for e in total] + [0])), \
+            size(sum([e.read for e in total])), size(sum([e.written for e in total]))))
+    return '\n'.join(lines)
@@ -0,0 +1,316 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Scheduler running the independent steps of a parset in parallel
+
+import os, sys, shutil, tempfile, traceback, multiprocessing
+from multiprocessing.connection import wait
+import logging
+import tables
+from losoto.h5parm import h5parm, _copySoltab
+from losoto.lib_losoto import getStepSoltabNames
+
+# Soltabs used by each operation besides the soltabs selected by the step:
+# 'write' is False if the step does not modify its soltabs, 'in', 'inout' and 'out' are the options
+# naming other soltabs of the same solset that are read, modified and created, with their defaults
+# (a name, '' for none or a function of the selected soltab name), 'ncpu' is the option with the
+# number of processes used (section, option, default), None as section is the step.
+# Operations not listed here are run alone (barriers).
+stepAccess = {
+    'ABS': {},
+    'CLIP': {},
+    'CLOCKTEC': {'out': {'clocksoltabOut': 'clock000', 'tecsoltabOut': 'tec000', 'offsetsoltabOut': 'phase_offset000', \
+                         'tec3rdsoltabOut': 'tec3rd000'}, 'ncpu': (None, 'nproc', 10)},
+    'DUPLICATE': {'out': {'soltabOut': ''}},
+    'FARADAY': {'out': {'soltabOut': 'rotationmeasure000'}},
+    'FLAG': {'ncpu': ('_global', 'ncpu', 0)},
+    'FLAGEXTEND': {'ncpu': ('_global', 'ncpu', 0)},
+    'FLAGSTATION': {'inout': {'soltabExport': ''}, 'ncpu': ('_global', 'ncpu', 0)},
+    'INTERPOLATE': {'out': {'outSoltab': ''}},
+    'LOFARBEAM': {},
+    'NORM': {},
+    'PLOT': {'write': False, 'in': {'soltabsToAdd': ''}, 'ncpu': ('_global', 'ncpu', 0)},
+    'PLOTSCREEN': {'write': False, 'in': {'resSoltab': lambda name: name+'resid'}},
+    'POLALIGN': {'out': {'soltabOut': 'phasediff'}},
+    'PREFACTOR_BANDPASS': {'out': {'outSoltabName': 'bandpass'}, 'ncpu': ('_global', 'ncpu', 0)},
+    'REPLICATEONAXIS': {},
+    'RESET': {},
+    'RESIDUALS': {'in': {'soltabsToSub': ''}},
+    'REWEIGHT': {'in': {'soltabImport': ''}, 'ncpu': ('_global', 'ncpu', 0)},
+    'SMOOTH': {},
+    'SPLITLEAK': {'out': {'soltabOutG': '', 'soltabOutD': ''}},
+    'STRUCTURE': {'write': False},
+    'TEC': {'out': {'soltabOut': 'tec000'}},
+    'TECJUMP': {'in': {'errorTab': lambda name: name.replace('tec','error')}},
+}
+
+
+class Step(object):
+    """
+    A step of the parset with the soltabs it reads and writes (as "solset/soltab").
+
+    Parameters
+    ----------
+    name : str
+        Name of the step (parset section).
+
+    op : str
+        Operation of the step.
+
+    index : int
+        Position of the step in the parset.
+    """
+
+    def __init__(self, name, op, index):
+        self.name = name
+        self.op = op
+        self.index = index
+        self.reads = set()
+        self.writes = set()
+        self.outputs = set() # new soltabs
+        self.barrier = False # run alone, after all the previous steps and before all the next ones
+        self.ncpu = 1 # processes requested
+        self.ncpuOpt = None # (section, option) setting the processes
+        self.deps = set() # indexes of the steps to complete before this one
+
+    def conflicts(self, other):
+        """
+        True if the two steps cannot run at the same time
+        """
+        return self.barrier or other.barrier or \
+                len(self.writes & (other.reads | other.writes)) > 0 or len(self.reads & other.writes) > 0
+
+
+def _getOptionSoltabs(parser, step, option, default, soltabName):
+    """
+    Return the soltab names given by an option of a step (for a selected soltab)
+    """
+    names = [name for name in parser.getarraystr(step, option, []) if name != '']
+    if names == []:
+        if callable(default): default = default(soltabName)
+        names = [default] if default != '' else []
+    return names
+
+
+def planSteps(parser, H, maxCpu=0):
+    """
+    Resolve the soltabs read and written by each step and the steps each depends on.
+    Soltabs created by a step can be selected by the following ones.
+
+    Parameters
+    ----------
+    parser : parser obj
+        configuration file
+
+    H : h5parm obj
+        the h5parm object
+
+    maxCpu : int, optional
+        processes available, by default all cpus
+
+    Returns
+    -------
+    list
+        list of Step obj, in the order of the parset
+    """
+    if maxCpu == 0: maxCpu = multiprocessing.cpu_count()
+    soltabNames = [solset.name+'/'+soltabName for solset in H.getSolsets() for soltabName in solset.getSoltabNames()]
+
+    steps = []
+    for stepName in parser.sections():
+        if stepName == '_global': continue # skip global setting
+        step = Step(stepName, parser.getstr(stepName, 'Operation'), len(steps))
+        access = stepAccess.get(step.op)
+        if access is None:
+            step.barrier = True
+            access = {}
+
+        selected = getStepSoltabNames(parser, stepName, soltabNames)
+        step.reads.update(selected)
+        if access.get('write', True): step.writes.update(selected)
+        for kind in ['in', 'inout', 'out']:
+            for option, default in access.get(kind, {}).items():
+                for soltabName in selected:
+                    solsetName, soltabName = soltabName.split('/')
+                    names = _getOptionSoltabs(parser, stepName, option, default, soltabName)
+                    if kind == 'out' and names == []:
+                        step.barrier = True # soltab with a default name
+                    for name in [solsetName+'/'+name for name in names]:
+                        if kind != 'out':
+                            step.reads.add(name)
+                        if kind == 'inout':
+                            step.writes.add(name)
+                        if kind == 'out':
+                            # an existing output is renamed or replaced by the operation
+                            if name in soltabNames or name in step.outputs: step.barrier = True
+                            step.writes.add(name)
+                            step.outputs.add(name)
+        soltabNames += sorted(step.outputs - set(soltabNames))
+
+        if 'ncpu' in access:
+            section, option, default = access['ncpu']
+            if section is None: section = stepName
+            step.ncpuOpt = (section, option)
+            step.ncpu = parser.getint(section, option, default)
+            if step.ncpu <= 0: step.ncpu = maxCpu
+        step.ncpu = min(step.ncpu, maxCpu)
+
+        step.deps = set([other.index for other in steps if other.conflicts(step)])
+        logging.debug('Step %s reads %s, writes %s%s.' % (stepName, sorted(step.reads), sorted(step.writes), \
+                ' (barrier)' if step.barrier else ''))
+        steps.append(step)
+
+    return steps
+
+
+def _exportSoltabs(H, soltabNames, fileName):
+    """
+    Copy some soltabs (with the tables of their solsets) into a new h5parm
+    """
+    f = tables.open_file(fileName, mode='w', filters=H.H.filters)
+    try:
+        H.H.root._v_attrs._f_copy(f.root)
+        for solset in H.H.root._v_groups.values():
+            soltabs = [soltab for soltab in solset._v_groups.values() if solset._v_name+'/'+soltab._v_name in soltabNames]
+            if soltabs == []: continue
+            newSolset = solset._f_copy(f.root, recursive=False)
+            for node in solset._v_leaves.values():
+                node.copy(newSolset)
+            for soltab in soltabs:
+                _copySoltab(soltab, newSolset)
+    finally:
+        f.close()
+
+
+def _importSoltabs(H, soltabNames, fileName):
+    """
+    Replace some soltabs with their copies in another h5parm, soltabs missing there are deleted
+    """
+    f = tables.open_file(fileName, mode='r')
+    try:
+        for name in sorted(soltabNames):
+            solsetName, soltabName = name.split('/')
+            if not solsetName in H.getSolsetNames(): continue
+            solset = H.getSolset(solsetName)
+            if soltabName in solset.getSoltabNames():
+                solset.getSoltab(soltabName).delete()
+            if '/'+name in f:
+                _copySoltab(f.get_node('/'+name), solset.obj)
+    finally:
+        f.close()
+    H.H.flush()
+
+
+def _runWorker(runStep, parser, step, fileName, ncpu):
+    """
+    Run a step on its own h5parm in a worker process, the exit code is 0 if the step completed,
+    1 if it was incomplete and 2 if it failed
+    """
+    if step.ncpuOpt is not None:
+        parser.set(step.ncpuOpt[0], step.ncpuOpt[1], str(ncpu))
+    H = h5parm(fileName, readonly=False)
+    try:
+        returncode = runStep(parser, step.name, H)
+    except:
+        logging.critical('Step \'' + step.name + '\' failed:\n' + traceback.format_exc())
+        sys.exit(2)
+    finally:
+        H.close()
+    sys.exit(1 if returncode != 0 else 0)
+
+
+def runSteps(parser, H, runStep, maxCpu=0):
+    """
+    Run the steps of a parset, running at the same time the steps which use different soltabs.
+    The results are those of running the steps in order.
+    Each step running in parallel works in a worker process on a copy of the soltabs it uses,
+    which replace the soltabs of the h5parm when it is done. Steps whose soltabs cannot be
+    determined (see stepAccess) run alone on the h5parm.
+    The processes given to the steps (option "ncpu") are shared among the steps ready to run.
+
+    Parameters
+    ----------
+    parser : parser obj
+        configuration file
+
+    H : h5parm obj
+        the h5parm object
+
+    runStep : function
+        runStep(parser, step, H) runs a step on an h5parm and returns 0 if it completed
+
+    maxCpu : int, optional
+        processes used by all the steps at the same time, by default all cpus
+
+    Returns
+    -------
+    int
+        the number of incomplete steps
+    """
+    if maxCpu == 0: maxCpu = multiprocessing.cpu_count()
+    steps = planSteps(parser, H, maxCpu)
+    # the processes are forked: the parser, the operations and runStep are inherited
+    ctx = multiprocessing.get_context('fork')
+    tmpDir = tempfile.mkdtemp(prefix='losoto-steps-', dir=os.path.dirname(os.path.abspath(H.fileName)))
+
+    def applyStep(step, fileName=None):
+        if H.swmr: H.beginWrite()
+        if fileName is None:
+            returncode = runStep(parser, step.name, H)
+        else:
+            _importSoltabs(H, step.writes, fileName)
+            returncode = 0
+        if H.swmr: H.publish() # readers can now see the results of this step
+        return returncode
+
+    pending = list(steps)
+    running = {} # process sentinel: (step, process, cpus, file)
+    done = set()
+    incomplete = 0
+    failed = None
+    try:
+        while (pending and failed is None) or running:
+            # start the steps whose dependencies are done, in order
+            freeCpu = maxCpu - sum([r[2] for r in running.values()])
+            ready = [step for step in pending if step.deps <= done]
+            for i, step in enumerate(ready):
+                if failed is not None: break
+                if step.barrier:
+                    if running: break
+                    pending.remove(step)
+                    incomplete += applyStep(step) != 0
+                    done.add(step.index)
+                    break # the following steps depend on this one
+                if freeCpu <= 0: break
+                ncpu = max(1, min(step.ncpu, freeCpu // len([s for s in ready[i:] if not s.barrier])))
+                fileName = os.path.join(tmpDir, '%s.h5' % step.name)
+                _exportSoltabs(H, step.reads | step.writes, fileName)
+                logging.info('Starting step \'%s\' in parallel (%i cpu).' % (step.name, ncpu))
+                p = ctx.Process(target=_runWorker, args=(runStep, parser, step, fileName, ncpu))
+                p.start()
+                running[p.sentinel] = (step, p, ncpu, fileName)
+                pending.remove(step)
+                freeCpu -= ncpu
+            if not running: continue
+
+            # apply the results of the steps which ended
+            for sentinel in wait(list(running.keys())):
+                step, p, ncpu, fileName = running.pop(sentinel)
+                p.join()
+                if p.exitcode not in [0, 1]:
+                    logging.error('Step \''+step.name+'\' failed, not starting other steps.')
+                    if failed is None or step.index < failed.index: failed = step
+                elif failed is None or step.index < failed.index:
+                    incomplete += p.exitcode
+                    applyStep(step, fileName)
+                os.remove(fileName)
+                done.add(step.index)
+    finally:
+        for step, p, ncpu, fileName in running.values():
+            p.terminate()
+            p.join()
+        shutil.rmtree(tmpDir, ignore_errors=True)
+
+    if failed is not None:
+        raise Exception('Step \''+failed.name+'\' failed.')
+    return incomplete
@@ -0,0 +1,227 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Log of the steps run on an h5parm, to resume interrupted or repeated runs
+
+import hashlib, json
+import logging
+import numpy as np
+from losoto.lib_scheduler import planSteps
+
+# options which do not change the results of a step
+perfOptions = ['ncpu', 'cachesize', 'checkpoint']
+
+
+def hashSoltab(soltab, blockSize=64*1024*1024):
+    """
+    Hash of the content of a soltab: type, axes, values and weights (the selection is ignored).
+    The data are read in blocks, the hash does not depend on how they are stored.
+
+    Parameters
+    ----------
+    soltab : soltab obj
+        the soltab, with no selection
+
+    blockSize : int, optional
+        max size in bytes of the blocks read, by default 64 MB
+
+    Returns
+    -------
+    str
+        the hex digest
+    """
+    h = hashlib.sha1(soltab.getType().encode())
+    for axisName in soltab.getAxesNames():
+        h.update(axisName.encode())
+        h.update(np.ascontiguousarray(soltab.getAxisValues(axisName, ignoreSelection=True)).tobytes())
+    # blocks are contiguous in C order: the same bytes as the whole arrays
+    for vals, weights, selection in soltab.getValuesBlocks(weight=True, blockSize=blockSize):
+        h.update(np.ascontiguousarray(vals).tobytes())
+        h.update(np.ascontiguousarray(weights).tobytes())
+    return h.hexdigest()
+
+
+def hashStep(parser, step):
+    """
+    Hash of the parameters of a step, global options included (but not those in perfOptions)
+
+    Parameters
+    ----------
+    parser : parser obj
+        configuration file
+
+    step : str
+        the step
+
+    Returns
+    -------
+    str
+        the hex digest
+    """
+    options = [(section, option, value) for section in ['_global', step] for option, value in parser.items(section) \
+            if not option.lower() in perfOptions]
+    return hashlib.sha1(repr(sorted(options)).encode()).hexdigest()
+
+
+class StepLog(object):
+    """
+    Log of the steps run on an h5parm, stored in it (root attributes STEPLOG000, STEPLOG001...).
+    Each record has the steps run since the previous one, the hashes of their parameters and the state of
+    the soltabs once the results of those steps are written, the first record has the state of the h5parm
+    before the first step. The state of a soltab is its write id (see Soltab.getWriteId()), renewed by every
+    write, so it is known without reading the data; soltabs with no write id are hashed once (see hashSoltab())
+    and the hash is kept as their write id. Writes made without losoto (e.g. with h5py) are not seen.
+    The state is stored in chunks of stateChunk soltabs (attributes STEPLOG000_000, STEPLOG000_001...).
+    Running again a parset, the steps already run with the same parameters whose results are the current
+    content of the h5parm are skipped (see resume()): a run which was interrupted continues after the
+    last recorded step and steps added at the end of a parset run alone.
+
+    Parameters
+    ----------
+    H : h5parm obj
+        the h5parm object, open for writing
+    """
+
+    stateChunk = 256 # soltabs in each state attribute, well below the 64 kB limit of an attribute
+
+    def __init__(self, H):
+        self.H = H
+        attrs = H.H.root._v_attrs
+        self.attrNames = sorted([name for name in attrs._f_list('user') if name.startswith('STEPLOG')])
+        self.records = []
+        for name in self.attrNames:
+            if '_' in name: continue
+            record = json.loads(attrs[name])
+            record['state'] = {}
+            for stateName in self.attrNames:
+                if stateName.startswith(name+'_'):
+                    record['state'].update(json.loads(attrs[stateName]))
+            self.records.append(record)
+        self.hashes = {} # "solset/soltab": write id of the soltab on disk
+        self.pending = [] # (step, parameters hash) run and not yet recorded
+        self.soltabNames = None # soltabs read or written by the steps (see lib_scheduler.planSteps()), None for any
+
+    def _hashSoltabs(self):
+        """
+        Update the write ids of the soltabs. Soltabs with no write id are hashed if used by the steps.
+        """
+        self.hashes = {}
+        for solset in self.H.getSolsets():
+            for soltabName in solset.getSoltabNames():
+                name = solset.name+'/'+soltabName
+                # the attribute alone, without opening the soltab
+                attrs = solset.obj._f_get_child(soltabName)._v_attrs
+                writeId = str(attrs['WRITEID']) if 'WRITEID' in attrs._v_attrnames else None
+                if writeId is None and (self.soltabNames is None or name in self.soltabNames):
+                    logging.debug('Hashing soltab %s.' % name)
+                    soltab = solset.getSoltab(soltabName)
+                    writeId = hashSoltab(soltab)
+                    soltab.setWriteId(writeId)
+                if writeId is not None:
+                    self.hashes[name] = writeId
+
+    def _writeRecord(self, i, record):
+        """
+        Store a record in the h5parm, the state split in chunks
+        """
+        attrs = self.H.H.root._v_attrs
+        name = 'STEPLOG%03d' % i
+        attrs[name] = json.dumps({'steps': record['steps'], 'params': record['params']})
+        self.attrNames.append(name)
+        state = sorted(record['state'].items())
+        for j, start in enumerate(range(0, len(state), self.stateChunk)):
+            attrs['%s_%03d' % (name, j)] = json.dumps(dict(state[start:start+self.stateChunk]))
+            self.attrNames.append('%s_%03d' % (name, j))
+
+    def _write(self, records):
+        """
+        Replace the records stored in the h5parm
+        """
+        attrs = self.H.H.root._v_attrs
+        for name in self.attrNames:
+            del attrs[name]
+        self.attrNames = []
+        for i, record in enumerate(records):
+            self._writeRecord(i, record)
+        self.records = records
+        self.H.H.flush()
+
+    def resume(self, parser, steps, rerun=False):
+        """
+        Find where to resume a run: the longest sequence of recorded steps at the start of steps, run with the
+        same parameters, whose results are the current content of the h5parm. The records after it are dropped.
+
+        Parameters
+        ----------
+        parser : parser obj
+            configuration file
+
+        steps : list
+            names of the steps of the run, in order
+
+        rerun : bool, optional
+            if True run all the steps, by default False
+
+        Returns
+        -------
+        int
+            the number of steps at the start already run
+        """
+        self.soltabNames = set()
+        for step in planSteps(parser, self.H):
+            if step.barrier:
+                self.soltabNames = None
+                break
+            self.soltabNames |= step.reads | step.writes
+        self._hashSoltabs()
+        self.pending = []
+
+        # recorded states reached by the steps at the start of the parset
+        states = []
+        pos = 0
+        for i, record in enumerate(self.records if not rerun else []):
+            n = len(record['steps'])
+            if record['steps'] != steps[pos:pos+n] or record['params'] != [hashStep(parser, step) for step in record['steps']]:
+                break
+            pos += n
+            states.append((pos, i))
+
+        for pos, i in reversed(states):
+            if self.records[i]['state'] == self.hashes:
+                self._write(self.records[:i+1])
+                if pos > 0:
+                    logging.info('Steps \'%s\' already run on this h5parm, resuming after them.' % '\', \''.join(steps[:pos]))
+                return pos
+
+        if self.records and not rerun:
+            logging.warning('The h5parm was modified since the recorded steps, running all steps.')
+        self._write([{'steps': [], 'params': [], 'state': dict(self.hashes)}])
+        return 0
+
+    def endStep(self, parser, steps):
+        """
+        Add steps which were run to the next record
+
+        Parameters
+        ----------
+        parser : parser obj
+            configuration file
+
+        steps : list
+            names of the steps, in order
+        """
+        for step in steps:
+            self.pending.append((step, hashStep(parser, step)))
+
+    def record(self):
+        """
+        Record the steps which were run, their results must be written in the h5parm
+        """
+        if self.pending == []: return
+        self._hashSoltabs()
+        record = {'steps': [step for step, params in self.pending], 'params': [params for step, params in self.pending], \
+                'state': dict(self.hashes)}
+        self._writeRecord(len(self.records), record)
+        self.records.append(record)
+        self.H.H.flush()
+        self.pending = []
@@ -10,6 +10,21 @@ def _run_parser(soltab, parser, step):
     parser.checkSpelling( step, soltab )
     return run(soltab)
 
+def _kernel_parser(soltab, parser, step):
+    import numpy as np
+    parser.checkSpelling( step, soltab )
+    counts = [0, 0] # negative, non zero
+
+    def absVals(vals, weights, selection):
+        counts[0] += np.count_nonzero(vals<0)
+        counts[1] += np.count_nonzero(vals)
+        return np.abs(vals), weights
+
+    def end():
+        logging.info('Abs: %i points initially negative (%f %%)' % (counts[0],100*float(counts[0])/max(1, counts[1])))
+
+    return Kernel(absVals, 'ABSolute value taken', end=end)
+
 def run( soltab ):
     """
     Take absolute value. Needed before smooth if amplitudes are negative!
@@ -15,6 +15,25 @@ def _run_parser(soltab, parser, step):
     parser.checkSpelling( step, soltab, ['axesToClip', 'clipLevel', 'log', 'mode'] )
     return run(soltab, axesToClip, clipLevel, log, mode)
 
+def _kernel_parser(soltab, parser, step):
+    import numpy as np
+    axesToClip = parser.getarraystr( step, 'axesToClip', [] )
+    clipLevel = parser.getfloat( step, 'clipLevel', 5. )
+    log = parser.getbool( step, 'log', False )
+    mode = parser.getstr( step, 'mode', 'median' )
+
+    if mode != 'above' and mode != 'below':
+        return None # median needs whole groups and is not elementwise
+    parser.checkSpelling( step, soltab, ['axesToClip', 'clipLevel', 'log', 'mode'] )
+
+    def clip(vals, weights, selection):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            clipVals = np.log10(vals) if log else vals
+            bad = clipVals > clipLevel if mode == 'above' else clipVals < clipLevel
+        return vals, np.where(bad, 0, weights).astype(weights.dtype)
+
+    return Kernel(clip, 'CLIP (over %s with %s sigma cut)' % (soltab.getAxesNames(), clipLevel), setVals=False, setWeights=True)
+
 def run( soltab, axesToClip=None, clipLevel=5., log=False, mode='median' ):
     """
     Clip solutions around the median by a factor specified by the user.
@@ -64,7 +83,7 @@ def run( soltab, axesToClip=None, clipLevel=5., log=False, mode='median' ):
             del axesToClip[i]
             logging.warning('Axis \"'+axis+'\" not found. Ignoring.')
 
-    for vals, weights, coord, selection in soltab.getValuesIter(returnAxes=axesToClip, weight = True):
+    for vals, weights, coord, selection in soltab.getValuesIter(returnAxes=axesToClip, weight = True, stream = True):
 
         initPercent = percentFlagged(weights)
 
@@ -76,13 +76,14 @@ def run( soltab, tecsoltabOut='tec000', clocksoltabOut='clock000', offsetsoltabO
 
     # Collect station properties
     solset = soltab.getSolset()
-    station_dict = solset.getAnt()
     stations = soltab.getAxisValues('ant')
-    station_positions = np.zeros((len(stations), 3), dtype=np.float)
-    for i, station_name in enumerate(stations):
-        station_positions[i, 0] = station_dict[station_name][0]
-        station_positions[i, 1] = station_dict[station_name][1]
-        station_positions[i, 2] = station_dict[station_name][2]
+    station_positions = np.array(solset.getAntArrays()[1][solset.getAntIndex(stations.tolist())], dtype=float)
+
+    # dead stations, from the flag summary (no need to read the weights)
+    flagFrac = dict(zip(soltab.getAxisValues('ant', ignoreSelection=True), soltab.getFlagSummary()['ant']))
+    deadStations = [station_name for station_name in stations if flagFrac[station_name] == 1]
+    if len(deadStations) > 0:
+        logging.warning('Fully flagged stations: '+', '.join(deadStations))
 
     returnAxes=['ant','freq','pol','time']
     for vals, flags, coord, selection in soltab.getValuesIter(returnAxes=returnAxes,weight=True):
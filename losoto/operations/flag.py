@@ -25,7 +25,17 @@ def _run_parser(soltab, parser, step):
     return run( soltab, axesToFlag, order, maxCycles, maxRms, maxRmsNoise, fixRms, fixRmsNoise, windowNoise, replace, preflagzeros, mode, refAnt, ncpu )
 
 
-def _flag(vals, weights, coord, solType, order, mode, preflagzeros, maxCycles, maxRms, maxRmsNoise, windowNoise, fixRms, fixRmsNoise, replace, axesToFlag, selection, outQueue):
+def _output(vals, weights, selection, replace, writer, outQueue):
+    """
+    Write the results directly if the soltab allows it, otherwise send them to the parent process.
+    """
+    if writer is not None:
+        writer[tuple(selection)] = vals if replace else weights
+        vals = weights = None
+    outQueue.put([vals, weights, selection])
+
+
+def _flag(vals, weights, coord, solType, order, mode, preflagzeros, maxCycles, maxRms, maxRmsNoise, windowNoise, fixRms, fixRmsNoise, replace, axesToFlag, selection, writer, outQueue):
 
     import numpy as np
     import itertools
@@ -240,7 +250,7 @@ def _flag(vals, weights, coord, solType, order, mode, preflagzeros, maxCycles, m
     # check if everything flagged
     if (weights == 0).all() == True:
         logging.debug('Percentage of data flagged/replaced (%s): already completely flagged' % (removeKeys(coord, axesToFlag)))
-        outQueue.put([vals, weights, selection])
+        _output(vals, weights, selection, replace, writer, outQueue)
         return
 
     if preflagzeros:
@@ -277,7 +287,7 @@ def _flag(vals, weights, coord, solType, order, mode, preflagzeros, maxCycles, m
         logging.debug('Percentage of data flagged/replaced (%s): %.3f -> %.3f %% (rms: %.5f)' \
             % ((removeKeys(coord, axesToFlag), initPercentFlag, percentFlagged(weights), rms)))
 
-    outQueue.put([vals, weights, selection])
+    _output(vals, weights, selection, replace, writer, outQueue)
 #    return vals, weights, selection
 
 
@@ -364,19 +374,26 @@ def run( soltab, axesToFlag, order, maxCycles=5, maxRms=5., maxRmsNoise=0., fixR
 
     solType = soltab.getType()
 
+    # soltabs stored as Zarr arrays are written directly by the workers
+    writer = soltab.getParallelWriter(weight=not replace)
+
     # fill the queue (note that sf and sw cannot be put into a queue since they have file references)
-    for vals, weights, coord, selection in soltab.getValuesIter(returnAxes=axesToFlag, weight=True, reference=refAnt):
-        mpm.put([vals, weights, coord, solType, order, mode, preflagzeros, maxCycles, maxRms, maxRmsNoise, windowNoise, fixRms, fixRmsNoise, replace, axesToFlag, selection])
+    for vals, weights, coord, selection in soltab.getValuesIter(returnAxes=axesToFlag, weight=True, reference=refAnt, stream=True):
+        mpm.put([vals, weights, coord, solType, order, mode, preflagzeros, maxCycles, maxRms, maxRmsNoise, windowNoise, fixRms, fixRmsNoise, replace, axesToFlag, selection, writer])
 
     mpm.wait()
 
     for v, w, sel in mpm.get():
-        if replace:
+        if writer is not None:
+            continue
+        elif replace:
             # rewrite solutions (flagged values are overwritten)
             soltab.setValues(v, sel, weight=False)
         else:
             soltab.setValues(w, sel, weight=True)
 
+    if writer is not None:
+        soltab.endParallelWrite()
     soltab.flush()
     soltab.addHistory('FLAG (over %s with %s sigma cut)' % (axesToFlag, maxRms))
 
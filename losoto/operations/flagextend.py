@@ -58,7 +58,8 @@ def _flag(weights, coord, axesToExt, selection, percent=50, size=[0], maxCycles=
             logging.debug('Percentage of data flagged (%s): %.3f -> %.3f %%' \
                     % (removeKeys(coord, axesToExt), initPercent, percentFlagged(weights)))
 
-        outQueue.put([weights, selection])
+        # only the flags are sent back, they are added to those on disk
+        outQueue.put([weights == 0, selection])
         
             
 def run( soltab, axesToExt, size, percent=50., maxCycles=3, ncpu=0 ):
@@ -106,14 +107,14 @@ def run( soltab, axesToExt, size, percent=50., maxCycles=3, ncpu=0 ):
             return 1
 
     # fill the queue (note that sf and sw cannot be put into a queue since they have file references)
-    for vals, weights, coord, selection in soltab.getValuesIter(returnAxes=axesToExt, weight=True):
+    for weights, coord, selection in soltab.getValuesIter(returnAxes=axesToExt, onlyWeight=True):
         mpm.put([weights, coord, axesToExt, selection, percent, size, maxCycles])
 
     mpm.wait()
 
     logging.info('Writing solutions')
-    for w, sel in mpm.get():
-        soltab.setValues(w, sel, weight=True)
+    for flags, sel in mpm.get():
+        soltab.addFlags(flags, sel)
 
     soltab.addHistory('FLAG EXTENDED (over %s)' % (str(axesToExt)))
     return 0
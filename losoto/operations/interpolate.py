@@ -137,7 +137,7 @@ def run( soltab, outsoltab, axisToRegrid, newdelta, delta='', maxFlaggedWidth=0,
     new_vals = np.zeros(new_shape, dtype='float')
     new_weights = np.zeros(new_shape, dtype='float')
 
-    for vals, weights, coord, selection in soltab.getValuesIter(returnAxes=[axisToRegrid], weight=True):
+    for vals, weights, coord, selection in soltab.getValuesIter(returnAxes=[axisToRegrid], weight=True, stream=True):
         flagged = np.logical_or(np.equal(weights, 0.0), np.isnan(vals))
         weights[flagged] = 0.0
         unflagged = np.not_equal(weights, 0.0)
@@ -13,6 +13,27 @@ def _run_parser(soltab, parser, step):
     parser.checkSpelling( step, soltab, ['axesToNorm','normVal'])
     return run(soltab, axesToNorm, normVal)
 
+def _kernel_parser(soltab, parser, step):
+    import numpy as np
+    import warnings
+    axesToNorm = parser.getarraystr( step, 'axesToNorm' ) # no default
+    normVal = parser.getfloat( step, 'normVal', 1.)
+
+    if axesToNorm is None or any([normAxis not in soltab.getAxesNames() for normAxis in axesToNorm]):
+        return None # errors are reported by run()
+    parser.checkSpelling( step, soltab, ['axesToNorm','normVal'])
+    axesIdx = tuple([soltab.getAxesNames().index(normAxis) for normAxis in axesToNorm])
+
+    def norm(vals, weights, selection):
+        # same as run(): the mean of the unflagged values of each group is rescaled to normVal
+        valid = weights != 0
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning) # all flagged groups are left untouched
+            valsMean = np.nanmean(np.where(valid, vals, np.nan), axis=axesIdx, keepdims=True)
+        return np.where(valid, vals * (normVal/valsMean), vals), weights
+
+    return Kernel(norm, 'NORM (on axis %s)' % (axesToNorm), returnAxes=axesToNorm)
+
 def run( soltab, axesToNorm, normVal = 1. ):
     """
     Normalize the solutions to a given value
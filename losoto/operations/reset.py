@@ -12,6 +12,15 @@ def _run_parser(soltab, parser, step):
     parser.checkSpelling( step, soltab, ['dataVal'])
     return run(soltab, dataVal)
 
+def _kernel_parser(soltab, parser, step):
+    import numpy as np
+    dataVal = parser.getfloat( step, 'dataVal', -999. )
+
+    parser.checkSpelling( step, soltab, ['dataVal'])
+    if dataVal == -999.:
+        dataVal = 1. if soltab.getType() == 'amplitude' else 0.
+    return Kernel(lambda vals, weights, selection: (np.full_like(vals, dataVal), weights), 'RESET')
+
 def run( soltab, dataVal=-999. ):
     """
     This operation reset all the selected solution values.
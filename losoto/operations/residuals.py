@@ -19,6 +19,43 @@ def _run_parser(soltab, parser, step):
     return run(soltab, soltabsToSub, ratio)
 
 
+def _kernel_parser(soltab, parser, step):
+    import numpy as np
+    soltabsToSub = parser.getarraystr( step, 'soltabsToSub' ) # no default
+    ratio = parser.getbool( step, 'ratio', False )
+
+    if soltabsToSub is None: return None
+    # only tables with the same axes, subtracted element by element
+    solset = soltab.getSolset()
+    soltabsub = []
+    for soltabToSub in soltabsToSub:
+        if not soltabToSub in solset.getSoltabNames(): return None
+        sub = solset.getSoltab(soltabToSub)
+        if sub.getType() in ['clock', 'tec', 'tec3rd', 'rotationmeasure'] or sub.getAxesNames() != soltab.getAxesNames():
+            return None
+        for axisName in soltab.getAxesNames():
+            if not np.array_equal(sub.getAxisValues(axisName, ignoreSelection=True), soltab.getAxisValues(axisName, ignoreSelection=True)):
+                return None
+        soltabsub.append(sub)
+    parser.checkSpelling( step, soltab, ['soltabsToSub','ratio'])
+
+    def residuals(vals, weights, selection):
+        for sub in soltabsub:
+            subSelection = sub.selection
+            try:
+                sub.selection = selection
+                valsSub = sub.getValues(retAxesVals=False, weight=False)
+                weightsSub = sub.getValues(retAxesVals=False, weight=True)
+            finally:
+                sub.selection = subSelection
+            vals = (vals - valsSub) / valsSub if ratio else vals - valsSub
+            weights = np.where(weightsSub == 0, 0, weights).astype(weights.dtype)
+        return vals, weights
+
+    return Kernel(residuals, 'RESIDUALS by subtracting tables '+' '.join(soltabsToSub), setWeights=True, \
+            reads=[solset.name+'/'+soltabToSub for soltabToSub in soltabsToSub])
+
+
 def run( soltab, soltabsToSub, ratio=False ):
     """
     Subtract/divide two tables or a clock/tec/tec3rd/rm from a phase.
@@ -19,6 +19,19 @@ def _run_parser(soltab, parser, step):
     return run(soltab, mode, weightVal, nmedian, nstddev, soltabImport, flagBad, ncpu)
 
 
+def _kernel_parser(soltab, parser, step):
+    import numpy as np
+    mode = parser.getstr( step, 'mode', 'uniform' )
+    weightVal = parser.getfloat( step, 'weightVal', 1. )
+    flagBad = parser.getbool( step, 'flagBad', False )
+
+    if mode != 'uniform' or flagBad:
+        return None
+    parser.checkSpelling( step, soltab, ['mode', 'weightVal', 'nmedian', 'nstddev', 'soltabImport', 'flagBad'])
+    return Kernel(lambda vals, weights, selection: (vals, np.full_like(weights, weightVal)), \
+            'REWEIGHTED to '+str(weightVal)+'.', setVals=False, setWeights=True)
+
+
 def _rolling_window_lastaxis(a, window):
     """Directly taken from Erik Rigtorp's post to numpy-discussion.
     <http://www.mail-archive.com/numpy-discussion@scipy.org/msg29450.html>"""
@@ -68,7 +81,7 @@ def _nancircstd(samples, axis=None, is_phase=True):
     return np.sqrt(-2*np.log(R))
 
 
-def _estimate_weights_window(sindx, vals, nmedian, nstddev, type, outQueue):
+def _estimate_weights_window(sindx, vals, nmedian, nstddev, type, writer, writeSel, tindx, antindx, outQueue):
     """
     Set weights using a median-filter method
 
@@ -84,13 +97,19 @@ def _estimate_weights_window(sindx, vals, nmedian, nstddev, type, outQueue):
         Size of stddev time window
     typ: str
         Type of values (e.g., 'phase')
+    writer: _ZarrArray obj or None
+        If given the weights are written directly (see Soltab.getParallelWriter())
+    writeSel: list
+        Selection of this station on the whole soltab, used with writer
+    tindx, antindx: int
+        Index of the time axis in vals and of the antenna axis in the soltab
 
     """
     import numpy as np
     from scipy.ndimage import generic_filter
 
     pad_width = [(0, 0)] * len(vals.shape)
-    pad_width[-1] = ((nmedian-1)/2, (nmedian-1)/2)
+    pad_width[-1] = ((nmedian-1)//2, (nmedian-1)//2)
     if type == 'phase' or type == 'rotation':
         # Median smooth and subtract to de-trend
         if nmedian > 0:
@@ -110,7 +129,7 @@ def _estimate_weights_window(sindx, vals, nmedian, nstddev, type, outQueue):
             imag[imag > 1.0] = 1.0
 
             # Calculate standard deviations
-            pad_width[-1] = ((nstddev-1)/2, (nstddev-1)/2)
+            pad_width[-1] = ((nstddev-1)//2, (nstddev-1)//2)
             pad_real = np.pad(real, pad_width, 'constant', constant_values=(np.nan,))
             stddev1 = _nancircstd(_rolling_window_lastaxis(pad_real, nstddev), axis=-1, is_phase=False)
             pad_imag = np.pad(imag, pad_width, 'constant', constant_values=(np.nan,))
@@ -120,7 +139,7 @@ def _estimate_weights_window(sindx, vals, nmedian, nstddev, type, outQueue):
             phase = normalize_phase(vals)
 
             # Calculate standard deviation
-            pad_width[-1] = ((nstddev-1)/2, (nstddev-1)/2)
+            pad_width[-1] = ((nstddev-1)//2, (nstddev-1)//2)
             pad_phase = np.pad(phase, pad_width, 'constant', constant_values=(np.nan,))
             stddev = _nancircstd(_rolling_window_lastaxis(pad_phase, nstddev), axis=-1)
     else:
@@ -131,7 +150,7 @@ def _estimate_weights_window(sindx, vals, nmedian, nstddev, type, outQueue):
             vals -= med
 
         # Calculate standard deviation in larger window
-        pad_width[-1] = ((nstddev-1)/2, (nstddev-1)/2)
+        pad_width[-1] = ((nstddev-1)//2, (nstddev-1)//2)
         pad_vals = np.pad(vals, pad_width, 'constant', constant_values=(np.nan,))
         stddev = np.nanstd(_rolling_window_lastaxis(pad_vals, nstddev), axis=-1)
 
@@ -153,6 +172,11 @@ def _estimate_weights_window(sindx, vals, nmedian, nstddev, type, outQueue):
     if np.max(w) > float16max:
         w *= float16max / np.max(w)
 
+    if writer is not None:
+        # back to the axes order of the soltab
+        w = np.expand_dims(w.swapaxes(-1, tindx-1), 0).swapaxes(0, antindx)
+        writer[tuple(writeSel)] = w
+        w = None
     outQueue.put([sindx, w])
 
 
@@ -218,21 +242,35 @@ def run( soltab, mode='uniform', weightVal=1., nmedian=3, nstddev=251,
         vals = soltab.val[:].swapaxes(antindx, 0)
         if tindx == 0:
             tindx = antindx
+        # soltabs stored as Zarr arrays are written directly by the workers
+        writer = soltab.getParallelWriter(weight=True)
+        # position of the selected antennas in the whole soltab
+        antIdx = np.arange(soltab.getAxisLen('ant', ignoreSelection=True))[soltab.selection[antindx]]
         mpm = multiprocManager(ncpu, _estimate_weights_window)
         for sindx, sval in enumerate(vals):
+            # the selection of this antenna on the whole soltab, for the writer
+            writeSel = list(soltab.selection)
+            writeSel[antindx] = [int(antIdx[sindx])]
             if np.all(sval == 0.0):
                 # skip reference station
+                if writer is not None:
+                    writer[tuple(writeSel)] = 1.
                 continue
-            mpm.put([sindx, sval.swapaxes(tindx-1, -1), nmedian, nstddev, soltab.getType()])
+            mpm.put([sindx, sval.swapaxes(tindx-1, -1), nmedian, nstddev, soltab.getType(), writer, writeSel, tindx, antindx])
         mpm.wait()
-        weights = np.ones(vals.shape)
-        for (sindx, w) in mpm.get():
-            weights[sindx, :] = w.swapaxes(-1, tindx-1)
-        weights = weights.swapaxes(0, antindx)
+        if writer is None:
+            weights = np.ones(vals.shape)
+            for (sindx, w) in mpm.get():
+                weights[sindx, :] = w.swapaxes(-1, tindx-1)
+            weights = weights.swapaxes(0, antindx)
+        else:
+            for _ in mpm.get(): pass
+            soltab.endParallelWrite()
 
         soltab.addHistory('REWEIGHTED using sliding window with nmedian={0} '
             'and nstddev={1} timeslots'.format(nmedian, nstddev))
-        soltab.setValues(weights, weight=True)
+        if writer is None:
+            soltab.setValues(weights, weight=True)
 
     if flagBad:
         weights = soltab.getValues(weight = True, retAxesVals = False)
@@ -134,7 +134,7 @@ def run( soltab, axesToSmooth, size=[], mode='runningmedian', degree=1, replace=
             soltab.setValues(weights, weight=True)
 
     else:
-        for vals, weights, coord, selection in soltab.getValuesIter(returnAxes=axesToSmooth, weight=True, reference=refAnt):
+        for vals, weights, coord, selection in soltab.getValuesIter(returnAxes=axesToSmooth, weight=True, reference=refAnt, stream=True):
 
             # skip completely flagged selections
             if (weights == 0).all(): continue
@@ -78,7 +78,7 @@ def run( soltab, soltabOut='tec000', refAnt='', maxResidualFlag=2.5, maxResidual
                       weights=np.ones(shape=(soltab.getAxisLen('ant'),soltab.getAxisLen('time'))) )
     soltabout.addHistory('Created by TEC operation from %s.' % soltab.name)
         
-    for vals, weights, coord, selection in soltab.getValuesIter(returnAxes=['freq','time'], weight=True, reference=refAnt):
+    for vals, weights, coord, selection in soltab.getValuesIter(returnAxes=['freq','time'], weight=True, reference=refAnt, stream=True):
 
         if len(coord['freq']) < 10:
             logging.error('Delay estimation needs at least 10 frequency channels, preferably distributed over a wide range.')
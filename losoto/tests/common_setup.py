@@ -1,5 +1,6 @@
 import os
 import sys
+import importlib.util
 
 from .. import logging
 import numpy as np
@@ -8,6 +9,14 @@ import pytest
 TEST_FOLDER = os.path.abspath('./test_output')
 os.makedirs(TEST_FOLDER,exist_ok=True)
 
+def load_operation(name):
+    # load an operation module alone, without importing all the operations
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'operations', name+'.py')
+    spec = importlib.util.spec_from_file_location('losoto_test_op_'+name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
 def clean_test_output():
     logging.debug("Removing {}".format(TEST_FOLDER))
     os.unlink(TEST_FOLDER)
@@ -1,13 +1,576 @@
 from .common_setup import *
 
-from ..h5parm import h5parm
+from ..h5parm import h5parm, _getChunkShape, _SelectionPlan, _RawChunks, _getFilters
 
 def test_h5parm():
-    H = h5parm(os.path.join(TEST_FOLDER,'test_h5parm.h5'))
+    H = h5parm(os.path.join(TEST_FOLDER,'test_h5parm.h5'), readonly=False)
     assert isinstance(H, h5parm)
     assert isinstance(str(H), str)
     H.makeSolset('test_solset')
-    assert 'test_solset' in H.getSolsets(0
+    assert 'test_solset' in H.getSolsetNames()
     H.close()
     #TODO: assert closed somehow
 
+
+def _make_test_soltab(fileName, **kwargs):
+    if os.path.exists(fileName): os.remove(fileName)
+    H = h5parm(fileName, readonly=False, **kwargs)
+    ss = H.makeSolset('sol000')
+    axesNames = ['time','freq','ant','pol']
+    axesVals = [np.arange(50, dtype=float), np.arange(8, dtype=float)*1e6, ['ant%02i' % i for i in range(6)], ['XX','YY']]
+    vals = np.random.random((50,8,6,2))
+    weights = np.ones_like(vals)
+    weights[::7] = 0
+    return H, ss, axesNames, axesVals, vals, weights
+
+
+def test_chunk_shape():
+    # chunk axes are kept whole when they fit
+    assert _getChunkShape([1000,20,60,4], [0,1], itemsize=8, chunkBytes=1024*1024)[0:2] == (1000,20)
+    # too large chunks are split along the longest axis
+    chunk = _getChunkShape([100000,20,60,4], [0,1], itemsize=8, chunkBytes=1024*1024)
+    assert np.prod(chunk)*8 <= 1024*1024
+    assert chunk[1] == 20
+
+
+def test_chunked_soltab():
+    H, ss, axesNames, axesVals, vals, weights = _make_test_soltab(os.path.join(TEST_FOLDER,'test_chunked.h5'), complevel=5)
+    st = ss.makeSoltab('phase', 'phase000', axesNames=axesNames, axesVals=axesVals, vals=vals, weights=weights, chunkAxes=['freq','time'])
+    assert st.getChunkShape()[0:2] == (50,8)
+    assert st.obj.val.filters.complevel == 5
+    assert st.getChunkCacheSize() > 0
+    st.setSelection(ant=['ant03'], pol=['YY'])
+    assert np.allclose(st.getValues(retAxesVals=False), vals[:,:,3:4,1:2])
+    # contiguous arrays are still the default
+    st2 = ss.makeSoltab('amplitude', 'amplitude000', axesNames=axesNames, axesVals=axesVals, vals=vals, weights=weights)
+    assert st2.getChunkShape() is None
+    assert st2.getChunkCacheSize() == 0
+    H.close()
+
+
+def test_values_iter_stream():
+    H, ss, axesNames, axesVals, vals, weights = _make_test_soltab(os.path.join(TEST_FOLDER,'test_stream.h5'))
+    for chunkAxes in [None, ['time']]:
+        st = ss.makeSoltab('phase', axesNames=axesNames, axesVals=axesVals, vals=vals, weights=weights, chunkAxes=chunkAxes)
+        st.setSelection(ant=['ant01','ant03','ant04'], time={'min':5, 'max':30})
+        for reference in [None, 'ant02']:
+            iterMem = list(st.getValuesIter(returnAxes=['time'], weight=True, reference=reference))
+            iterStream = list(st.getValuesIter(returnAxes=['time'], weight=True, reference=reference, stream=True, blockSize=1000))
+            assert len(iterMem) == len(iterStream) == 8*3*2
+            for (v1, w1, c1, s1), (v2, w2, c2, s2) in zip(iterMem, iterStream):
+                assert np.allclose(v1, v2) and np.allclose(w1, w2)
+                assert c1['ant'] == c2['ant'] and s1 == s2
+    H.close()
+
+
+def test_values_iter_batch():
+    H, ss, axesNames, axesVals, vals, weights = _make_test_soltab(os.path.join(TEST_FOLDER,'test_batch.h5'))
+    st = ss.makeSoltab('amplitude', axesNames=axesNames, axesVals=axesVals, vals=vals, weights=weights)
+    items = list(st.getValuesIter(returnAxes=['time'], weight=True))
+    batches = list(st.getValuesIterBatch(returnAxes=['time'], batchSize=5, weight=True))
+    assert [len(b[3]) for b in batches] == [5]*19 + [1]
+    assert np.allclose(np.concatenate([b[0] for b in batches]), np.array([i[0] for i in items]))
+    assert sum([b[3] for b in batches], []) == [i[3] for i in items]
+    assert list(np.concatenate([b[2]['ant'] for b in batches])) == [i[2]['ant'] for i in items]
+    # weights only
+    for (w, coord, sel), item in zip(st.getValuesIter(returnAxes=['time'], onlyWeight=True), items):
+        assert np.allclose(w, item[1]) and sel == item[3]
+    # the axes values of each item can be modified in place
+    for stream in [False, True]:
+        for w, coord, sel in st.getValuesIter(returnAxes=['time'], onlyWeight=True, stream=stream, blockSize=1000):
+            assert np.array_equal(coord['time'], axesVals[0])
+            coord['time'] -= coord['time'][0]
+    for w, coord, sel in st.getValuesIterBatch(returnAxes=['time'], batchSize=5, onlyWeight=True):
+        assert np.array_equal(coord['time'], axesVals[0])
+        coord['time'] *= 2
+    assert np.array_equal(st.getAxisValues('time'), axesVals[0])
+    H.close()
+
+
+def test_region_cache():
+    H, ss, axesNames, axesVals, vals, weights = _make_test_soltab(os.path.join(TEST_FOLDER,'test_cache.h5'))
+    ss.makeSoltab('amplitude', 'amplitude000', axesNames=axesNames, axesVals=axesVals, vals=vals, weights=weights, chunkAxes=['time'])
+    for cacheSize in [None, 2000]:
+        st = ss.getSoltab('amplitude000', useCache=True, cacheSize=cacheSize)
+        st.setSelection(ant=['ant01','ant04'], pol=['XX'])
+        assert np.allclose(st.getValues(retAxesVals=False), vals[:,:,[1,4],0:1])
+        newWeights = st.getValues(retAxesVals=False, weight=True)
+        newWeights[:5] = 0
+        st.setValues(newWeights, weight=True)
+        # only the weights are dirty
+        assert len(st.cacheVal.dirty) == 0
+        assert len(st.cacheWeight.dirty) > 0 or cacheSize is not None
+        st.flush()
+        assert len(st.cacheWeight.dirty) == 0
+        weights[:5,:,[1,4],0] = 0
+        assert np.allclose(st.obj.weight[:], weights)
+        assert np.allclose(st.obj.val[:], vals)
+        if cacheSize is not None:
+            assert st.cacheWeight.nbytes <= max(cacheSize, np.prod(st.cacheWeight.regionShape)*2)
+        # negative indexes and Ellipsis as on the pytables array
+        for key in [(-1,), (Ellipsis, -1), (slice(None), Ellipsis, [0,-2], -1), ([-3,2], Ellipsis)]:
+            assert np.array_equal(st.cacheVal[key], st.obj.val[key])
+    H.close()
+
+
+def test_memmap():
+    pytest.importorskip('h5py')
+    fileName = os.path.join(TEST_FOLDER,'test_memmap.h5')
+    H, ss, axesNames, axesVals, vals, weights = _make_test_soltab(fileName)
+    ss.makeSoltab('phase', 'phase000', axesNames=axesNames, axesVals=axesVals, vals=vals, weights=weights)
+    ss.makeSoltab('phase', 'phase001', axesNames=axesNames, axesVals=axesVals, vals=vals, weights=weights, chunkAxes=['time'])
+    H.close()
+    H = h5parm(fileName, readonly=True, memmap=True)
+    st = H.getSolset('sol000').getSoltab('phase000')
+    st.setSelection(ant=['ant01','ant03'], pol=['XX'])
+    v = st.getValues(retAxesVals=False)
+    assert isinstance(st._getData(), np.memmap)
+    assert np.allclose(v, vals[:,:,[1,3],0:1])
+    assert np.allclose(st.getValues(retAxesVals=False, weight=True, reference='ant02'), \
+        weights[:,:,[1,3],0:1] * (weights[:,:,2:3,0:1] != 0))
+    # chunked soltabs are read by chunks
+    st = H.getSolset('sol000').getSoltab('phase001')
+    assert isinstance(st._getData(), _RawChunks)
+    assert np.allclose(st.getValues(retAxesVals=False), vals)
+    H.close()
+
+
+def test_selection_plan():
+    H, ss, axesNames, axesVals, vals, weights = _make_test_soltab(os.path.join(TEST_FOLDER,'test_plan.h5'))
+    st = ss.makeSoltab('amplitude', axesNames=axesNames, axesVals=axesVals, vals=vals, weights=weights)
+    st.setSelection(time=[0,1,2,10,11,30,45], ant=['ant00','ant02','ant03','ant05'])
+    sel = np.ix_([0,1,2,10,11,30,45], range(8), [0,2,3,5], range(2))
+    assert np.allclose(st.getValues(retAxesVals=False), vals[sel])
+    newVals = np.random.random(vals[sel].shape)
+    st.setValues(newVals)
+    vals[sel] = newVals
+    assert np.allclose(st.obj.val[:], vals)
+    st.setValues(0.5, weight=True)
+    weights[sel] = 0.5
+    assert np.allclose(st.obj.weight[:], weights)
+    # few coalesced operations instead of one per combination
+    plan = _SelectionPlan(st.selection, vals.shape, 8, write=True)
+    assert plan.nOps <= 3
+    # large index arrays which differ only in the middle get their own plans
+    timeVals = np.arange(3000, dtype=float)
+    st = ss.makeSoltab('phase', axesNames=['time'], axesVals=[timeVals], vals=timeVals, weights=np.ones(3000))
+    idx1 = np.arange(0, 3000, 2)
+    idx2 = idx1.copy()
+    idx2[700] += 1
+    for idx in [idx1, idx2]:
+        st.selection = [idx]
+        assert np.array_equal(st.getValues(retAxesVals=False), timeVals[idx])
+    H.close()
+
+
+def test_selection_index():
+    H, ss, axesNames, axesVals, vals, weights = _make_test_soltab(os.path.join(TEST_FOLDER,'test_selindex.h5'))
+    st = ss.makeSoltab('phase', axesNames=axesNames, axesVals=axesVals, vals=vals, weights=weights)
+    st2 = ss.makeSoltab('amplitude', axesNames=axesNames, axesVals=axesVals, vals=vals, weights=weights)
+    st.setSelection(time={'min':4.5, 'max':20, 'step':2}, freq=[3e6, 1e6, 2e6, 6e6], ant='ant0[24]', pol='YY')
+    assert st.selection == [slice(5,21,2), [1,2,3,6], [2,4], slice(1,2)]
+    st.setSelection(time={'max':20}, freq=['2e6'], ant=['ant03','ant01','antXX'])
+    assert st.selection == [slice(0,21,None), slice(2,3), [1,3], slice(None)]
+    # wrong single value: selection skipped
+    st.setSelection(ant='ant01', pol=['ZZ'])
+    assert st.selection[3] == slice(None)
+    # soltabs with the same axes share the compiled selections
+    assert st.getAxisIndex('ant') is st2.getAxisIndex('ant')
+    st2.setSelection(ant=['ant03','ant01','antXX'])
+    assert st2.selection[2] == [1,3]
+    # unsorted axes
+    st.clearSelection()
+    st.setAxisValues('time', np.where(np.arange(50) == 3, 40, np.arange(50)))
+    st.setSelection(time={'min':10, 'max':20})
+    assert st.selection[0] == slice(3,21)
+    H.close()
+
+
+def test_axis_values_cache():
+    H, ss, axesNames, axesVals, vals, weights = _make_test_soltab(os.path.join(TEST_FOLDER,'test_axescache.h5'))
+    st = ss.makeSoltab('phase', axesNames=axesNames, axesVals=axesVals, vals=vals, weights=weights)
+    st.setSelection(ant=['ant01','ant03'])
+    ants = st.getAxisValues('ant', copy=False)
+    assert list(ants) == ['ant01','ant03'] and not ants.flags.writeable
+    assert st.getAxisValues('ant', copy=False) is ants
+    # copies are still returned by default
+    antsCopy = st.getAxisValues('ant')
+    antsCopy[0] = 'test'
+    assert st.getAxisValues('ant')[0] == 'ant01'
+    # invalidated by a new selection or new values
+    st.setSelection(ant=['ant02'])
+    assert st.getAxisLen('ant') == 1 and st.getAxisValues('ant')[0] == 'ant02'
+    st.selection = [slice(None)]*4
+    assert st.getAxisLen('ant') == 6
+    st.setAxisValues('time', np.arange(50)+10.)
+    assert st.getAxisValues('time')[0] == 10.
+    H.close()
+
+
+def test_reference_closest():
+    H, ss, axesNames, axesVals, vals, weights = _make_test_soltab(os.path.join(TEST_FOLDER,'test_closest.h5'))
+    pos = np.array([[0,0,0],[1,0,0],[5,0,0],[5,2,0],[9,9,9],[20,0,0]], dtype=float)
+    ss.obj.antenna.append([(a, p) for a, p in zip(axesVals[2], pos)])
+    weights[:,:,1] = 0 # ant01 is fully flagged
+    st = ss.makeSoltab('phase', axesNames=axesNames, axesVals=axesVals, vals=vals, weights=weights)
+    antNames, antDists = ss.getAntDistMatrix()
+    assert antNames == axesVals[2] and antDists[2,3] == 2
+    assert ss.getAntDist('ant02')['ant05'] == 15
+    st.setSelection(ant=['ant00','ant02','ant03','ant05'], time={'max':10})
+    closest = [2,3,2,2] # ant01 (fully flagged) is never used
+    v = st.getValues(retAxesVals=False, reference='closest')
+    assert np.allclose(v, vals[:11,:,[0,2,3,5]] - vals[:11,:,closest])
+    w = st.getValues(retAxesVals=False, weight=True, reference='closest')
+    assert np.allclose(w, weights[:11,:,[0,2,3,5]] * (weights[:11,:,closest] != 0))
+    # the distances are recomputed if the antenna table changes
+    ss.obj.antenna.append([('ant06', [0,0,0.5])])
+    assert len(ss.getAntDistMatrix()[0]) == 7
+    H.close()
+
+
+def test_flag_summary():
+    H, ss, axesNames, axesVals, vals, weights = _make_test_soltab(os.path.join(TEST_FOLDER,'test_flagsummary.h5'))
+    weights[:,:,2] = 0
+    weights[:,:,:,1] = 0
+    st = ss.makeSoltab('phase', 'phase000', axesNames=axesNames, axesVals=axesVals, vals=vals, weights=weights)
+    summary = st.getFlagSummary()
+    assert sorted(summary.keys()) == ['ant','pol']
+    assert np.allclose(summary['ant'], np.mean(weights == 0, axis=(0,1,3)))
+    assert np.allclose(summary['pol'], [np.mean(weights[...,0] == 0), 1])
+    assert st._getFullyFlaggedAnts() == ['ant02']
+    # stored in the soltab, dropped when weights change
+    assert 'FLAG_SUMMARY_ant' in st.obj._v_attrs._v_attrnames
+    st.setValues(0., weight=True, selection=[slice(None), slice(None), slice(4,5), slice(None)])
+    assert st.getFlagSummary(compute=False) is None
+    assert st._getFullyFlaggedAnts() == ['ant02','ant04']
+    # small blocks give the same result
+    st._setFlagSummary(st.obj.weight, blockSize=100)
+    assert np.allclose(st.getFlagSummary()['ant'], [8/50.*0.5+0.5 if i not in [2,4] else 1 for i in range(6)])
+    # not computed by flush(), but when needed
+    st = ss.getSoltab('phase000', useCache=True)
+    st.setValues(0., weight=True, selection=[slice(None), slice(None), slice(5,6), slice(None)])
+    st.flush()
+    assert ss.getSoltab('phase000').getFlagSummary(compute=False) is None
+    assert np.allclose(ss.getSoltab('phase000').getFlagSummary()['ant'][4:], 1)
+    assert np.allclose(ss.getSoltab('phase000').getFlagSummary(compute=False)['ant'][4:], 1)
+    # printInfo() computes the summary from the weights it reads
+    ss.getSoltab('phase000')._dropFlagSummary()
+    assert 'Fully flagged stations: ant02, ant04, ant05' in H.printInfo()
+    assert np.allclose(ss.getSoltab('phase000').getFlagSummary(compute=False)['ant'][4:], 1)
+    H.close()
+
+
+def test_ant_sou_tables():
+    H, ss, axesNames, axesVals, vals, weights = _make_test_soltab(os.path.join(TEST_FOLDER,'test_tables.h5'))
+    ss.obj.antenna.append([('ant%02i' % i, [i,2*i,3*i]) for i in range(6)])
+    ss.obj.source.append([('dir0', [0.1,0.2]), ('dir1', [0.3,0.4])])
+    names, positions = ss.getAntArrays()
+    assert list(names) == ['ant%02i' % i for i in range(6)] and positions.shape == (6,3)
+    assert not positions.flags.writeable
+    assert np.allclose(ss.getAnt()['ant02'], [2,4,6])
+    assert ss.getAntIndex(['ant03','ant01']) == [3,1]
+    assert ss.getSouIndex('dir1') == 1 and np.allclose(ss.getSou()['dir1'], [0.3,0.4])
+    # shared by the solset objs and reused until the table changes
+    assert H.getSolset('sol000').getAntArrays()[1] is positions
+    ss.obj.antenna.append([('ant06', [0,0,0])])
+    assert len(ss.getAnt()) == 7 and ss.getAntIndex('ant06') == 6
+    # rows modified in place
+    ss.obj.antenna.modify_rows(start=1, stop=2, rows=[('ant01', [5,5,5])])
+    assert np.allclose(ss.getAnt()['ant01'], [5,5,5])
+    ss.obj.antenna.cols.name[0] = 'antXX'
+    assert ss.getAntIndex('antXX') == 0 and not 'ant00' in ss.getAnt()
+    ss.obj.source.remove()
+    assert ss.getSou() == {}
+    H.close()
+
+
+def test_lazy_soltabs():
+    fileName = os.path.join(TEST_FOLDER,'test_lazy.h5')
+    H, ss, axesNames, axesVals, vals, weights = _make_test_soltab(fileName)
+    for i in range(5):
+        ss.makeSoltab('amplitude', axesNames=axesNames, axesVals=axesVals, vals=vals, weights=weights)
+    H.close()
+    H = h5parm(fileName)
+    soltabs = H.getSolset('sol000').getSoltabs(sel={'ant':['ant01']})
+    assert [st.name for st in soltabs] == ['amplitude00%i' % i for i in range(5)]
+    # nothing is read until the soltab is used
+    assert all([st._lazy is not None for st in soltabs])
+    assert not 'obj' in soltabs[3].__dict__
+    assert soltabs[3].getAxisLen('ant') == 1
+    assert soltabs[3]._lazy is None and soltabs[4]._lazy is not None
+    assert np.allclose(soltabs[4].getValues(retAxesVals=False), vals[:,:,1:2])
+    assert soltabs[2].getType() == 'amplitude'
+    H.close()
+
+
+def test_packed_flags():
+    H, ss, axesNames, axesVals, vals, weights = _make_test_soltab(os.path.join(TEST_FOLDER,'test_packed.h5'))
+    weights[np.random.random(weights.shape) > 0.7] = 0
+    flagged = (weights == 0)
+    for chunkAxes in [None, ['time']]:
+        st = ss.makeSoltab('phase', axesNames=axesNames, axesVals=axesVals, vals=vals, weights=weights, weightDtype='bit', chunkAxes=chunkAxes)
+        assert st.isPacked() and not 'weight' in st.obj._v_children
+        assert st.obj.flag.shape == (7,8,6,2) # packed along time
+        assert np.array_equal(st.getValues(retAxesVals=False, weight=True), (~flagged).astype(float))
+        st.setSelection(time=[3,4,5,17,40], ant=['ant01','ant03','ant04'])
+        sel = np.ix_([3,4,5,17,40], range(8), [1,3,4], range(2))
+        assert np.array_equal(st.getValues(retAxesVals=False, weight=True), (~flagged[sel]).astype(float))
+        newWeights = np.random.random(flagged[sel].shape) > 0.5
+        st.setValues(newWeights, weight=True)
+        expected = ~flagged
+        expected[sel] = newWeights
+        st.clearSelection()
+        assert np.array_equal(st.getValues(retAxesVals=False, weight=True), expected)
+        assert np.allclose(st.getFlagSummary()['ant'], np.mean(~expected, axis=(0,1,3)))
+        # iteration and cache
+        for w, coord, selection in st.getValuesIter(returnAxes=['time'], onlyWeight=True, stream=True, blockSize=1000):
+            assert np.array_equal(w, expected[tuple(selection)].ravel())
+        st = ss.getSoltab(st.name, useCache=True)
+        st.setValues(0., weight=True, selection=[slice(10,12), slice(None), 2, slice(None)])
+        st.flush()
+        expected[10:12,:,2] = 0
+        assert np.array_equal(ss.getSoltab(st.name).getValues(retAxesVals=False, weight=True), expected)
+        # flags added on the bits, as on weights
+        st = ss.getSoltab(st.name)
+        stWeights = ss.makeSoltab('amplitude', axesNames=axesNames, axesVals=axesVals, vals=vals, weights=weights*2)
+        newFlags = np.random.random((50,8,2)) > 0.8
+        for soltab in [st, stWeights]:
+            for w, coord, selection in soltab.getValuesIter(returnAxes=['time','freq','pol'], onlyWeight=True):
+                if coord['ant'] == 'ant02': soltab.addFlags(newFlags, selection)
+        expected[:,:,2][newFlags] = 0
+        assert np.array_equal(st.getValues(retAxesVals=False, weight=True), expected)
+        assert np.array_equal(stWeights.getValues(retAxesVals=False, weight=True)[:,:,2], np.where(newFlags, 0, weights[:,:,2]*2))
+        assert np.allclose(st.getFlagSummary()['ant'], np.mean(~expected, axis=(0,1,3)))
+    H.close()
+
+
+def test_soltab_codec():
+    H, ss, axesNames, axesVals, vals, weights = _make_test_soltab(os.path.join(TEST_FOLDER,'test_codec.h5'))
+    st = ss.makeSoltab('phase', axesNames=axesNames, axesVals=axesVals, vals=vals, weights=weights, valDtype='f32')
+    assert st.obj.val.dtype == np.float32 and st.getChunkShape() is None
+    assert np.allclose(st.getValues(retAxesVals=False), vals, atol=1e-6)
+    # compression implies chunking, with per-soltab filters
+    smooth = np.ones_like(vals) * np.arange(50)[:,None,None,None]
+    st = ss.makeSoltab('tec', axesNames=axesNames, axesVals=axesVals, vals=smooth, weights=weights, complib='blosc:lz4')
+    assert st.getChunkShape() is not None
+    assert st.obj.val.filters.complib == 'blosc:lz4' and st.obj.val.filters.shuffle
+    assert st.obj.val.size_on_disk < st.obj.val.size_in_memory / 4
+    st = ss.makeSoltab('clock', axesNames=axesNames, axesVals=axesVals, vals=smooth, weights=weights, complib='auto', chunkAxes=['time'])
+    assert st.obj.val.filters.complevel > 0 and st.getChunkShape()[0] == 50
+    assert np.allclose(st.getValues(retAxesVals=False), smooth)
+    # the choice depends only on the data
+    assert str(_getFilters('auto', sample=smooth)) == str(st.obj.val.filters)
+    noise = np.random.default_rng(0).integers(0, 256, 100000, dtype=np.uint8)
+    assert _getFilters('auto', sample=noise).complevel == 0
+    H.close()
+
+
+def test_quantized_values():
+    H, ss, axesNames, axesVals, vals, weights = _make_test_soltab(os.path.join(TEST_FOLDER,'test_quant.h5'))
+    phases = (vals - 0.5) * 2 * np.pi
+    phases[0,0,0,0] = np.nan
+    st = ss.makeSoltab('phase', axesNames=axesNames, axesVals=axesVals, vals=phases, weights=weights, valDtype='q16')
+    assert st.obj.val.dtype == np.int16
+    maxError, errorBound = st.getQuantizationError(phases)
+    assert maxError <= errorBound*1.0001 < 1e-4
+    v = st.getValues(retAxesVals=False)
+    assert np.isnan(v[0,0,0,0]) and np.allclose(v, phases, atol=errorBound, equal_nan=True)
+    # encoded on write, also with the cache
+    st.setSelection(time=[1,5,6], ant=['ant01','ant04'])
+    st.setValues(np.ones((3,8,2,2)))
+    assert np.allclose(st.getValues(retAxesVals=False), 1, atol=errorBound)
+    st = ss.getSoltab(st.name, useCache=True)
+    st.setValues(-1., selection=[slice(2,3), slice(None), slice(None), slice(None)])
+    st.flush()
+    assert np.allclose(st.obj.val[2] * st.valNode.scale + st.valNode.offset, -1, atol=errorBound)
+    # amplitudes are quantized as log10: bounded relative error
+    amps = 10**(vals*4 - 2)
+    st = ss.makeSoltab('amplitude', axesNames=axesNames, axesVals=axesVals, vals=amps, weights=weights, valDtype='q16')
+    maxError, errorBound = st.getQuantizationError(amps)
+    assert maxError <= errorBound*1.0001
+    assert np.allclose(st.getValues(retAxesVals=False) / amps, 1, atol=np.log(10)*errorBound*1.01)
+    H.close()
+
+
+def test_swmr():
+    import subprocess, json, tables
+    fileName = os.path.join(TEST_FOLDER,'test_swmr.h5')
+    H, ss, axesNames, axesVals, vals, weights = _make_test_soltab(fileName, swmr=True)
+    st = ss.makeSoltab('phase', 'phase000', axesNames=axesNames, axesVals=axesVals, vals=vals, weights=weights)
+    assert H.publish() == 2 and H.getGeneration() == (2, False)
+    # a reader in another process (without file locking) sees the published state while the writer keeps the file open
+    reader = 'import json; from losoto.h5parm import h5parm\n' \
+             'H = h5parm(%r, swmr=True, swmrTimeout=%s)\n' \
+             'print(json.dumps([H.generation, H.consistentRead(lambda h: float(h.getSolset("sol000").getSoltab("phase000").getValues(retAxesVals=False).sum()))]))'
+    def read(timeout):
+        env = dict(os.environ, HDF5_USE_FILE_LOCKING='FALSE')
+        env['PYTHONPATH'] = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        return subprocess.run([sys.executable, '-c', reader % (fileName, timeout)], env=env, capture_output=True, text=True)
+    assert json.loads(read(None).stdout) == [2, pytest.approx(vals.sum())]
+    # while the writer works readers wait for the next publish
+    H.beginWrite()
+    st.setValues(np.zeros_like(vals))
+    assert read(0.3).returncode != 0
+    H.publish()
+    assert json.loads(read(None).stdout) == [3, 0]
+    H.close()
+    # reads failing while the writer modifies the file are repeated, failures on a published state are raised
+    H = h5parm(fileName, swmr=True, swmrTimeout=5)
+    calls = []
+    def failing(h):
+        calls.append(h.generation)
+        if len(calls) == 1:
+            h._setGeneration(h.generation+1, False) # the writer published during the read
+            raise tables.NoSuchNodeError('partially written')
+        return h.getSolset('sol000').getSoltab('phase000').getValues(retAxesVals=False).sum()
+    assert H.consistentRead(failing) == 0 and calls[1] == calls[0]+1
+    with pytest.raises(tables.NoSuchNodeError):
+        H.consistentRead(lambda h: h.getSolset('sol000').obj._f_get_child('missing'))
+    H.close()
+
+
+def test_values_async():
+    pytest.importorskip('h5py')
+    H, ss, axesNames, axesVals, vals, weights = _make_test_soltab(os.path.join(TEST_FOLDER,'test_async.h5'))
+    ss.makeSoltab('phase', 'phase000', axesNames=axesNames, axesVals=axesVals, vals=vals, weights=weights, complevel=5, chunkAxes=['time'])
+    ss.makeSoltab('amplitude', 'amplitude000', axesNames=axesNames, axesVals=axesVals, vals=vals+1, weights=weights)
+    st = ss.getSoltab('phase000')
+    st.setSelection(ant=['ant01','ant04'], freq=[0.,3e6,7e6])
+    futures = H.getValuesAsync(['sol000/amplitude000', st, st], selections=[None, None, {'time':{'min':10,'max':20}, 'pol':'YY'}], retAxesVals=False)
+    assert np.allclose(futures[0].result(), vals+1)
+    assert np.allclose(futures[1].result(), vals[:,[0,3,7]][:,:,[1,4]])
+    assert np.allclose(futures[2].result(), vals[10:21,:,:,1:2])
+    # the selection of the soltab obj is not changed
+    assert np.allclose(st.getValues(retAxesVals=False), vals[:,[0,3,7]][:,:,[1,4]])
+    # while open for writing, with weights and reference
+    w, axes = ss.getValuesAsync(['phase000'], weight=True, reference='ant02')[0].result()
+    assert list(axes['ant']) == axesVals[2] and np.allclose(w, weights * (weights[:,:,2:3] != 0))
+    H.close()
+
+
+def _write_zarr(writer, ant, vals):
+    writer[:, :, [ant], :] = vals
+
+
+def test_zarr_storage():
+    import json, multiprocessing
+    fileName = os.path.join(TEST_FOLDER,'test_zarr.h5')
+    H, ss, axesNames, axesVals, vals, weights = _make_test_soltab(fileName)
+    st = ss.makeSoltab('phase', 'phase000', axesNames=axesNames, axesVals=axesVals, vals=vals, weights=weights, chunkShape=[50,8,2,2], storage='zarr')
+    store = fileName+'.zarr/sol000/phase000'
+    assert st.getStorage() == 'zarr' and st.getChunkShape() == (50,8,2,2)
+    meta = json.load(open(store+'/val/.zarray'))
+    assert meta['zarr_format'] == 2 and meta['chunks'] == [50,8,2,2] and os.path.isfile(store+'/weight/0.0.2.0')
+    assert np.array_equal(st.getValues(retAxesVals=False), vals) and st.getFlagSummary()['ant'][0] == 8/50.
+    st.setSelection(ant=['ant01','ant04'], time={'min':10, 'max':19})
+    st.setValues(np.zeros((10,8,2,2)))
+    vals[10:20,:,[1,4]] = 0
+    st.clearSelection()
+    assert np.array_equal(st.getValues(retAxesVals=False), vals)
+    # worker processes write directly, also into the same chunk
+    st = ss.getSoltab('phase000', useCache=True)
+    writer = st.getParallelWriter()
+    procs = [multiprocessing.Process(target=_write_zarr, args=(writer, ant, np.full((50,8,1,2), ant))) for ant in range(6)]
+    for p in procs: p.start()
+    for p in procs: p.join()
+    st.endParallelWrite()
+    assert np.array_equal(st.getValues(retAxesVals=False), np.ones_like(vals) * np.arange(6)[None,None,:,None])
+    # lossless conversion, rename and delete
+    st.setStorage('hdf5')
+    assert st.getStorage() == 'hdf5' and not os.path.exists(store) and st.obj.val.chunkshape == (50,8,2,2)
+    assert np.array_equal(st.getValues(retAxesVals=False, weight=True), weights)
+    st.setStorage('zarr')
+    st.rename('phase001')
+    assert os.path.isdir(fileName+'.zarr/sol000/phase001/val') and not os.path.exists(store)
+    assert np.array_equal(ss.getSoltab('phase001').getValues(retAxesVals=False), np.ones_like(vals) * np.arange(6)[None,None,:,None])
+    st.delete()
+    assert not os.path.exists(fileName+'.zarr/sol000/phase001')
+    H.close()
+
+
+def test_zarr_compatibility():
+    zarr = pytest.importorskip('zarr')
+    fileName = os.path.join(TEST_FOLDER,'test_zarr_compat.h5')
+    H, ss, axesNames, axesVals, vals, weights = _make_test_soltab(fileName)
+    st = ss.makeSoltab('phase', 'phase000', axesNames=axesNames, axesVals=axesVals, vals=vals, weights=weights, chunkShape=[20,8,2,2], storage='zarr')
+    vals[0,0,0,0] = np.nan
+    st.setValues(vals)
+    ss.makeSoltab('amplitude', 'amplitude000', axesNames=axesNames, axesVals=axesVals, vals=vals, weights=weights).setStorage('zarr')
+    # the arrays written by losoto are read by zarr, found from the STORE attribute of the val and weight nodes
+    for soltab in ss.getSoltabs():
+        store = str(soltab.obj.weight.attrs['STORE'])
+        assert str(soltab.obj.val.attrs['STORE']) == store and soltab.obj.weight.shape == (0,)
+        group = zarr.open(os.path.join(TEST_FOLDER, store), mode='r')
+        assert np.array_equal(group['val'][:], vals, equal_nan=True)
+        assert np.array_equal(group['weight'][:], weights)
+        assert list(group['val'].chunks) == list(soltab.getChunkShape())
+    # and the other way round
+    group = zarr.open(os.path.join(TEST_FOLDER, str(st.obj.val.attrs['STORE'])), mode='r+')
+    group['val'][10:20] = 1.
+    vals[10:20] = 1.
+    assert np.array_equal(ss.getSoltab('phase000').getValues(retAxesVals=False), vals, equal_nan=True)
+    H.close()
+
+
+def test_append_values():
+    H, ss, axesNames, axesVals, vals, weights = _make_test_soltab(os.path.join(TEST_FOLDER,'test_append.h5'))
+    st = ss.makeSoltab('phase', 'phase000', axesNames=axesNames, axesVals=[axesVals[0][:20]]+axesVals[1:], vals=vals[:20], weights=weights[:20],
+            appendAxis='time')
+    assert st.getAppendAxis() == 'time' and np.allclose(st.getFlagSummary()['ant'], 3/20.)
+    st.appendValues(vals[20:35], weights[20:35], axesVals[0][20:35])
+    st.appendValues(vals[35:], weights[35:], axesVals[0][35:])
+    assert np.array_equal(st.getAxisValues('time'), axesVals[0])
+    assert np.array_equal(st.getValues(retAxesVals=False), vals)
+    assert np.allclose(st.getFlagSummary()['ant'], 8/50.)
+    # any axis, bit-packed flags and a wrong shape leaves the soltab as it was
+    st = ss.makeSoltab('amplitude', 'amplitude000', axesNames=axesNames, axesVals=axesVals[:2]+[axesVals[2][:4]]+axesVals[3:],
+            vals=vals[:,:,:4], weights=weights[:,:,:4], appendAxis='ant', weightDtype='bit')
+    st.getFlagSummary()
+    weights[1,0,5,0] = 0
+    st.appendValues(vals[:,:,4:], weights[:,:,4:], axesVals[2][4:])
+    assert np.allclose(st.getFlagSummary()['ant'], [8/50.]*5+[8/50.+1/800.]) and np.allclose(st.getFlagSummary()['pol'], [8/50.+1/2400., 8/50.])
+    with pytest.raises(Exception):
+        st.appendValues(vals[:,:,4:], weights[:,:,4:], ['ant99'])
+    assert list(st.getAxisValues('ant')) == axesVals[2]
+    assert np.array_equal(st.getValues(retAxesVals=False, weight=True), weights)
+    with pytest.raises(Exception):
+        ss.makeSoltab('phase', 'phase001', axesNames=axesNames, axesVals=axesVals, vals=vals, weights=weights).appendValues(vals, weights, axesVals[0])
+    H.close()
+
+
+def test_compact():
+    fileName = os.path.join(TEST_FOLDER,'test_compact.h5')
+    H, ss, axesNames, axesVals, vals, weights = _make_test_soltab(fileName)
+    ss.makeSoltab('phase', 'phase000', axesNames=axesNames, axesVals=axesVals, vals=vals, weights=weights)
+    ss.makeSoltab('amplitude', 'amplitude000', axesNames=axesNames, axesVals=[axesVals[0][:10]]+axesVals[1:], vals=vals[:10], weights=weights[:10],
+            appendAxis='time', weightDtype='bit', chunkShape=[10,8,6,2])
+    for i in range(5):
+        ss.makeSoltab('phase', 'phase%03i' % (i+1), axesNames=axesNames, axesVals=axesVals, vals=vals, weights=weights)
+    H.close()
+    # space freed in a later session is not reused
+    H = h5parm(fileName, readonly=False)
+    ss = H.getSolset('sol000')
+    for i in range(5):
+        ss.getSoltab('phase%03i' % (i+1)).delete()
+    ss.getSoltab('phase000').addHistory('test')
+    H.H.flush()
+    size = os.path.getsize(fileName)
+    # to another file, re-chunked and compressed
+    copyFile = os.path.join(TEST_FOLDER,'test_compact_copy.h5')
+    H.compact(copyFile, complevel=5, chunkAxes=['time'])
+    Hc = h5parm(copyFile)
+    st = Hc.getSolset('sol000').getSoltab('phase000')
+    assert st.obj.val.chunkshape == (50,8,6,2) and st.obj.val.filters.complevel == 5 and 'test' in st.getHistory()
+    assert np.array_equal(st.getValues(retAxesVals=False), vals)
+    st = Hc.getSolset('sol000').getSoltab('amplitude000')
+    assert st.getAppendAxis() == 'time' and np.array_equal(st.getValues(retAxesVals=False, weight=True), weights[:10])
+    assert Hc.getSolset('sol000').getAnt() == ss.getAnt()
+    Hc.close()
+    # in place
+    assert H.compact() < size/2
+    ss = H.getSolset('sol000')
+    assert sorted(ss.getSoltabNames()) == ['amplitude000', 'phase000']
+    st = ss.getSoltab('amplitude000')
+    st.appendValues(vals[10:], weights[10:], axesVals[0][10:])
+    assert np.array_equal(st.getValues(retAxesVals=False), vals)
+    H.close()
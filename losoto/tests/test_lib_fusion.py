@@ -0,0 +1,150 @@
+from .common_setup import *
+
+import shutil
+from ..h5parm import h5parm
+from ..lib_losoto import LosotoParser, getStepSoltabs
+from ..lib_fusion import getFusedSteps, runFusedSteps
+from ..lib_operations import Kernel
+
+
+OPS = {op.upper(): load_operation(op) for op in ['abs', 'clip', 'norm', 'reset', 'residuals', 'reweight']}
+
+PARSET = """
+soltab = sol000/amplitude000
+
+[reweight]
+operation = REWEIGHT
+weightVal = 2
+
+[residuals]
+operation = RESIDUALS
+soltabsToSub = amplitude001
+ratio = True
+
+[abs]
+operation = ABS
+
+[norm]
+operation = NORM
+axesToNorm = time
+
+[clip]
+operation = CLIP
+mode = above
+clipLevel = %s
+log = %s
+
+[median]
+operation = CLIP
+axesToClip = time
+
+[reset]
+operation = RESET
+soltab = sol000/amplitude001
+"""
+
+
+@pytest.mark.parametrize('clipLevel,log', [(1.5, False), (0.2, True)])
+def test_fused_steps(clipLevel, log):
+    parsetFile = os.path.join(TEST_FOLDER, 'test_fusion.parset')
+    with open(parsetFile, 'w') as f: f.write(PARSET % (clipLevel, log))
+    parser = LosotoParser(parsetFile)
+    fileName = os.path.join(TEST_FOLDER, 'test_fusion.h5')
+    if os.path.exists(fileName): os.remove(fileName)
+    H = h5parm(fileName, readonly=False)
+    ss = H.makeSolset('sol000')
+    axesVals = [np.arange(50, dtype=float), np.linspace(1e8, 2e8, 30), ['ant%02i' % i for i in range(6)]]
+    weights = np.ones((50,30,6))
+    weights[10:20,:,2] = 0
+    for name in ['amplitude000', 'amplitude001']:
+        ss.makeSoltab('amplitude', name, axesNames=['time','freq','ant'], axesVals=axesVals, \
+                vals=np.random.normal(1, 0.5, (50,30,6)), weights=weights)
+    H.close()
+    shutil.copy(fileName, fileName+'.seq')
+
+    steps = parser.sections()[1:]
+    H = h5parm(fileName+'.seq', readonly=False)
+    for step in steps:
+        for soltab in getStepSoltabs(parser, step, H):
+            assert OPS[parser.getstr(step, 'Operation')]._run_parser(soltab, parser, step) == 0
+    H.close()
+
+    H = h5parm(fileName, readonly=False)
+    group, soltabKernels = getFusedSteps(parser, steps, H, OPS)
+    assert group == ['reweight', 'residuals', 'abs', 'norm', 'clip']
+    # small blocks split along freq and ant, the norm axis is never split
+    blockSize = 50*10*4
+    soltab = soltabKernels[0][0]
+    assert len(list(soltab.getValuesBlocks(returnAxes=['time'], weight=True, blockSize=blockSize))) > 6
+    assert runFusedSteps(group, soltabKernels, blockSize=blockSize) == 0
+    for step in steps[len(group):]:
+        assert getFusedSteps(parser, [step]+steps[steps.index(step)+1:], H, OPS)[1] is None
+        for soltab in getStepSoltabs(parser, step, H):
+            assert OPS[parser.getstr(step, 'Operation')]._run_parser(soltab, parser, step) == 0
+    H.close()
+
+    Hs, H = h5parm(fileName+'.seq'), h5parm(fileName)
+    for name in ['amplitude000', 'amplitude001']:
+        st, sts = H.getSolset('sol000').getSoltab(name), Hs.getSolset('sol000').getSoltab(name)
+        assert np.allclose(st.getValues(retAxesVals=False), sts.getValues(retAxesVals=False), equal_nan=True)
+        assert np.array_equal(st.getValues(retAxesVals=False, weight=True), sts.getValues(retAxesVals=False, weight=True))
+        assert [h.split(': ', 1)[1] for h in st.getHistory().split('\n')] == [h.split(': ', 1)[1] for h in sts.getHistory().split('\n')]
+    H.close(); Hs.close()
+
+
+PARSET_ONCE = """
+soltab = [sol000/amplitude000, sol000/amplitude001]
+
+[abs]
+operation = ABS
+typo1 = 1
+
+[residuals]
+operation = RESIDUALS
+soltabsToSub = amplitude001
+typo2 = 1
+
+[median]
+operation = CLIP
+axesToClip = time
+typo3 = 1
+"""
+
+
+def test_fused_steps_parsed_once(caplog):
+    parsetFile = os.path.join(TEST_FOLDER, 'test_fusion_once.parset')
+    with open(parsetFile, 'w') as f: f.write(PARSET_ONCE)
+    parser = LosotoParser(parsetFile)
+    fileName = os.path.join(TEST_FOLDER, 'test_fusion_once.h5')
+    if os.path.exists(fileName): os.remove(fileName)
+    H = h5parm(fileName, readonly=False)
+    ss = H.makeSolset('sol000')
+    axesVals = [np.arange(20, dtype=float), ['ant%02i' % i for i in range(4)]]
+    for name in ['amplitude000', 'amplitude001']:
+        ss.makeSoltab('amplitude', name, axesNames=['time','ant'], axesVals=axesVals, \
+                vals=np.random.normal(1, 0.5, (20,4)), weights=np.ones((20,4)))
+
+    # same loop as bin/losoto: a step parsed but not fused runs through its kernels
+    steps = parser.sections()[1:]
+    groups = []
+    parsed = {}
+    caplog.set_level(logging.WARNING)
+    while steps:
+        group, soltabKernels = getFusedSteps(parser, steps, H, OPS, parsed)
+        if soltabKernels is None:
+            for soltab in getStepSoltabs(parser, group[0], H):
+                assert OPS[parser.getstr(group[0], 'Operation')]._run_parser(soltab, parser, group[0]) == 0
+        else:
+            assert runFusedSteps(group, soltabKernels) == 0
+        groups.append(group)
+        steps = steps[len(group):]
+    assert groups == [['abs'], ['residuals'], ['median']]
+    # one warning per soltab
+    for typo in ['typo1', 'typo2', 'typo3']:
+        assert len([r for r in caplog.records if 'Mispelled option: %s ' % typo in r.getMessage()]) == 2
+
+    # failures reported by a kernel are returned
+    soltab = ss.getSoltab('amplitude000')
+    kernel = Kernel(lambda vals, weights, selection: (vals, weights), 'NOTHING', end=lambda: 1)
+    assert runFusedSteps(['nothing'], [(soltab, [kernel])]) == 1
+    H.close()
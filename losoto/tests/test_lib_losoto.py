@@ -0,0 +1,55 @@
+from .common_setup import *
+
+from ..h5parm import h5parm
+from ..lib_losoto import LosotoParser, WorkingSet, getStepSoltabs
+
+PARSET = """
+[clip]
+operation = CLIP
+soltab = sol000/phase000
+
+[smooth]
+operation = SMOOTH
+soltab = sol000/phase000
+
+[norm]
+operation = NORM
+soltab = sol000/amplitude000
+
+[reset]
+operation = RESET
+"""
+
+
+def test_working_set():
+    parsetFile = os.path.join(TEST_FOLDER, 'test_workingset.parset')
+    with open(parsetFile, 'w') as f: f.write(PARSET)
+    parser = LosotoParser(parsetFile)
+    fileName = os.path.join(TEST_FOLDER, 'test_workingset.h5')
+    if os.path.exists(fileName): os.remove(fileName)
+    H = h5parm(fileName, readonly=False)
+    ss = H.makeSolset('sol000')
+    vals = np.zeros((20,4))
+    for name in ['phase000', 'amplitude000']:
+        ss.makeSoltab(name[:-3], name, axesNames=['time','ant'], axesVals=[np.arange(20.), ['a','b','c','d']], vals=vals, weights=np.ones_like(vals))
+    onDisk = lambda name: H.getSolset('sol000').getSoltab(name).getValues(retAxesVals=False)
+
+    ws = WorkingSet()
+    # consecutive cached steps share the soltab obj, the flush of the operations is deferred
+    ws.beginStep(parser, 'clip')
+    st, = getStepSoltabs(parser, 'clip', H, ws)
+    st.setValues(st.getValues(retAxesVals=False) + 1)
+    st.flush()
+    ws.beginStep(parser, 'smooth')
+    assert getStepSoltabs(parser, 'smooth', H, ws)[0] is st
+    assert np.all(onDisk('phase000') == 0) and np.all(st.getValues(retAxesVals=False) == 1)
+    # a cached step on another soltab writes back the kept ones it does not select
+    ws.beginStep(parser, 'norm')
+    st2, = getStepSoltabs(parser, 'norm', H, ws)
+    st2.setValues(2.)
+    assert np.all(onDisk('phase000') == 1) and len(ws.soltabs) == 2
+    # any other step writes back and drops everything
+    ws.beginStep(parser, 'reset')
+    assert np.all(onDisk('amplitude000') == 2) and ws.soltabs == {}
+    assert not getStepSoltabs(parser, 'reset', H, ws)[0].useCache
+    H.close()
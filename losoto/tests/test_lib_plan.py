@@ -0,0 +1,74 @@
+from .common_setup import *
+
+from ..h5parm import h5parm
+from ..lib_losoto import LosotoParser
+from ..lib_plan import planRun, formatPlan
+
+PARSET = """
+ncpu = 2
+maxMemory = 1
+
+[flag]
+operation = FLAG
+soltab = sol000/amplitude000
+axesToFlag = [time,freq]
+ant = [ant00, ant01]
+
+[duplicate]
+operation = DUPLICATE
+soltab = sol000/amplitude000
+soltabOut = amplitudeCopy
+
+[norm]
+operation = NORM
+soltab = sol000/amplitudeCopy
+axesToNorm = time
+
+[reset]
+operation = RESET
+soltab = sol000/phase.*
+
+[flagpacked]
+operation = FLAG
+soltab = sol000/amplitude001
+axesToFlag = [time,freq]
+freq.minmaxstep = [0, 49]
+"""
+
+
+def test_plan_run():
+    parsetFile = os.path.join(TEST_FOLDER, 'test_plan.parset')
+    with open(parsetFile, 'w') as f: f.write(PARSET)
+    parser = LosotoParser(parsetFile)
+    fileName = os.path.join(TEST_FOLDER, 'test_plan.h5')
+    if os.path.exists(fileName): os.remove(fileName)
+    H = h5parm(fileName, readonly=False)
+    ss = H.makeSolset('sol000')
+    axesVals = [np.arange(1000, dtype=float), np.arange(100, dtype=float), ['ant%02i' % i for i in range(4)]]
+    ss.makeSoltab('amplitude', 'amplitude000', axesNames=['time','freq','ant'], axesVals=axesVals, \
+            vals=np.ones((1000,100,4)), weights=np.ones((1000,100,4)))
+    ss.makeSoltab('amplitude', 'amplitude001', axesNames=['time','freq','ant'], axesVals=axesVals, \
+            vals=np.ones((1000,100,4)), weights=np.ones((1000,100,4)), weightDtype='bit')
+    H.close()
+
+    H = h5parm(fileName)
+    estimates = planRun(parser, H, maxCpu=4)
+    assert [(e.step, e.soltabName, e.estimated) for e in estimates] == [('flag', 'sol000/amplitude000', True), \
+            ('duplicate', 'sol000/amplitude000', True), ('norm', 'sol000/amplitudeCopy', False), ('reset', None, False), \
+            ('flagpacked', 'sol000/amplitude001', True)]
+    flag = estimates[0]
+    # two antennas selected, one item per antenna with 1000x100 elements
+    assert flag.items == 2 and flag.ncpu == 2
+    weightBytes = H.getSolset('sol000').getSoltab('amplitude000').weightNode.dtype.itemsize
+    assert flag.read == 2*1000*100*(8+weightBytes) and flag.written == 2*1000*100*weightBytes
+    assert flag.memory > 1024*1024 and flag.warnings == ['memory']
+    assert estimates[1].warnings == []
+    # bit-packed flags: whole lines along the packed axis, 1 bit per element padded to bytes
+    st = H.getSolset('sol000').getSoltab('amplitude001')
+    packedAxis = st.getAxesNames()[st.weightNode.packedAxis]
+    packedLen = {'time': 1000, 'freq': 50, 'ant': 4}[packedAxis]
+    packedBytes = 1000*50*4 // packedLen * ((st.getAxisLen(packedAxis, ignoreSelection=True)+7)//8)
+    assert estimates[4].read == 1000*50*4*8 + packedBytes and estimates[4].written == packedBytes
+    table = formatPlan(estimates).split('\n')
+    assert len(table) == 7 and 'exceeds memory limit' in table[1] and 'new soltab' in table[3]
+    H.close()
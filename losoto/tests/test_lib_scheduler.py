@@ -0,0 +1,89 @@
+from .common_setup import *
+
+import shutil
+from ..h5parm import h5parm
+from ..lib_losoto import LosotoParser, getStepSoltabs
+from ..lib_scheduler import planSteps, runSteps
+
+PARSET = """
+ncpu = 4
+
+[reset]
+operation = RESET
+soltab = sol000/phase000
+
+[plot]
+operation = PLOT
+soltab = sol000/amplitude000
+
+[tec]
+operation = TEC
+soltab = sol000/phase000
+
+[smooth]
+operation = SMOOTH
+soltab = sol000/tec000
+
+[flag]
+operation = FLAG
+soltab = sol000/amplitude000
+
+[duplicate]
+operation = DUPLICATE
+soltab = sol000/amplitude000
+"""
+
+
+def _run_step(parser, step, H):
+    # stand-in for the operations: each step leaves a different trace
+    op = parser.getstr(step, 'Operation')
+    for soltab in getStepSoltabs(parser, step, H):
+        vals = soltab.getValues(retAxesVals=False)
+        if op == 'TEC':
+            soltab.getSolset().makeSoltab('tec', 'tec000', axesNames=soltab.getAxesNames(), \
+                    axesVals=[soltab.getAxisValues(a) for a in soltab.getAxesNames()], vals=vals*2, weights=np.ones_like(vals))
+        elif op == 'DUPLICATE':
+            soltab.getSolset().makeSoltab('amplitude', axesNames=soltab.getAxesNames(), \
+                    axesVals=[soltab.getAxisValues(a) for a in soltab.getAxesNames()], vals=vals, weights=np.ones_like(vals))
+        elif op != 'PLOT':
+            soltab.setValues(vals + len(step))
+            soltab.addHistory(step+' ncpu=%i' % parser.getint('_global', 'ncpu', 0))
+    return 0
+
+
+def test_run_steps():
+    parsetFile = os.path.join(TEST_FOLDER, 'test_scheduler.parset')
+    with open(parsetFile, 'w') as f: f.write(PARSET)
+    parser = LosotoParser(parsetFile)
+    fileName = os.path.join(TEST_FOLDER, 'test_scheduler.h5')
+    if os.path.exists(fileName): os.remove(fileName)
+    H = h5parm(fileName, readonly=False)
+    ss = H.makeSolset('sol000')
+    axesVals = [np.arange(20, dtype=float), ['ant%02i' % i for i in range(4)]]
+    for name in ['phase000', 'amplitude000']:
+        ss.makeSoltab(name[:-3], name, axesNames=['time','ant'], axesVals=axesVals, vals=np.random.random((20,4)), weights=np.ones((20,4)))
+    H.close()
+    shutil.copy(fileName, fileName+'.seq')
+
+    H = h5parm(fileName)
+    steps = planSteps(parser, H, maxCpu=4)
+    H.close()
+    assert [s.deps for s in steps] == [set(), set(), {0}, {2}, {1}, {0,1,2,3,4}]
+    assert steps[2].outputs == {'sol000/tec000'} and steps[4].ncpu == 4 and steps[5].barrier
+
+    H = h5parm(fileName+'.seq', readonly=False)
+    for step in parser.sections()[1:]:
+        _run_step(parser, step, H)
+    H.close()
+    H = h5parm(fileName, readonly=False)
+    assert runSteps(parser, H, _run_step, maxCpu=4) == 0
+    H.close()
+
+    Hs, H = h5parm(fileName+'.seq'), h5parm(fileName)
+    assert H.getSolset('sol000').getSoltabNames() == Hs.getSolset('sol000').getSoltabNames()
+    for name in Hs.getSolset('sol000').getSoltabNames():
+        st, sts = H.getSolset('sol000').getSoltab(name), Hs.getSolset('sol000').getSoltab(name)
+        assert np.array_equal(st.getValues(retAxesVals=False), sts.getValues(retAxesVals=False))
+        assert st.getHistory().count('=') == sts.getHistory().count('=')
+    assert not any([f.startswith('losoto-steps-') for f in os.listdir(TEST_FOLDER)])
+    H.close(); Hs.close()
@@ -0,0 +1,97 @@
+from .common_setup import *
+
+from ..h5parm import h5parm
+from ..lib_losoto import LosotoParser, getStepSoltabs
+from ..lib_steplog import StepLog, hashSoltab
+
+PARSET = """
+ncpu = 4
+
+[reset]
+operation = RESET
+soltab = sol000/phase000
+
+[norm]
+operation = NORM
+soltab = sol000/amplitude000
+
+[smooth]
+operation = SMOOTH
+soltab = sol000/phase000
+"""
+
+
+def _run_steps(parser, steps, H, stepLog):
+    # stand-in for the operations: each step adds a different number
+    for step in steps:
+        for soltab in getStepSoltabs(parser, step, H, useCache=False):
+            soltab.setValues(soltab.getValues(retAxesVals=False) + len(step))
+        stepLog.endStep(parser, [step])
+        stepLog.record()
+
+
+def test_step_log():
+    parsetFile = os.path.join(TEST_FOLDER, 'test_steplog.parset')
+    with open(parsetFile, 'w') as f: f.write(PARSET)
+    parser = LosotoParser(parsetFile)
+    steps = parser.sections()[1:]
+    fileName = os.path.join(TEST_FOLDER, 'test_steplog.h5')
+    if os.path.exists(fileName): os.remove(fileName)
+    H = h5parm(fileName, readonly=False)
+    ss = H.makeSolset('sol000')
+    axesVals = [np.arange(20, dtype=float), ['ant%02i' % i for i in range(4)]]
+    for name in ['phase000', 'amplitude000']:
+        ss.makeSoltab(name[:-3], name, axesNames=['time','ant'], axesVals=axesVals, vals=np.zeros((20,4)), weights=np.ones((20,4)))
+    H.close()
+
+    # interrupted after two steps, the state is split in attributes of one soltab
+    H = h5parm(fileName, readonly=False)
+    stepLog = StepLog(H)
+    stepLog.stateChunk = 1
+    assert stepLog.resume(parser, steps) == 0
+    _run_steps(parser, steps[:2], H, stepLog)
+    assert sorted(H.H.root._v_attrs._f_list('user')) == ['STEPLOG%03d%s' % (i, s) for i in range(3) for s in ['', '_000', '_001']]
+    H.close()
+
+    # resumes at the third step, then all the steps are done
+    H = h5parm(fileName, readonly=False)
+    stepLog = StepLog(H)
+    assert stepLog.resume(parser, steps) == 2
+    _run_steps(parser, steps[2:], H, stepLog)
+    assert np.all(H.getSolset('sol000').getSoltab('phase000').getValues(retAxesVals=False) == len('reset')+len('smooth'))
+    assert np.all(H.getSolset('sol000').getSoltab('amplitude000').getValues(retAxesVals=False) == len('norm'))
+    H.close()
+
+    # nothing to run, also with a different ncpu; a new step runs alone
+    parser.set('_global', 'ncpu', '1')
+    parser.add_section('clip')
+    parser.set('clip', 'operation', 'CLIP')
+    H = h5parm(fileName, readonly=False)
+    stepLog = StepLog(H)
+    assert stepLog.resume(parser, steps) == 3
+    assert stepLog.resume(parser, steps+['clip']) == 3
+    assert stepLog.resume(parser, steps, rerun=True) == 0
+    H.close()
+
+    # the step log matches only the content of the h5parm
+    H = h5parm(fileName, readonly=False)
+    stepLog = StepLog(H)
+    assert stepLog.resume(parser, steps) == 0
+    _run_steps(parser, steps, H, stepLog)
+    assert stepLog.resume(parser, steps) == 3
+    H.getSolset('sol000').getSoltab('phase000').setValues(0.)
+    assert stepLog.resume(parser, steps) == 0
+    parser.set('norm', 'normVal', '2')
+    assert stepLog.resume(parser, steps) == 0
+    H.close()
+
+    # a soltab written without losoto is hashed once
+    H = h5parm(fileName, readonly=False)
+    soltab = H.getSolset('sol000').getSoltab('amplitude000')
+    del soltab.obj._v_attrs['WRITEID']
+    stepLog = StepLog(H)
+    assert stepLog.resume(parser, steps) == 0
+    assert soltab.getWriteId() == hashSoltab(soltab)
+    _run_steps(parser, steps, H, stepLog)
+    assert stepLog.resume(parser, steps) == 3
+    H.close()
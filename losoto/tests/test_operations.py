@@ -0,0 +1,28 @@
+from .common_setup import *
+
+from ..h5parm import h5parm
+
+
+def test_reweight_window_zarr():
+    reweight = load_operation('reweight')
+    fileName = os.path.join(TEST_FOLDER, 'test_reweight.h5')
+    if os.path.exists(fileName): os.remove(fileName)
+    H = h5parm(fileName, readonly=False)
+    ss = H.makeSolset('sol000')
+    axesNames = ['time','freq','ant']
+    axesVals = [np.arange(60, dtype=float), np.arange(4, dtype=float), ['ant%02i' % i for i in range(6)]]
+    vals = np.random.default_rng(0).normal(size=(60,4,6))
+    weights = np.ones((60,4,6))
+    for storage in ['hdf5', 'zarr']:
+        ss.makeSoltab('phase', 'phase_'+storage, axesNames=axesNames, axesVals=axesVals, vals=vals, weights=weights, \
+                chunkShape=[20,4,2], storage=storage)
+    # workers write directly into the zarr soltab, only the selected data
+    for storage in ['hdf5', 'zarr']:
+        st = ss.getSoltab('phase_'+storage)
+        st.setSelection(ant=['ant01','ant03','ant04'], time={'min':10, 'max':49})
+        assert reweight.run(st, mode='window', nmedian=3, nstddev=5, ncpu=2) == 0
+    expected = ss.getSoltab('phase_hdf5').getValues(retAxesVals=False, weight=True)
+    assert np.all(expected[10:50][:,:,[1,3,4]] != 1) and np.all(np.delete(expected, [1,3,4], axis=2) == 1)
+    assert np.all(expected[:10] == 1) and np.all(expected[50:] == 1)
+    assert np.allclose(ss.getSoltab('phase_zarr').getValues(retAxesVals=False, weight=True), expected)
+    H.close()